@@ -0,0 +1,291 @@
+# === IMPORTS =============================================================
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orderly_engine
+from orderly_engine import SearchEngine, SearchOptions, FileIndex, run_organize_job
+
+# === END IMPORTS =========================================================
+
+
+# === CONFIGURATION =======================================================
+VOCABULARY = ["report", "invoice", "photo", "scan", "draft", "final", "budget", "notes", "meeting", "contract",
+              "summary", "backup", "holiday", "receipt", "letter", "project", "design", "review", "plan", "data",
+              "export", "archive", "statement", "minutes", "proposal", "agenda", "slides", "resume", "memo", "log"]
+DEFAULT_EXTENSIONS = "pdf:25,docx:20,txt:20,jpg:20,xlsx:10,png:5"
+REGRESSION_THRESHOLD = 0.10  # A benchmark more than 10% slower than the baseline counts as a regression
+DEFAULT_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.json")  # Git-ignored
+
+# === END CONFIGURATION ===================================================
+
+
+# === TREE GENERATION =====================================================
+def parse_extension_mix(text):
+    """Parses 'pdf:25,docx:20' into ([".pdf", ".docx"], [25, 20])."""
+    extensions, weights = [], []
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        extensions.append("." + name.strip().lstrip("."))
+        weights.append(float(weight or 1))
+    return extensions, weights
+
+
+def generate_tree(root, file_count, depth, fanout, name_distribution, extension_mix, file_size, seed=42):
+    """Creates a synthetic tree under root and returns the list of files created.
+
+    Folders form a tree `depth` levels deep with `fanout` subfolders each, and files are spread
+    over all of them. Filenames are two vocabulary words plus a number; with the "zipf"
+    distribution a few words are very common, like real document folders.
+    """
+    rng = random.Random(seed)
+    folders = [root]
+    level = [root]
+    for current_depth in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                folder = os.path.join(parent, f"{VOCABULARY[(current_depth + i) % len(VOCABULARY)]}_{current_depth}_{i}")
+                os.makedirs(folder)
+                next_level.append(folder)
+        folders.extend(next_level)
+        level = next_level
+
+    if name_distribution == "zipf":
+        word_weights = [1.0 / (rank + 1) for rank in range(len(VOCABULARY))]
+    else:
+        word_weights = [1.0] * len(VOCABULARY)
+    extensions, extension_weights = parse_extension_mix(extension_mix)
+    content = b"x" * file_size
+
+    created = []
+    for i in range(file_count):
+        first, second = rng.choices(VOCABULARY, weights=word_weights, k=2)
+        filename = f"{first}_{second}_{i}{rng.choices(extensions, weights=extension_weights)[0]}"
+        if rng.random() < 0.5:
+            filename = filename.capitalize()
+        path = os.path.join(rng.choice(folders), filename)
+        with open(path, "wb") as f:
+            f.write(content)
+        created.append(path)
+    return created
+
+
+# === END TREE GENERATION =================================================
+
+
+# === BENCHMARKS ==========================================================
+def time_runs(function, repeat, setup=None):
+    """Runs function `repeat` times (calling setup before each, untimed) and returns the timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_index(root, repeat):
+    """Times a full index build of the tree."""
+    def build():
+        file_index = FileIndex(root)
+        file_index.build()
+        file_index.close()
+
+    return {"index_build": time_runs(build, repeat)}
+
+
+def bench_search(root, repeat):
+    """Times SearchEngine.search (what the app's perform_search runs) in every search mode, on a warm index."""
+    cases = {
+        "search_keyword_case_sensitive": ("report", SearchOptions(mode="Keyword", case_sensitive=True)),
+        "search_keyword_case_insensitive": ("report", SearchOptions(mode="Keyword", case_sensitive=False)),
+        "search_extension": (".pdf", SearchOptions(mode="Extension")),
+        "search_fuzzy": ("reprot", SearchOptions(mode="Keyword", fuzzy=True)),
+        "search_query": ("report AND ext:pdf,docx NOT draft", SearchOptions(mode="Keyword", case_sensitive=False)),
+        "search_query_stat": ("report ext:pdf size:<1KB", SearchOptions(mode="Keyword", case_sensitive=False)),
+        "search_content": ("report", SearchOptions(mode="Content", case_sensitive=False)),
+    }
+    search_engine = SearchEngine(root)
+    search_engine.prepare()
+    results = {}
+    try:
+        for name, (keyword, options) in cases.items():
+            try:
+                match_counts = []
+                timings = time_runs(lambda: match_counts.append(len(search_engine.search(keyword, options))), repeat)
+                results[name] = timings
+                print(f"  {name}: {match_counts[-1]} matches")
+            except ImportError as e:
+                print(f"  {name}: skipped ({e})")
+    finally:
+        search_engine.close()
+    return results
+
+
+def bench_render(root, repeat):
+    """Times filling the app's VirtualResultsList from search batches, as trigger_search does."""
+    try:
+        import customtkinter as ctk
+        from orderly_app import VirtualResultsList
+        window = ctk.CTk()
+    except Exception as e:  # customtkinter missing, or no display to draw on
+        print(f"  results_list_population: skipped ({e})")
+        return {}
+
+    search_engine = SearchEngine(root)
+    batches = []
+    search_engine.search(".", SearchOptions(mode="Keyword"), on_batch=batches.append)
+    search_engine.close()
+
+    try:
+        window.withdraw()
+        results_list = VirtualResultsList(window, format_item=os.path.basename)
+        results_list.pack(fill="both", expand=True)
+        window.update()
+
+        def populate():
+            results_list.clear()
+            for batch in batches:
+                results_list.append_items(batch)
+                window.update_idletasks()
+
+        return {"results_list_population": time_runs(populate, repeat)}
+    finally:
+        window.destroy()
+
+
+def bench_organize(args, repeat):
+    """Times run_organize_job (what the app's organize_files runs) for Copy and for Move."""
+    results = {}
+    for action_type in ("Copy", "Move"):
+        workspace = tempfile.mkdtemp(prefix="orderly_bench_organize_")
+        state = {}
+
+        def setup():
+            shutil.rmtree(workspace, ignore_errors=True)
+            os.makedirs(workspace)
+            state["sources"] = generate_tree(os.path.join(workspace, "source"), args.organize_files, 2, 3,
+                                             args.names, args.extensions, args.file_size, seed=args.seed)
+            state["destination"] = os.path.join(workspace, "Organized")
+            os.makedirs(state["destination"])
+
+        def organize():
+            _, errors = run_organize_job(action_type, state["destination"], state["sources"])
+            if errors:
+                raise RuntimeError(f"{action_type} failed: {errors[0]}")
+
+        try:
+            results[f"organize_{action_type.lower()}"] = time_runs(organize, repeat, setup=setup)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+
+# === END BENCHMARKS ======================================================
+
+
+# === REPORTING ===========================================================
+def summarize(timings):
+    return {"best": min(timings), "median": statistics.median(timings), "runs": timings}
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Prints each benchmark next to its baseline. Returns the names that regressed by more than threshold."""
+    regressions = []
+    print(f"{'benchmark':<36}{'best (s)':>12}{'baseline':>12}{'change':>10}")
+    for name, summary in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<36}{summary['best']:>12.4f}{'-':>12}{'-':>10}")
+            continue
+        change = summary["best"] / base["best"] - 1.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<36}{summary['best']:>12.4f}{base['best']:>12.4f}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Orderly's search, render and organize paths on a synthetic tree.")
+    parser.add_argument("--files", type=int, default=50000, help="Files in the synthetic tree")
+    parser.add_argument("--depth", type=int, default=3, help="Folder levels below the root")
+    parser.add_argument("--fanout", type=int, default=6, help="Subfolders per folder")
+    parser.add_argument("--names", choices=["zipf", "uniform"], default="zipf", help="Filename word distribution")
+    parser.add_argument("--extensions", default=DEFAULT_EXTENSIONS, help="Extension mix as ext:weight,...")
+    parser.add_argument("--file-size", type=int, default=0,
+                        help="Bytes written to each search-tree file (raise it to exercise content search)")
+    parser.add_argument("--organize-files", type=int, default=2000, help="Files copied/moved by the organize runs")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, so trees are reproducible")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    parser.add_argument("--only", default="index,search,render,organize", help="Comma-separated groups to run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH,
+                        help="Where to write the results as JSON (default: benchmarks/bench_results.json)")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown (fraction) that counts as a regression")
+    args = parser.parse_args()
+    groups = set(args.only.split(","))
+
+    temp_root = tempfile.mkdtemp(prefix="orderly_bench_suite_")
+    # Keep benchmark indexes and journals out of the user's real Orderly data folder
+    orderly_engine.INDEX_DIR = os.path.join(temp_root, "indexes")
+    orderly_engine.JOURNAL_DIR = os.path.join(temp_root, "journals")
+    orderly_engine.DOCUMENT_CACHE_PATH = os.path.join(temp_root, "document_text.sqlite")
+    tree_root = os.path.join(temp_root, "tree")
+
+    results = {}
+    try:
+        if groups & {"index", "search", "render"}:
+            created = generate_tree(tree_root, args.files, args.depth, args.fanout, args.names, args.extensions,
+                                    args.file_size, seed=args.seed)
+            print(f"Generated {len(created)} files in '{tree_root}'")
+        if "index" in groups:
+            results.update(bench_index(tree_root, args.repeat))
+        if "search" in groups:
+            results.update(bench_search(tree_root, args.repeat))
+        if "render" in groups:
+            results.update(bench_render(tree_root, args.repeat))
+        if "organize" in groups:
+            results.update(bench_organize(args, args.repeat))
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
+
+    summaries = {name: summarize(timings) for name, timings in results.items()}
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "parameters": vars(args)},
+        "results": summaries,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote results to '{args.output}'")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare_with_baseline(summaries, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+# === END REPORTING =======================================================
+
+
+if __name__ == "__main__":
+    sys.exit(main())
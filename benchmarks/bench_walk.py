@@ -0,0 +1,102 @@
+# === IMPORTS =============================================================
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orderly_engine import ParallelWalker
+
+# === END IMPORTS =========================================================
+
+
+# === TREE GENERATION =====================================================
+def generate_tree(root, folder_count, files_per_folder, seed=42):
+    """Creates a random tree of empty files under root and returns the number of files created."""
+    rng = random.Random(seed)
+    folders = [root]
+    file_count = 0
+    for i in range(folder_count):
+        folder = os.path.join(rng.choice(folders), f"folder_{i}")
+        os.makedirs(folder)
+        folders.append(folder)
+        for j in range(files_per_folder):
+            open(os.path.join(folder, f"file_{i}_{j}.txt"), "w").close()
+            file_count += 1
+    return file_count
+
+
+# === END TREE GENERATION =================================================
+
+
+# === BENCHMARK ===========================================================
+def simulate_latency(latency_ms):
+    """Wraps os.scandir so every listing waits latency_ms first, like a network round trip."""
+    real_scandir = os.scandir
+
+    def slow_scandir(path="."):
+        time.sleep(latency_ms / 1000.0)
+        return real_scandir(path)
+
+    os.scandir = slow_scandir
+
+
+def time_os_walk(root):
+    start = time.perf_counter()
+    file_count = sum(len(files) for _, _, files in os.walk(root))
+    return time.perf_counter() - start, file_count
+
+
+def time_parallel_walk(root, workers):
+    walker = ParallelWalker(workers=workers)
+    start = time.perf_counter()
+    file_count = sum(len(files) for _, _, files, _ in walker.walk(root))
+    return time.perf_counter() - start, file_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ParallelWalker against os.walk for several worker counts.")
+    parser.add_argument("root", nargs="?", help="Folder to walk (default: generate a synthetic tree)")
+    parser.add_argument("--folders", type=int, default=2000, help="Folders in the synthetic tree")
+    parser.add_argument("--files-per-folder", type=int, default=20, help="Files per synthetic folder")
+    parser.add_argument("--workers", default="1,2,4,8,16,32", help="Comma-separated worker counts to try")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration (best time is reported)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Artificial delay per directory listing, to mimic an NFS/SMB mount")
+    args = parser.parse_args()
+
+    temp_root = None
+    root = args.root
+    if not root:
+        temp_root = tempfile.mkdtemp(prefix="orderly_bench_walk_")
+        root = temp_root
+        created = generate_tree(root, args.folders, args.files_per_folder)
+        print(f"Generated {args.folders} folders / {created} files in '{root}'")
+
+    if args.latency_ms:
+        simulate_latency(args.latency_ms)
+        print(f"Simulating {args.latency_ms} ms latency per directory listing")
+
+    try:
+        best, file_count = min(time_os_walk(root) for _ in range(args.repeat))
+        print(f"{'walker':<16}{'seconds':>10}{'files':>10}{'speedup':>10}")
+        print(f"{'os.walk':<16}{best:>10.3f}{file_count:>10}{1.0:>10.2f}")
+        baseline = best
+
+        for workers in [int(w) for w in args.workers.split(",")]:
+            best, file_count = min(time_parallel_walk(root, workers) for _ in range(args.repeat))
+            print(f"{f'parallel x{workers}':<16}{best:>10.3f}{file_count:>10}{baseline / best:>10.2f}")
+    finally:
+        if temp_root:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+
+# === END BENCHMARK =======================================================
+
+
+if __name__ == "__main__":
+    main()
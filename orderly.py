@@ -0,0 +1,293 @@
+# === IMPORTS =============================================================
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from orderly_engine import (SearchEngine, SearchOptions, MultiRootSearch, ParallelWalker, OrganizeJournal,
+                            RulesEngine, run_organize_job, run_rules_job, resume_organize_job, undo_organize_job,
+                            compile_query, load_rules, format_bytes, metrics, profile_call, WALK_WORKERS,
+                            WALK_MAX_DEPTH, WALK_EXCLUDE_PATTERNS, DUPLICATE_MIN_SIZE, RULES_PATH)
+
+# === END IMPORTS =========================================================
+
+
+# === OUTPUT HELPERS ======================================================
+def write_json_line(record):
+    """Writes one JSON Lines record to stdout."""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def make_progress_printer(quiet):
+    """Returns an on_progress callback that draws a one-line progress counter on stderr."""
+    if quiet or not sys.stderr.isatty():
+        return None
+
+    def on_progress(files_done, files_total, bytes_done, bytes_total):
+        sys.stderr.write(f"\r{files_done:,} / {files_total:,} files · "
+                         f"{format_bytes(bytes_done)} / {format_bytes(bytes_total)}   ")
+        if files_done == files_total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+    return on_progress
+
+
+def report_job_result(action_type, destination_folder, processed_count, errors):
+    """Prints an organize/resume/undo summary as one JSON record. Returns the exit code."""
+    write_json_line({"action": action_type, "destination": destination_folder, "processed": processed_count,
+                     "failed": len(errors), "errors": [{"path": path, "error": error} for path, error in errors]})
+    return 1 if errors else 0
+
+
+# === END OUTPUT HELPERS ==================================================
+
+
+# === COMMANDS ============================================================
+def open_search_engine(args, root=None):
+    exclude_patterns = ([] if args.no_default_excludes else list(WALK_EXCLUDE_PATTERNS)) + args.exclude
+    walker = ParallelWalker(workers=args.workers, max_depth=args.max_depth, follow_links=args.follow_links,
+                            exclude_patterns=exclude_patterns, skip_hidden=not args.include_hidden)
+    return SearchEngine(os.path.abspath(root or args.root), walker=walker)
+
+
+def search_options_from_args(args):
+    mode = "Extension" if args.extension else "Content" if args.content else "Keyword"
+    return SearchOptions(mode=mode, case_sensitive=not args.ignore_case, fuzzy=args.fuzzy)
+
+
+def command_search(args):
+    """Streams matches as JSON Lines. Exits with 1 when nothing matched, like grep."""
+    def on_batch(paths):
+        for path in paths:
+            write_json_line({"path": path, "name": os.path.basename(path), "folder": os.path.dirname(path)})
+        sys.stdout.flush()
+
+    search_engines = [open_search_engine(args, root) for root in [args.root] + args.also]
+    multi_root_search = MultiRootSearch(search_engines)
+    try:
+        if args.profile:
+            found_files = profile_call(args.profile, multi_root_search.search, args.query,
+                                       search_options_from_args(args), on_batch=on_batch)
+        else:
+            found_files = multi_root_search.search(args.query, search_options_from_args(args), on_batch=on_batch)
+    finally:
+        for search_engine in search_engines:
+            search_engine.close()
+    return 0 if found_files else 1
+
+
+def command_duplicates(args):
+    """Prints one JSON Lines record per group of identical files. Exits with 1 when there are none."""
+    search_engine = open_search_engine(args)
+    try:
+        groups = search_engine.find_duplicates(min_size=args.min_size)
+    finally:
+        search_engine.close()
+    for file_size, paths in groups:
+        write_json_line({"size": file_size, "keep": paths[0], "duplicates": paths[1:]})
+    return 0 if groups else 1
+
+
+def command_organize(args):
+    """Copies or moves matches (or paths read from stdin) into a new folder without prompting."""
+    if args.query is not None:
+        search_engine = open_search_engine(args)
+        try:
+            source_paths = search_engine.search(args.query, search_options_from_args(args))
+        finally:
+            search_engine.close()
+        destination_folder = os.path.abspath(os.path.join(args.root, args.into))
+    else:
+        # `orderly.py search ... | orderly.py organize --into DEST --move` reads the search output
+        source_paths = []
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                source_paths.append(json.loads(line)["path"] if line.startswith("{") else line)
+        destination_folder = os.path.abspath(args.into)
+
+    if not source_paths:
+        logging.error("No files to organize.")
+        return 1
+    if os.path.exists(destination_folder):
+        # Same rule as the app: never merge into an existing folder by accident
+        logging.error(f"A folder named '{destination_folder}' already exists.")
+        return 2
+
+    action_type = "Copy" if args.copy else "Move"
+    os.makedirs(destination_folder)
+    processed_count, errors = run_organize_job(action_type, destination_folder, source_paths,
+                                               on_progress=make_progress_printer(args.quiet))
+    return report_job_result(action_type, destination_folder, processed_count, errors)
+
+
+def command_rules(args):
+    """Sorts every file under ROOT by the rule file in one pass. --dry-run prints the plan instead."""
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not load rules from '{args.rules}': {e}")
+        return 2
+    destination_root = os.path.abspath(os.path.join(args.root, args.into) if args.into else args.root)
+
+    search_engine = open_search_engine(args)
+    try:
+        plan, _ = RulesEngine(search_engine.file_index, rules, destination_root).plan()
+    finally:
+        search_engine.close()
+
+    if args.dry_run:
+        for source_path, destination_path, size in plan:
+            write_json_line({"source": source_path, "destination": destination_path, "size": size})
+        return 0 if plan else 1
+    if not plan:
+        logging.error("No files matched a rule.")
+        return 1
+
+    action_type = "Copy" if args.copy else "Move"
+    processed_count, errors = run_rules_job(action_type, destination_root, plan,
+                                            on_progress=make_progress_printer(args.quiet))
+    return report_job_result(action_type, destination_root, processed_count, errors)
+
+
+def command_resume(args):
+    """Finishes the newest interrupted organize job."""
+    journal = OrganizeJournal.find_interrupted()
+    if not journal:
+        logging.error("There is no interrupted organize job to resume.")
+        return 1
+    processed_count, errors = resume_organize_job(journal, on_progress=make_progress_printer(args.quiet))
+    return report_job_result(journal.action_type, journal.destination_folder, processed_count, errors)
+
+
+def command_undo(args):
+    """Moves the files of the newest completed Move job back where they came from."""
+    journal = OrganizeJournal.find_undoable()
+    if not journal:
+        logging.error("There is no completed Move to undo.")
+        return 1
+    processed_count, errors = undo_organize_job(journal, on_progress=make_progress_printer(args.quiet))
+    return report_job_result("Undo", journal.destination_folder, processed_count, errors)
+
+
+# === END COMMANDS ========================================================
+
+
+# === ARGUMENT PARSING ====================================================
+def build_parser():
+    parser = argparse.ArgumentParser(prog="orderly", description="Search and organize files without the Orderly window.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log engine progress to stderr")
+    parser.add_argument("--metrics", choices=["json", "prometheus"],
+                        help="Print timing and counter metrics to stderr when done")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    walk_parent = argparse.ArgumentParser(add_help=False)
+    walk_parent.add_argument("--workers", type=int, default=WALK_WORKERS, help="Directory listing threads")
+    walk_parent.add_argument("--max-depth", type=int, default=WALK_MAX_DEPTH, help="Deepest folder level to search")
+    walk_parent.add_argument("--follow-links", action="store_true", help="Descend into symlinked folders")
+    walk_parent.add_argument("--exclude", metavar="PATTERN", action="append", default=[],
+                             help="Skip folders/files matching this gitignore-style pattern, e.g. 'build/' "
+                                  "(repeatable; added to the defaults and the root's .orderlyignore)")
+    walk_parent.add_argument("--no-default-excludes", action="store_true",
+                             help="Also search .git, node_modules, __pycache__, virtualenvs and snapshot folders")
+    walk_parent.add_argument("--include-hidden", action="store_true", help="Descend into hidden folders")
+
+    search_parent = argparse.ArgumentParser(add_help=False, parents=[walk_parent])
+    mode_group = search_parent.add_mutually_exclusive_group()
+    mode_group.add_argument("--extension", action="store_true", help="Treat the query as a file extension")
+    mode_group.add_argument("--content", action="store_true", help="Search for the query inside files (text, PDF, DOCX)")
+    search_parent.add_argument("--fuzzy", action="store_true", help="Fuzzy-match filenames (ranked by score)")
+    search_parent.add_argument("-i", "--ignore-case", action="store_true", help="Case-insensitive keyword search")
+
+    search_parser = subparsers.add_parser("search", parents=[search_parent],
+                                          help="Print matching files as JSON Lines")
+    search_parser.add_argument("root", help="Folder to search")
+    search_parser.add_argument("query", help="Keyword (or extension with --extension), or a query such as "
+                                             "'report AND ext:pdf,docx NOT draft size:>10MB modified:<30d'")
+    search_parser.add_argument("--also", metavar="FOLDER", action="append", default=[],
+                               help="Search this folder too, at the same time (repeatable); files reachable from "
+                                    "several folders are printed once")
+    search_parser.add_argument("--profile", metavar="FILE", help="Run the search under cProfile and write the stats "
+                                                                 "to FILE")
+    search_parser.set_defaults(handler=command_search)
+
+    duplicates_parser = subparsers.add_parser("duplicates", parents=[walk_parent],
+                                              help="Print groups of identical files as JSON Lines")
+    duplicates_parser.add_argument("root", help="Folder to search")
+    duplicates_parser.add_argument("--min-size", type=int, default=DUPLICATE_MIN_SIZE,
+                                   help="Ignore files smaller than this many bytes")
+    duplicates_parser.set_defaults(handler=command_duplicates)
+
+    organize_parser = subparsers.add_parser("organize", parents=[search_parent],
+                                            help="Copy or move matching files into a new folder")
+    organize_parser.add_argument("root", nargs="?", help="Folder to search (omit to read paths from stdin)")
+    organize_parser.add_argument("query", nargs="?", help="Keyword (or extension with --extension)")
+    organize_parser.add_argument("--into", required=True,
+                                 help="New folder name (created inside ROOT, or relative to the current folder "
+                                      "when reading paths from stdin)")
+    action_group = organize_parser.add_mutually_exclusive_group(required=True)
+    action_group.add_argument("--move", action="store_true", help="Move files (originals removed)")
+    action_group.add_argument("--copy", action="store_true", help="Copy files (originals retained)")
+    organize_parser.add_argument("-q", "--quiet", action="store_true", help="Don't draw progress on stderr")
+    organize_parser.set_defaults(handler=command_organize)
+
+    rules_parser = subparsers.add_parser("rules", parents=[walk_parent],
+                                         help="Sort every file into folders chosen by a rule file")
+    rules_parser.add_argument("root", help="Folder to sort")
+    rules_parser.add_argument("--rules", default=RULES_PATH, help=f"Rule file (default: {RULES_PATH})")
+    rules_parser.add_argument("--into", help="Folder the rule destinations are relative to (default: ROOT)")
+    rules_parser.add_argument("--dry-run", action="store_true", help="Print the plan as JSON Lines; touch nothing")
+    rules_action_group = rules_parser.add_mutually_exclusive_group()
+    rules_action_group.add_argument("--move", action="store_true", help="Move files (the default)")
+    rules_action_group.add_argument("--copy", action="store_true", help="Copy files (originals retained)")
+    rules_parser.add_argument("-q", "--quiet", action="store_true", help="Don't draw progress on stderr")
+    rules_parser.set_defaults(handler=command_rules)
+
+    resume_parser = subparsers.add_parser("resume", help="Finish the newest interrupted organize job")
+    resume_parser.add_argument("-q", "--quiet", action="store_true", help="Don't draw progress on stderr")
+    resume_parser.set_defaults(handler=command_resume)
+
+    undo_parser = subparsers.add_parser("undo", help="Undo the newest completed Move")
+    undo_parser.add_argument("-q", "--quiet", action="store_true", help="Don't draw progress on stderr")
+    undo_parser.set_defaults(handler=command_undo)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "organize" and (args.root is None) != (args.query is None):
+        parser.error("organize needs both ROOT and QUERY, or neither (to read paths from stdin)")
+    if getattr(args, "query", None) is not None and not args.fuzzy:
+        # Fuzzy queries have no syntax to check, and compiling one would import fuzzywuzzy up front
+        try:
+            compile_query(args.query, search_options_from_args(args))
+        except ValueError as e:
+            parser.error(f"invalid query: {e}")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format='%(levelname)s: %(message)s')
+    try:
+        exit_code = args.handler(args)
+    except BrokenPipeError:
+        # Output piped into e.g. `head`, which stopped reading; not an error
+        sys.stderr.close()
+        return 0
+    except ImportError as e:
+        # Optional packages (fuzzywuzzy for --fuzzy, send2trash) are only imported when first used
+        logging.error(f"{e}. Install it with: pip install {e.name or 'the missing package'}")
+        return 2
+    if args.metrics:
+        sys.stderr.write(metrics.to_json() + "\n" if args.metrics == "json" else metrics.to_prometheus())
+    return exit_code
+
+
+# === END ARGUMENT PARSING ================================================
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Content-search worker processes in a PyInstaller build
+    sys.exit(main())
@@ -1,13 +1,56 @@
+# === STARTUP PROFILING ===================================================
+# Defined before the imports so that --profile-startup can time them too.
+import sys
+import time
+
+
+class StartupProfiler:
+    """Records how long each startup phase takes, reported by --profile-startup."""
+
+    def __init__(self):
+        self.phases = []  # (phase name, seconds, is_deferred)
+        self.phase_start = time.perf_counter()
+
+    def mark(self, phase_name, is_deferred=False):
+        """Ends the current phase under the given name and starts timing the next one."""
+        now = time.perf_counter()
+        self.phases.append((phase_name, now - self.phase_start, is_deferred))
+        self.phase_start = now
+
+    def report(self):
+        """Returns the phase timings as a small text table."""
+        lines = [f"{'Startup phase':<40}{'ms':>10}"]
+        for phase_name, seconds, is_deferred in self.phases:
+            lines.append(f"{phase_name:<40}{seconds * 1000:>10.1f}")
+        time_to_first_frame = sum(seconds for _, seconds, is_deferred in self.phases if not is_deferred)
+        lines.append(f"{'Total to first frame':<40}{time_to_first_frame * 1000:>10.1f}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
+
+# === END STARTUP PROFILING ===============================================
+
+
 # === IMPORTS =============================================================
 import customtkinter as ctk
 import tkinter.filedialog
-import os
-import shutil
 from customtkinter import CTkInputDialog
-from send2trash import send2trash
-from fuzzywuzzy import fuzz
+
+startup_profiler.mark("import customtkinter")
+
+import os
 import logging
-import re
+import threading
+import multiprocessing
+import queue
+from orderly_engine import (SearchEngine, SearchOptions, MultiRootSearch, ResultStore, QueryCache,
+                            OrganizeJournal, RulesEngine, run_organize_job, run_rules_job, resume_organize_job,
+                            undo_organize_job, trash_files, load_rules, ensure_rules_file, summarize_rules_plan,
+                            compile_query, format_bytes, format_duration, is_same_or_inside, metrics, profile_call,
+                            query_refines, PROFILE_DIR, RULES_PATH)
+
+startup_profiler.mark("import orderly_engine")
 
 # === END IMPORTS =========================================================
 
@@ -20,10 +63,337 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
+# Background worker tuning
+WORKER_POLL_INTERVAL_MS = 50  # How often the Tk main loop drains messages posted by worker threads
+SEARCH_AS_YOU_TYPE_DELAY_MS = 250  # Typing pause after which the query is searched without pressing Enter
 
 # === END CONFIGURATION ===================================================
 
 
+# === VIRTUAL RESULTS LIST ================================================
+class VirtualResultsList(ctk.CTkFrame):
+    """Scrollable results list that only creates widgets for the rows that are visible.
+
+    The items and the selection live in plain Python data (self.items, self.selected_items).
+    A small pool of row buttons, sized to the visible height, is re-labelled on every scroll,
+    so the cost of showing or clearing results does not grow with the number of matches.
+
+    Items must be unique. A click selects one row (or clears it if it was the only one selected),
+    Ctrl+click toggles a row and Shift+click selects the range from the last clicked row.
+    """
+
+    ROW_HEIGHT = 32  # Button height (28) plus vertical padding (2 + 2)
+    SELECTED_COLOR = ("#3B8ED0", "#1F6AA5")
+    SHIFT_MASK = 0x0001  # Tk event.state bits
+    CONTROL_MASK = 0x0004
+    COMMAND_MASK = 0x0008  # The Command key on macOS
+
+    def __init__(self, master, label_text="", on_select=None, format_item=str, text_color=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_select = on_select  # Called with the clicked item index after the selection changed
+        self.format_item = format_item  # Turns an item into the text shown on its row
+        self.text_color = text_color
+
+        # --- Data Model ---
+        self.items = []
+        self.selected_items = set()
+        self.anchor_index = None  # Last clicked row; Shift+click ranges start here
+        self.click_modifiers = 0  # event.state of the latest press on a row
+        self.first_visible = 0
+        self.visible_row_count = 1
+
+        # --- Widgets ---
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.header_label = ctk.CTkLabel(self, text=label_text, anchor="center")
+        self.header_label.grid(row=0, column=0, columnspan=2, padx=5, pady=(5, 0), sticky="ew")
+
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.rows_frame.grid(row=1, column=0, padx=(5, 0), pady=5, sticky="nsew")
+        self.rows_frame.grid_columnconfigure(0, weight=1)
+        self.rows_frame.bind("<Configure>", self._on_resize)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, padx=(0, 5), pady=5, sticky="ns")
+
+        self.message_label = ctk.CTkLabel(self.rows_frame, text="", anchor="w")
+
+        self.row_buttons = []  # Recycled pool; grows only when the visible area does
+        self._bind_mouse_wheel(self.rows_frame)
+        self._bind_mouse_wheel(self.message_label)
+
+    # --- Data Model API ---
+    def set_items(self, items):
+        """Replaces all items and clears the selection."""
+        self.items = list(items)
+        self.selected_items = set()
+        self.anchor_index = None
+        self.first_visible = 0
+        self.message_label.grid_forget()
+        self.render()
+
+    def append_items(self, items):
+        """Adds items to the end of the list, keeping scroll position and selection."""
+        self.items.extend(items)
+        self.message_label.grid_forget()
+        self.render()
+
+    def remove_items(self, items):
+        """Removes the given items in one pass, keeping the rest of the selection."""
+        items = set(items)
+        anchor_item = self.items[self.anchor_index] if self.anchor_index is not None else None
+        self.items = [item for item in self.items if item not in items]
+        self.selected_items -= items
+        self.anchor_index = None if anchor_item is None or anchor_item in items else self.items.index(anchor_item)
+        self.render()
+
+    def clear(self):
+        """Removes all items and any message."""
+        self.set_items([])
+
+    def set_message(self, text):
+        """Shows a message (e.g. 'No matching files found.') in place of the rows."""
+        self.message_label.configure(text=text)
+        self.message_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+
+    def select_index(self, index, toggle=False, extend=False):
+        """Selects one item by index. toggle adds/removes it (Ctrl+click); extend selects the range from the anchor."""
+        item = self.items[index]
+        if extend and self.anchor_index is not None:
+            low, high = sorted((self.anchor_index, index))
+            self.selected_items = set(self.items[low:high + 1])
+        elif toggle:
+            self.selected_items ^= {item}
+            self.anchor_index = index
+        elif self.selected_items == {item}:
+            self.selected_items = set()  # Clicking the only selected row again de-selects it
+            self.anchor_index = index
+        else:
+            self.selected_items = {item}
+            self.anchor_index = index
+        self.render()
+
+    def select_all(self):
+        self.selected_items = set(self.items)
+        self.render()
+
+    def clear_selection(self):
+        self.selected_items = set()
+        self.render()
+
+    def get_selected_items(self):
+        """Returns the selected items in list order."""
+        if len(self.selected_items) == len(self.items):
+            return list(self.items)
+        return [item for item in self.items if item in self.selected_items]
+
+    def get_selected_item(self):
+        """Returns the selected item when exactly one is selected, otherwise None."""
+        if len(self.selected_items) != 1:
+            return None
+        return next(iter(self.selected_items))
+
+    # --- Rendering ---
+    def render(self):
+        """Re-labels the pooled row buttons for the current scroll position."""
+        max_first = max(0, len(self.items) - self.visible_row_count)
+        self.first_visible = max(0, min(self.first_visible, max_first))
+
+        for row, button in enumerate(self.row_buttons):
+            index = self.first_visible + row
+            if index < len(self.items):
+                item = self.items[index]
+                fg_color = self.SELECTED_COLOR if item in self.selected_items else "transparent"
+                button.configure(text=self.format_item(item), fg_color=fg_color)
+                button.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
+            else:
+                button.grid_remove()
+
+        if self.items:
+            start = self.first_visible / len(self.items)
+            end = min(1.0, (self.first_visible + self.visible_row_count) / len(self.items))
+            self.scrollbar.set(start, end)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, first_visible):
+        """Scrolls so that the given item index is the first visible row."""
+        self.first_visible = int(first_visible)
+        self.render()
+
+    def _on_resize(self, event):
+        self.visible_row_count = max(1, event.height // self.ROW_HEIGHT)
+        while len(self.row_buttons) < self.visible_row_count:
+            row = len(self.row_buttons)
+            button = ctk.CTkButton(self.rows_frame, text="", height=28, fg_color="transparent",
+                                   text_color=self.text_color, anchor="w",
+                                   command=lambda r=row: self._on_row_click(r))
+            button.bind("<Button-1>", self._remember_modifiers)
+            self._bind_mouse_wheel(button)
+            self.row_buttons.append(button)
+        for button in self.row_buttons[self.visible_row_count:]:
+            button.grid_remove()
+        self.render()
+
+    def _remember_modifiers(self, event):
+        # The button command (run on release) doesn't get the event, so note Shift/Ctrl on press
+        self.click_modifiers = event.state
+
+    def _on_row_click(self, row):
+        index = self.first_visible + row
+        if index >= len(self.items):
+            return
+        self.select_index(index, toggle=bool(self.click_modifiers & (self.CONTROL_MASK | self.COMMAND_MASK)),
+                          extend=bool(self.click_modifiers & self.SHIFT_MASK))
+        self.click_modifiers = 0
+        if self.on_select:
+            self.on_select(index)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.items))
+        elif action == "scroll":
+            step = self.visible_row_count if unit == "pages" else 1
+            self.scroll_to(self.first_visible + int(amount) * step)
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4:
+            delta = -3
+        elif event.num == 5:
+            delta = 3
+        else:
+            delta = -3 if event.delta > 0 else 3
+        self.scroll_to(self.first_visible + delta)
+
+    def _bind_mouse_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_mouse_wheel)  # Windows / macOS
+        widget.bind("<Button-4>", self._on_mouse_wheel)  # Linux scroll up
+        widget.bind("<Button-5>", self._on_mouse_wheel)  # Linux scroll down
+
+
+# === END VIRTUAL RESULTS LIST ============================================
+
+
+# === DIAGNOSTICS WINDOW ==================================================
+class DiagnosticsWindow(ctk.CTkToplevel):
+    """Opt-in window (Ctrl+Shift+D) showing the engine's live metrics, with export and profiling hooks."""
+
+    REFRESH_INTERVAL_MS = 1000
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.title("Orderly - Diagnostics")
+        self.geometry("560x480")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.metrics_text = ctk.CTkTextbox(self, font=("Courier", 12), wrap="none")
+        self.metrics_text.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
+
+        self.buttons_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.buttons_frame.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="ew")
+        ctk.CTkButton(self.buttons_frame, text="Export JSON", width=110,
+                      command=lambda: self.export(metrics.to_json, ".json")).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(self.buttons_frame, text="Export Prometheus", width=140,
+                      command=lambda: self.export(metrics.to_prometheus, ".prom")).pack(side="left", padx=5)
+        ctk.CTkButton(self.buttons_frame, text="Reset", width=70, command=self.reset).pack(side="left", padx=5)
+
+        self.profile_next_search_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(self.buttons_frame, text="Profile next search",
+                        variable=self.profile_next_search_var).pack(side="left", padx=5)
+
+        self.refresh_after_id = None
+        self.refresh()
+
+    def destroy(self):
+        """Stops the refresh loop before the window goes, so no callback fires on a destroyed widget."""
+        if self.refresh_after_id:
+            self.after_cancel(self.refresh_after_id)
+            self.refresh_after_id = None
+        super().destroy()
+
+    def refresh(self):
+        """Redraws the metrics table and re-schedules itself while the window is open."""
+        self.refresh_after_id = None
+        if not self.winfo_exists():
+            return
+        snapshot = metrics.snapshot()
+        lines = ["Counters"]
+        lines += [f"  {name:<32}{value:>16,}" for name, value in sorted(snapshot["counters"].items())]
+        lines += ["", f"Timers{'count':>32}{'total s':>10}{'max s':>10}"]
+        lines += [f"  {name:<30}{timer['count']:>8}{timer['total_seconds']:>10.3f}{timer['max_seconds']:>10.3f}"
+                  for name, timer in sorted(snapshot["timers"].items())]
+        lines += ["", "Gauges"]
+        lines += [f"  {name:<32}{value:>16,}" for name, value in sorted(snapshot["gauges"].items())]
+
+        self.metrics_text.configure(state="normal")
+        self.metrics_text.delete("1.0", "end")
+        self.metrics_text.insert("1.0", "\n".join(lines))
+        self.metrics_text.configure(state="disabled")
+        self.refresh_after_id = self.after(self.REFRESH_INTERVAL_MS, self.refresh)
+
+    def export(self, render_function, extension):
+        """Saves the metrics to a file chosen by the user."""
+        file_path = tkinter.filedialog.asksaveasfilename(parent=self, title="Export Metrics",
+                                                         defaultextension=extension,
+                                                         initialfile=f"orderly-metrics{extension}")
+        if not file_path:
+            return
+        try:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(render_function())
+            logging.info(f"Exported metrics to '{file_path}'.")
+        except OSError as e:
+            logging.error(f"Could not export metrics to '{file_path}': {e}")
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def take_profile_request(self):
+        """Returns True (once) if the next search should be profiled."""
+        if not self.profile_next_search_var.get():
+            return False
+        self.profile_next_search_var.set(False)
+        return True
+
+
+# === END DIAGNOSTICS WINDOW ==============================================
+
+
+# === ERROR REPORT WINDOW =================================================
+class ErrorReportWindow(ctk.CTkToplevel):
+    """Lists the files a batch operation could not process, one 'path: error' line each."""
+
+    def __init__(self, master, title, summary, errors, **kwargs):
+        super().__init__(master, **kwargs)
+        self.title(f"Orderly - {title}")
+        self.geometry("720x400")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.report_text = "\n".join(f"{path}: {error}" for path, error in errors)
+
+        ctk.CTkLabel(self, text=summary, anchor="w").grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+        self.errors_text = ctk.CTkTextbox(self, font=("Courier", 12), wrap="none")
+        self.errors_text.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        self.errors_text.insert("1.0", self.report_text)
+        self.errors_text.configure(state="disabled")
+
+        self.buttons_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.buttons_frame.grid(row=2, column=0, padx=10, pady=(5, 10), sticky="ew")
+        ctk.CTkButton(self.buttons_frame, text="Copy to Clipboard", width=140,
+                      command=self.copy_to_clipboard).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(self.buttons_frame, text="Close", width=70, command=self.destroy).pack(side="right")
+
+    def copy_to_clipboard(self):
+        self.clipboard_clear()
+        self.clipboard_append(self.report_text)
+
+
+# === END ERROR REPORT WINDOW =============================================
+
+
 # === MAIN APPLICATION CLASS ==============================================
 class OrderlyApp(ctk.CTk):
     # --- INITIALIZATION (__init__) ---------------------------------------
@@ -36,13 +406,33 @@ class OrderlyApp(ctk.CTk):
         self.minsize(600, 450)
 
         # --- Internal State Variables ---
-        self.selected_folder = None
-        self.found_files_map = {}  # Maps filename to full path for the current search
-        self.file_buttons = []  # List of CTkButton widgets for files in the results list
-        self.selected_file_button = None  # The currently selected file button widget
+        self.selected_folder = None  # The first search folder; Organize, rules and duplicates work on it
+        self.search_roots = []  # Every folder a search covers (selected_folder first)
+        self.search_engines = []  # SearchEngine (persistent index) per search root, in the same order
+        self.search_engine = None  # The selected folder's SearchEngine
+        self.result_store = ResultStore()  # The shown results; the results list and Organize tab hold its result IDs
+        self.query_cache = QueryCache()  # Results of recent searches, so repeated/toggled-back queries are instant
+        self.duplicate_labels = {}  # Maps result ID to its "#group keep/copy" label while duplicates are shown
+        self.kept_result_ids = set()  # The copy of each duplicate group that Organize leaves alone
+
+        # Background worker state. Workers never touch widgets; they post messages to worker_queue,
+        # which the Tk main loop drains every WORKER_POLL_INTERVAL_MS.
+        self.worker_queue = queue.Queue()
+        self.search_generation = 0  # Incremented per search so messages from superseded searches are ignored
+        self.search_cancel_event = None  # threading.Event of the search in flight
+        self.current_search_keyword = None
+        self.live_search = None  # (keyword, SearchOptions) of the results shown; kept current by the folder watcher
+        self.completed_search = None  # live_search once it ran to completion; refining queries only filter its results
+        self.pending_folder_changes = []  # (engine, added, removed) from the watcher while a search runs
+        self.live_search_after_id = None  # Pending search-as-you-type callback
+        self.search_start_time = None  # time.perf_counter() when the running search started
+        self.organize_start_time = None  # time.monotonic() when the running organize job started
+        self.organize_running = False
+        self.trash_cancel_event = None  # threading.Event of the bulk delete in flight
+        self.diagnostics_window = None
 
         # Internal state for manual placeholder management and text colors
-        self.search_entry_placeholder_text_value = "Enter keyword to search for..."
+        self.search_entry_placeholder_text_value = "Enter keyword, or e.g. report ext:pdf size:>1MB"
         self.new_folder_entry_placeholder_text_value = "e.g., GMC Reports 2024"
         self.placeholder_color = "gray"
         self.normal_text_color = ("black", "white")  # Default for dark/light mode
@@ -57,7 +447,9 @@ class OrderlyApp(ctk.CTk):
         self.tabview.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
 
         self.search_tab = self.tabview.add("Search & Act")
-        self.organize_tab = self.tabview.add("Organize Files")
+        self.organize_tab = self.tabview.add("Organize Files")  # Widgets are built on first open
+        self.organize_tab_built = False
+        self.tabview.configure(command=self.on_tab_changed)
 
         # Configure individual tab grids to expand content correctly
         self.search_tab.grid_columnconfigure(0, weight=1)
@@ -67,6 +459,8 @@ class OrderlyApp(ctk.CTk):
 
         self.organize_tab.grid_columnconfigure(0, weight=1)
         self.organize_tab.grid_rowconfigure(0, weight=1)  # The main controls frame
+        self.organize_tab.grid_rowconfigure(1, weight=1)  # Rules frame
+        startup_profiler.mark("window & tab view")
 
         # --- WIDGETS FOR 'Search & Act' TAB ---
         # 1. Search Controls Frame
@@ -74,6 +468,7 @@ class OrderlyApp(ctk.CTk):
         self.search_controls_frame.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
         self.search_controls_frame.grid_columnconfigure(1, weight=1)
         self.search_controls_frame.grid_columnconfigure(2, weight=0)
+        self.search_controls_frame.grid_columnconfigure(3, weight=0)
 
         self.select_folder_button = ctk.CTkButton(self.search_controls_frame, text="📂 Select Folder",
                                                   command=self.select_folder_and_search)
@@ -82,24 +477,33 @@ class OrderlyApp(ctk.CTk):
         self.search_entry = ctk.CTkEntry(self.search_controls_frame)
         self.search_entry.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
         self.search_entry.bind("<Return>", self.trigger_search)
+        self.search_entry.bind("<KeyRelease>", self.on_search_entry_key_release)
         self.search_entry.bind("<FocusIn>", self.on_search_entry_focus_in)
         self.search_entry.bind("<FocusOut>", self.on_search_entry_focus_out)
 
         self.search_button = ctk.CTkButton(self.search_controls_frame, text="🔍 Search", command=self.trigger_search)
-        self.search_button.grid(row=0, column=2, padx=10, pady=10)
+        self.search_button.grid(row=0, column=2, padx=(10, 0), pady=10)
+
+        self.cancel_search_button = ctk.CTkButton(self.search_controls_frame, text="✖ Cancel", width=80,
+                                                  state="disabled", command=self.cancel_search)
+        self.cancel_search_button.grid(row=0, column=3, padx=10, pady=10)
+
+        self.add_folder_button = ctk.CTkButton(self.search_controls_frame, text="➕ Add Folder",
+                                               command=self.add_search_folder)
+        self.add_folder_button.grid(row=1, column=0, padx=10, pady=(0, 10))
 
         self.selected_folder_label = ctk.CTkLabel(self.search_controls_frame, text="No folder selected.",
                                                   text_color="gray", anchor="w")
-        self.selected_folder_label.grid(row=1, column=0, columnspan=3, padx=10, pady=(0, 10), sticky="ew")
+        self.selected_folder_label.grid(row=1, column=1, columnspan=3, padx=10, pady=(0, 10), sticky="ew")
 
         # 1a. Search Options Frame
         self.options_frame = ctk.CTkFrame(self.search_controls_frame, fg_color="transparent")
-        self.options_frame.grid(row=2, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        self.options_frame.grid(row=2, column=0, columnspan=4, padx=10, pady=5, sticky="w")
 
         self.case_sensitive_var = ctk.BooleanVar(value=True)
         self.case_sensitive_check = ctk.CTkCheckBox(self.options_frame, text="Case Sensitive",
                                                     variable=self.case_sensitive_var,
-                                                    command=self.update_search_options_state)
+                                                    command=self.on_case_sensitive_toggle)
         self.case_sensitive_check.pack(side="left", padx=10)
 
         self.fuzzy_match_var = ctk.BooleanVar(value=False)
@@ -108,15 +512,15 @@ class OrderlyApp(ctk.CTk):
         self.fuzzy_match_switch.pack(side="left", padx=10)
 
         self.search_mode_var = ctk.StringVar(value="Keyword")
-        self.search_mode_switch = ctk.CTkSwitch(self.options_frame, text="Search by Extension",
-                                                variable=self.search_mode_var, onvalue="Extension", offvalue="Keyword",
-                                                command=self.on_extension_switch_toggle)
-        self.search_mode_switch.pack(side="left", padx=20)
+        self.search_mode_selector = ctk.CTkSegmentedButton(self.options_frame, values=["Keyword", "Extension", "Content"],
+                                                           variable=self.search_mode_var,
+                                                           command=self.on_search_mode_change)
+        self.search_mode_selector.pack(side="left", padx=20)
 
         # 1b. Organize Call-to-Action Button
         self.organize_results_button = ctk.CTkButton(self.search_controls_frame, text="📦 Organize Found Files...",
                                                      command=self.switch_to_organize_tab)
-        self.organize_results_button.grid(row=3, column=0, columnspan=3, padx=10, pady=(10, 0), sticky="ew")
+        self.organize_results_button.grid(row=3, column=0, columnspan=4, padx=10, pady=(10, 0), sticky="ew")
 
         # 2. Results List Frame
         self.results_frame = ctk.CTkFrame(self.search_tab)
@@ -124,7 +528,10 @@ class OrderlyApp(ctk.CTk):
         self.results_frame.grid_columnconfigure(0, weight=1)
         self.results_frame.grid_rowconfigure(0, weight=1)
 
-        self.results_list = ctk.CTkScrollableFrame(self.results_frame, label_text="Found Files")
+        # Only the visible rows are real widgets; the full path list is the data model behind them
+        self.results_list = VirtualResultsList(self.results_frame, label_text="Found Files",
+                                               on_select=self.select_file, format_item=self.format_result_item,
+                                               text_color=self.normal_text_color)
         self.results_list.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
 
         # 3. Action Buttons Frame
@@ -134,11 +541,43 @@ class OrderlyApp(ctk.CTk):
         self.open_button = ctk.CTkButton(self.actions_frame, text="↗️ Open File", command=self.open_selected_file)
         self.open_button.pack(side="left", padx=10, pady=5)
 
-        self.delete_button = ctk.CTkButton(self.actions_frame, text="🗑️ Delete File", fg_color="#D32F2F",
+        self.delete_button = ctk.CTkButton(self.actions_frame, text="🗑️ Delete Selected", fg_color="#D32F2F",
                                            hover_color="#B71C1C", command=self.delete_selected_file)
         self.delete_button.pack(side="left", padx=10, pady=5)
 
-        # --- WIDGETS FOR 'Organize Files' TAB ---
+        self.select_all_button = ctk.CTkButton(self.actions_frame, text="☑️ Select All",
+                                               command=self.select_all_results)
+        self.select_all_button.pack(side="left", padx=10, pady=5)
+
+        self.find_duplicates_button = ctk.CTkButton(self.actions_frame, text="🧬 Find Duplicates",
+                                                    command=self.find_duplicates)
+        self.find_duplicates_button.pack(side="right", padx=10, pady=5)
+
+        startup_profiler.mark("'Search & Act' tab widgets")
+
+        # --- GLOBAL STATUS BAR (at bottom of main window) ---
+        self.status_bar = ctk.CTkLabel(self, text="Welcome to Orderly! Select a folder to begin.", anchor="w")
+        self.status_bar.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="ew")
+
+        # --- Initial Setup Calls ---
+        self.update_search_options_state()
+        self.update_status("Welcome to Orderly! Select a folder to begin.")
+        self.on_search_entry_focus_out(None)
+        self.update_organize_ui_state()
+        self.after(WORKER_POLL_INTERVAL_MS, self.process_worker_queue)
+        self.after(200, self.check_for_interrupted_job)  # Reads journals after the first frame is drawn
+        self.bind("<Control-D>", self.open_diagnostics)  # Ctrl+Shift+D
+        startup_profiler.mark("status bar & initial state")
+
+    # --- END INITIALIZATION --------------------------------------------
+
+    # --- DEFERRED 'Organize Files' TAB ---------------------------------
+    def build_organize_tab(self):
+        """Builds the 'Organize Files' widgets. Called the first time the tab is opened."""
+        if self.organize_tab_built:
+            return
+        self.organize_tab_built = True
+
         self.organize_controls_frame = ctk.CTkFrame(self.organize_tab)
         self.organize_controls_frame.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
         self.organize_controls_frame.grid_columnconfigure(0, weight=1)
@@ -173,18 +612,70 @@ class OrderlyApp(ctk.CTk):
                                              command=self.organize_files)
         self.organize_button.grid(row=6, column=0, padx=10, pady=20, sticky="ew")
 
-        # --- GLOBAL STATUS BAR (at bottom of main window) ---
-        self.status_bar = ctk.CTkLabel(self, text="Welcome to Orderly! Select a folder to begin.", anchor="w")
-        self.status_bar.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="ew")
+        self.organize_progress_bar = ctk.CTkProgressBar(self.organize_controls_frame)
+        self.organize_progress_bar.set(0)
+        self.organize_progress_bar.grid(row=7, column=0, padx=10, pady=(0, 5), sticky="ew")
+
+        self.organize_progress_label = ctk.CTkLabel(self.organize_controls_frame, text="", anchor="w")
+        self.organize_progress_label.grid(row=8, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        # Journal-backed recovery actions
+        self.journal_actions_frame = ctk.CTkFrame(self.organize_controls_frame, fg_color="transparent")
+        self.journal_actions_frame.grid(row=9, column=0, padx=10, pady=(0, 10), sticky="w")
+
+        self.resume_job_button = ctk.CTkButton(self.journal_actions_frame, text="⟳ Resume Interrupted Job",
+                                               command=self.resume_interrupted_job)
+        self.resume_job_button.pack(side="left", padx=(0, 10))
+
+        self.undo_move_button = ctk.CTkButton(self.journal_actions_frame, text="↶ Undo Last Move",
+                                              command=self.undo_last_move)
+        self.undo_move_button.pack(side="left")
+
+        # --- Rules: sort the whole folder by a rule file in one pass ---
+        self.rules_frame = ctk.CTkFrame(self.organize_tab)
+        self.rules_frame.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="nsew")
+        self.rules_frame.grid_columnconfigure(0, weight=1)
+        self.rules_frame.grid_rowconfigure(2, weight=1)
+
+        self.rules_info_label = ctk.CTkLabel(self.rules_frame, anchor="w", wraplength=500,
+                                             text="Sort by Rules: every file in the selected folder goes to the "
+                                                  "folder of the first rule it matches (Move/Copy as chosen above).")
+        self.rules_info_label.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+
+        self.rules_controls_frame = ctk.CTkFrame(self.rules_frame, fg_color="transparent")
+        self.rules_controls_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+        self.rules_controls_frame.grid_columnconfigure(0, weight=1)
+
+        self.rules_path_entry = ctk.CTkEntry(self.rules_controls_frame)
+        self.rules_path_entry.insert(0, RULES_PATH)
+        self.rules_path_entry.grid(row=0, column=0, padx=(0, 10), sticky="ew")
+
+        self.edit_rules_button = ctk.CTkButton(self.rules_controls_frame, text="✎ Edit Rules", width=110,
+                                               command=self.edit_rules_file)
+        self.edit_rules_button.grid(row=0, column=1, padx=(0, 10))
+
+        self.preview_rules_button = ctk.CTkButton(self.rules_controls_frame, text="👁 Preview", width=110,
+                                                  command=self.preview_rules)
+        self.preview_rules_button.grid(row=0, column=2, padx=(0, 10))
+
+        self.run_rules_button = ctk.CTkButton(self.rules_controls_frame, text="▶ Run Rules", width=110,
+                                              command=self.run_rules)
+        self.run_rules_button.grid(row=0, column=3)
+
+        self.rules_preview_text = ctk.CTkTextbox(self.rules_frame, height=140, wrap="none")
+        self.rules_preview_text.grid(row=2, column=0, padx=10, pady=(5, 10), sticky="nsew")
+        self.rules_preview_text.configure(state="disabled")
 
-        # --- Initial Setup Calls ---
-        self.update_search_options_state()
-        self.update_status("Welcome to Orderly! Select a folder to begin.")
-        self.on_search_entry_focus_out(None)
         self.on_new_folder_entry_focus_out(None)
         self.update_organize_ui_state()
+        self.update_journal_buttons_state()
 
-    # --- END INITIALIZATION --------------------------------------------
+    def on_tab_changed(self):
+        """Builds the 'Organize Files' tab the first time it is selected."""
+        if self.tabview.get() == "Organize Files":
+            self.build_organize_tab()
+
+    # --- END DEFERRED 'Organize Files' TAB -----------------------------
 
     # --- UI HELPER FUNCTIONS -------------------------------------------
     def update_status(self, message, color="white"):
@@ -197,13 +688,17 @@ class OrderlyApp(ctk.CTk):
         elif color == "red":
             self.status_bar.configure(text_color=("#B71C1C", "#FF5252"))
             logging.error(f"UI Status (RED): {message}")
+        elif color == "orange":
+            self.status_bar.configure(text_color=("#E65100", "#FFAB40"))
+            logging.warning(f"UI Status (ORANGE): {message}")
         else:
             self.status_bar.configure(text_color=("black", "white"))
             logging.info(f"UI Status (WHITE): {message}")
 
     def update_organize_ui_state(self):
         """Centralized function to update the 'Organize Results' button and file count label."""
-        has_files = bool(self.found_files_map)
+        organize_count = self.organize_file_count()
+        has_files = bool(organize_count)
 
         if has_files:
             # Enable the button and assign its command
@@ -212,47 +707,127 @@ class OrderlyApp(ctk.CTk):
             # Disable the button and remove its command to be certain it's inactive
             self.organize_results_button.configure(state="disabled", command=lambda: None)
 
-        self.found_files_count_label.configure(text=f"Files to organize: {len(self.found_files_map)}")
+        if self.organize_tab_built:
+            self.found_files_count_label.configure(text=f"Files to organize: {organize_count}")
+
+    def organize_file_count(self):
+        return len(self.result_store) - len(self.kept_result_ids)
+
+    def organize_result_ids(self):
+        """Returns the IDs of the results the Organize tab acts on: all of them, bar kept duplicates."""
+        return [result_id for result_id in self.result_store.ids() if result_id not in self.kept_result_ids]
 
-    def on_extension_switch_toggle(self):
-        """Wrapper for 'Search by Extension' switch."""
-        if self.search_mode_var.get() == "Extension":
+    def update_journal_buttons_state(self, announce_interrupted=False):
+        """Enables 'Resume' / 'Undo' only when a matching journal exists. The journals are read on a worker.
+
+        With announce_interrupted, the status bar also tells the user about an interrupted job.
+        """
+        if self.organize_running:
+            if self.organize_tab_built:
+                self.resume_job_button.configure(state="disabled")
+                self.undo_move_button.configure(state="disabled")
+            return
+
+        threading.Thread(target=self.run_journal_scan_worker, args=(announce_interrupted,), daemon=True).start()
+
+    def apply_journal_state(self, has_interrupted_job, has_undoable_move, announce_interrupted):
+        """Sets the 'Resume' / 'Undo' buttons from a journal scan once the worker has finished."""
+        if self.organize_running:
+            return  # A job started while the journals were read; its buttons stay disabled
+        if self.organize_tab_built:
+            self.resume_job_button.configure(state="normal" if has_interrupted_job else "disabled")
+            self.undo_move_button.configure(state="normal" if has_undoable_move else "disabled")
+        if announce_interrupted and has_interrupted_job:
+            self.update_status("An interrupted organize job was found. Open 'Organize Files' to resume it.",
+                               color="red")
+
+    def open_diagnostics(self, event=None):
+        """Opens the diagnostics window, or brings it to the front if it is already open."""
+        if self.diagnostics_window and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.focus()
+            return
+        self.diagnostics_window = DiagnosticsWindow(self)
+        logging.info("Diagnostics window opened.")
+
+    def check_for_interrupted_job(self):
+        """Tells the user about an interrupted organize job. Runs once, just after startup."""
+        self.update_journal_buttons_state(announce_interrupted=True)
+
+    def on_search_mode_change(self, mode=None):
+        """Wrapper for the Keyword / Extension / Content mode selector."""
+        mode = mode or self.search_mode_var.get()
+        keyword = self.get_entered_keyword()
+        if mode == "Extension":
             self.update_status("Extension search enabled. Enter a new query.", color="white")
             self.search_entry_placeholder_text_value = "Enter extension (e.g., .pdf, .docx)..."
+        elif mode == "Content":
+            self.update_status("Content search enabled. Enter text to find inside files.", color="white")
+            self.search_entry_placeholder_text_value = "Enter text to find inside files..."
         else:
             self.update_status("Keyword search enabled. Enter a new query.", color="white")
-            self.search_entry_placeholder_text_value = "Enter keyword to search for..."
-
-        self.search_entry.delete(0, "end")
-        self.clear_results_and_selection()
-        self.update_search_options_state()
-        self.on_search_entry_focus_out(None)
+            self.search_entry_placeholder_text_value = "Enter keyword, or e.g. report ext:pdf size:>1MB"
+        self.search_again_with_new_options(keyword)
 
     def on_fuzzy_switch_toggle(self):
         """Wrapper for 'Fuzzy Match' switch."""
+        keyword = self.get_entered_keyword()
         if self.fuzzy_match_var.get():
             self.update_status("Fuzzy Match enabled. Enter a new query.", color="white")
         else:
             self.update_status("Fuzzy Match disabled. Enter a new query.", color="white")
-            if self.search_mode_var.get() != "Extension":
-                self.search_entry_placeholder_text_value = "Enter keyword to search for..."
+            if self.search_mode_var.get() == "Keyword":
+                self.search_entry_placeholder_text_value = "Enter keyword, or e.g. report ext:pdf size:>1MB"
+        self.search_again_with_new_options(keyword)
 
-        self.search_entry.delete(0, "end")
-        self.clear_results_and_selection()
+    def on_case_sensitive_toggle(self):
+        """Wrapper for the 'Case Sensitive' checkbox."""
+        self.search_again_with_new_options(self.get_entered_keyword())
+
+    def get_entered_keyword(self):
+        """Returns the text in the search entry, or "" while it shows the placeholder."""
+        keyword = self.search_entry.get().strip()
+        return "" if keyword == self.search_entry_placeholder_text_value else keyword
+
+    def search_again_with_new_options(self, keyword):
+        """Re-runs the entered keyword after a search option changed, or resets the entry if there is none.
+
+        Switching an option back repeats an earlier search, which the query cache answers at once.
+        Content searches read every file, so they still wait for Enter.
+        """
         self.update_search_options_state()
-        self.on_search_entry_focus_out(None)
+        if keyword and self.selected_folder and self.search_mode_var.get() != "Content":
+            self.search_entry.delete(0, "end")
+            self.search_entry.insert(0, keyword)
+            self.search_entry.configure(text_color=self.normal_text_color)
+            self.trigger_search()
+            return
+
+        self.cancel_search(silent=True)
+        self.clear_results_and_selection()
+        if not keyword:
+            self.search_entry.delete(0, "end")
+            self.on_search_entry_focus_out(None)
 
     def clear_results_and_selection(self):
         """Clears the results list, selection, and updates the organize UI state."""
-        for widget in self.results_list.winfo_children():
-            widget.destroy()
-        self.found_files_map = {}
-        self.file_buttons = []
-        self.selected_file_button = None
+        self.results_list.clear()
+        self.result_store = ResultStore()
+        self.duplicate_labels = {}
+        self.kept_result_ids = set()
+        self.live_search = None
+        self.completed_search = None
+        self.pending_folder_changes = []
         self.update_organize_ui_state()
 
     def update_search_options_state(self):
-        """Disables/enables the 'Case Sensitive' checkbox based on other options."""
+        """Disables/enables the 'Case Sensitive' checkbox and 'Fuzzy Match' switch based on other options."""
+        if self.search_mode_var.get() == "Content":
+            # Fuzzy matching only applies to filenames
+            self.fuzzy_match_switch.deselect()
+            self.fuzzy_match_switch.configure(state="disabled")
+        else:
+            self.fuzzy_match_switch.configure(state="normal")
+
         is_fuzzy_mode = self.fuzzy_match_var.get()
         is_extension_mode = (self.search_mode_var.get() == "Extension")
 
@@ -286,8 +861,26 @@ class OrderlyApp(ctk.CTk):
             self.new_folder_entry.insert(0, self.new_folder_entry_placeholder_text_value)
             self.new_folder_entry.configure(text_color=self.placeholder_color)
 
+    def set_search_running(self, is_running):
+        """Enables the Cancel button while a search is in flight."""
+        self.cancel_search_button.configure(state="normal" if is_running else "disabled")
+
+    def format_result_item(self, result_id):
+        """Returns a result's row label: its filename, prefixed with its group when showing duplicates."""
+        label = self.duplicate_labels.get(result_id)
+        name = self.result_store.name(result_id)
+        return f"{label}   {name}" if label else name
+
+    def add_results(self, result_ids):
+        """Appends result IDs (already in self.result_store) to the results list."""
+        with metrics.timer("render"):
+            self.results_list.append_items(result_ids)
+        metrics.increment("results_rendered", len(result_ids))
+        metrics.set_gauge("results_shown", len(self.result_store))
+
     def switch_to_organize_tab(self):
         """Switches the active tab to the 'Organize Files' tab."""
+        self.build_organize_tab()  # tabview.set() does not fire the tab view's command
         self.tabview.set("Organize Files")
         self.update_status("Switched to Organize Files tab.", color="white")
         logging.info("Switched to Organize Files tab.")
@@ -301,24 +894,118 @@ class OrderlyApp(ctk.CTk):
 
         if not folder_path:
             self.selected_folder = None
+            self.search_roots = []
             self.selected_folder_label.configure(text="No folder selected.", text_color="gray")
             self.update_status("Folder selection cancelled.", color="red")
             logging.info("Folder selection cancelled by user.")
             return
 
-        self.selected_folder = folder_path
-        self.selected_folder_label.configure(text=f"Searching in: {self.selected_folder}",
-                                             text_color=("black", "white"))
-
         self.search_entry.delete(0, "end")
         self.on_search_entry_focus_out(None)
+        self.set_search_roots([os.path.normpath(folder_path)])
         self.update_status(
             f"Selected folder: '{os.path.basename(self.selected_folder)}'. Enter keyword and press 'Search' or 'Enter'.",
             color="green")
         logging.info(f"Folder selected: {self.selected_folder}")
 
+    def add_search_folder(self):
+        """Adds another folder (e.g. a second drive or a network share) to the folders every search covers."""
+        if not self.selected_folder:
+            self.select_folder_and_search()
+            return
+        folder_path = tkinter.filedialog.askdirectory(title="Add a Folder to Search")
+        if not folder_path:
+            self.update_status("Adding a folder cancelled.", color="white")
+            return
+
+        folder_path = os.path.normpath(folder_path)
+        covering_root = next((root for root in self.search_roots if is_same_or_inside(folder_path, root)), None)
+        if covering_root:
+            self.update_status(f"'{folder_path}' is already searched as part of '{covering_root}'.", color="white")
+            return
+        # A new folder that contains current ones replaces them
+        roots = [root for root in self.search_roots if not is_same_or_inside(root, folder_path)]
+        if not roots:
+            roots = [folder_path]
+        else:
+            roots.append(folder_path)
+        self.set_search_roots(roots)
+        self.update_status(f"Added '{os.path.basename(folder_path)}'. Searches now cover {len(roots)} folder(s).",
+                           color="green")
+        logging.info(f"Search folders: {roots}")
+
+    def set_search_roots(self, roots):
+        """Switches the searched folders: opens engines (and background indexing) for new folders, closes the rest."""
+        self.cancel_search(silent=True)
+        self.clear_results_and_selection()  # Old results (and narrowing) belong to the previous folders
+
+        engines_by_root = {search_engine.root_folder: search_engine for search_engine in self.search_engines}
+        self.search_engines = []
+        for root in roots:
+            search_engine = engines_by_root.pop(os.path.normpath(root), None)
+            if not search_engine:
+                search_engine = self.open_search_engine(root)
+            self.search_engines.append(search_engine)
+        for search_engine in engines_by_root.values():
+            search_engine.close()
+
+        self.search_roots = [search_engine.root_folder for search_engine in self.search_engines]
+        self.search_engine = self.search_engines[0]
+        self.selected_folder = self.search_roots[0]
+        if len(self.search_roots) == 1:
+            label_text = f"Searching in: {self.selected_folder}"
+        else:
+            label_text = f"Searching in {len(self.search_roots)} folders: {'; '.join(self.search_roots)}"
+        self.selected_folder_label.configure(text=label_text, text_color=("black", "white"))
+
+    def open_search_engine(self, folder_path):
+        """Opens the search engine for a folder and builds/refreshes its persistent index in the background."""
+        search_engine = SearchEngine(folder_path, query_cache=self.query_cache)
+
+        if not search_engine.file_index.is_built():
+            self.update_status(f"Indexing '{os.path.basename(folder_path)}' in the background. "
+                               f"You can search right away.", color="white")
+
+        threading.Thread(target=self.run_index_worker, args=(search_engine,), daemon=True).start()
+        return search_engine
+
+    def get_search_options(self):
+        """Snapshots the search switches as SearchOptions (worker threads must not read Tk variables)."""
+        return SearchOptions(mode=self.search_mode_var.get(), case_sensitive=self.case_sensitive_var.get(),
+                             fuzzy=self.fuzzy_match_var.get())
+
+    def on_search_entry_key_release(self, event):
+        """Schedules a search once typing pauses for SEARCH_AS_YOU_TYPE_DELAY_MS."""
+        if event.keysym in ("Return", "KP_Enter") or self.search_mode_var.get() == "Content":
+            return  # Content searches read every file, so they only run on Enter
+        if self.live_search_after_id:
+            self.after_cancel(self.live_search_after_id)
+        self.live_search_after_id = self.after(SEARCH_AS_YOU_TYPE_DELAY_MS, self.run_live_search)
+
+    def run_live_search(self):
+        """Searches for the typed query, or clears the results when the entry was emptied."""
+        self.live_search_after_id = None
+        if not self.selected_folder:
+            return
+        keyword = self.search_entry.get().strip()
+        if not keyword:
+            self.cancel_search(silent=True)
+            self.clear_results_and_selection()
+            return
+        if self.live_search == (keyword, self.get_search_options()):
+            return  # Already searched (or searching) for exactly this
+        self.trigger_search()
+
     def trigger_search(self, event=None):
-        """Gets the keyword, launches the search, and displays results."""
+        """Gets the keyword and launches the search on a background worker, cancelling any search in flight.
+
+        When the query refines the last completed search (e.g. "rep" -> "report"), only that
+        search's results are filtered instead of searching the whole folder again.
+        """
+        if self.live_search_after_id:
+            self.after_cancel(self.live_search_after_id)
+            self.live_search_after_id = None
+
         if not self.selected_folder:
             self.update_status("Please select a folder before searching.", color="red")
             self.select_folder_and_search()
@@ -330,103 +1017,398 @@ class OrderlyApp(ctk.CTk):
             self.update_status("Search keyword is empty. Please enter a keyword.", color="red")
             return
 
-        self.update_status(f"Searching for '{keyword}' in '{os.path.basename(self.selected_folder)}'...", color="white")
-        self.results_list.update()
+        options = self.get_search_options()
+        try:
+            compile_query(keyword, options)  # Report query-language mistakes before dropping the current results
+        except ValueError as e:
+            self.update_status(f"Invalid query: {e}", color="red")
+            return
 
-        self.clear_results_and_selection()
+        candidate_paths = None
+        if self.completed_search and self.completed_search[1] == options \
+                and query_refines(self.completed_search[0], keyword, options):
+            candidate_paths = self.result_store.paths(self.results_list.items)
 
-        matching_files = self.perform_search(self.selected_folder, keyword)
+        self.cancel_search(silent=True)
+        self.clear_results_and_selection()
 
-        if not matching_files:
-            self.update_status(f"No files found containing '{keyword}'.", color="red")
-            label = ctk.CTkLabel(self.results_list, text="No matching files found.")
-            label.pack(padx=10, pady=5, anchor="w")
+        profile_path = None
+        if self.diagnostics_window and self.diagnostics_window.winfo_exists() \
+                and self.diagnostics_window.take_profile_request():
+            profile_path = os.path.join(PROFILE_DIR, f"search-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+
+        self.search_generation += 1
+        self.search_cancel_event = threading.Event()
+        self.current_search_keyword = keyword
+        self.live_search = (keyword, options)
+        self.search_start_time = time.perf_counter()
+        self.set_search_running(True)
+        if candidate_paths is None:
+            folder_text = (f"'{os.path.basename(self.selected_folder)}'" if len(self.search_roots) == 1
+                           else f"{len(self.search_roots)} folders")
+            self.update_status(f"Searching for '{keyword}' in {folder_text}...", color="white")
         else:
-            for file_path in matching_files:
-                filename_only = os.path.basename(file_path)
-                self.found_files_map[filename_only] = file_path
+            self.update_status(f"Narrowing {len(candidate_paths)} previous result(s) to '{keyword}'...", color="white")
 
-                file_button = ctk.CTkButton(self.results_list, text=filename_only, fg_color="transparent",
-                                            text_color=self.normal_text_color, anchor="w")
-                file_button.configure(command=lambda btn=file_button: self.select_file(btn))
-                file_button.pack(fill="x", padx=5, pady=2)
-                self.file_buttons.append(file_button)
+        threading.Thread(target=self.run_search_worker,
+                         args=(self.search_generation, list(self.search_roots), keyword, options,
+                               self.search_cancel_event, profile_path, candidate_paths, self.result_store),
+                         daemon=True).start()
 
-            self.update_status(f"Search complete. Found {len(matching_files)} file(s).", color="green")
-            logging.info(f"Search complete for '{keyword}'. Found {len(matching_files)} files.")
+    def cancel_search(self, silent=False):
+        """Aborts the search in flight, if any. Results found so far stay in the list."""
+        if not self.search_cancel_event or self.search_cancel_event.is_set():
+            return
+        self.search_cancel_event.set()
+        if silent:
+            # Superseded searches are dropped entirely; their queued messages no longer match the generation
+            self.search_generation += 1
+            self.set_search_running(False)
+        else:
+            self.update_status("Cancelling search...", color="white")
+        logging.info(f"Search for '{self.current_search_keyword}' cancelled.")
+
+    def finish_search(self, keyword, match_count, was_cancelled):
+        """Updates the UI once the search worker has finished."""
+        self.set_search_running(False)
+        self.search_cancel_event = None
+        metrics.record_time("search_total", time.perf_counter() - self.search_start_time)
+        if not was_cancelled:
+            self.completed_search = self.live_search
+
+        if was_cancelled:
+            self.update_status(f"Search cancelled. Showing {match_count} file(s) found so far.", color="white")
+        elif not match_count:
+            self.update_status(f"No files found containing '{keyword}'.", color="red")
+            self.results_list.set_message("No matching files found.")
+        else:
+            self.update_status(f"Search complete. Found {match_count} file(s).", color="green")
+            logging.info(f"Search complete for '{keyword}'. Found {match_count} files.")
 
         self.update_organize_ui_state()
+        self.apply_pending_folder_changes()
+
+    def perform_search(self, roots, keyword, options, cancel_event=None, on_batch=None, on_progress=None,
+                       candidate_paths=None, result_store=None):
+        """Searches every root folder at once with their engines. Runs on the search worker thread.
+
+        With a result_store, matches are added to it and reported as result IDs (see SearchEngine.search).
+        """
+        engines_by_root = {search_engine.root_folder: search_engine for search_engine in self.search_engines}
+        search_engines = [engines_by_root.get(os.path.normpath(root)) or SearchEngine(root) for root in roots]
+        try:
+            return MultiRootSearch(search_engines).search(keyword, options, cancel_event=cancel_event,
+                                                          on_batch=on_batch, on_progress=on_progress,
+                                                          candidate_paths=candidate_paths, result_store=result_store)
+        finally:
+            for search_engine in search_engines:
+                if search_engine not in self.search_engines:
+                    search_engine.close()
+
+    def find_duplicates(self):
+        """Launches the duplicate finder for the selected folder on a background worker."""
+        if not self.selected_folder or not self.search_engine:
+            self.update_status("Please select a folder before looking for duplicates.", color="red")
+            self.select_folder_and_search()
+            return
 
-    def perform_search(self, folder_path, keyword):
-        """Searches for files based on the current search mode and options."""
-        logging.info(f"Starting search in '{folder_path}' for '{keyword}' with mode='{self.search_mode_var.get()}', "
-                     f"case_sensitive={self.case_sensitive_var.get()}, fuzzy_match={self.fuzzy_match_var.get()}")
-
-        found_files = []
-
-        mode = self.search_mode_var.get()
-        is_case_sensitive = self.case_sensitive_var.get()
-        is_fuzzy = self.fuzzy_match_var.get()
-
-        keyword_for_comparison = keyword.lower() if not is_case_sensitive else keyword
-
-        for root, dirs, files in os.walk(folder_path):
-            for filename in files:
-                target_text = filename.lower() if not is_case_sensitive else filename
-
-                match_found = False
-                if mode == "Extension":
-                    clean_ext_base = re.sub(r'[^a-zA-Z0-9]', '', keyword_for_comparison).strip()
-
-                    if clean_ext_base:
-                        clean_ext = '.' + clean_ext_base.lower()
-                    else:
-                        continue
+        self.cancel_search(silent=True)
+        self.clear_results_and_selection()
+        self.search_generation += 1
+        self.search_cancel_event = threading.Event()
+        self.current_search_keyword = "duplicates"
+        self.search_start_time = time.perf_counter()
+        self.set_search_running(True)
+        self.update_status(f"Looking for duplicate files in '{os.path.basename(self.selected_folder)}'...",
+                           color="white")
+
+        threading.Thread(target=self.run_duplicates_worker,
+                         args=(self.search_generation, self.search_engine, self.search_cancel_event),
+                         daemon=True).start()
+
+    def show_duplicate_groups(self, groups, was_cancelled):
+        """Lists every duplicate group, and hands all but the kept (oldest) copy of each to the Organize tab."""
+        self.set_search_running(False)
+        self.search_cancel_event = None
+        metrics.record_time("duplicates_total", time.perf_counter() - self.search_start_time)
+        if was_cancelled:
+            self.update_status("Duplicate search cancelled.", color="white")
+            return
+        if not groups:
+            self.update_status("No duplicate files found.", color="green")
+            self.results_list.set_message("No duplicate files found.")
+            return
 
-                    if target_text.lower().endswith(clean_ext):
-                        match_found = True
-                else:
-                    if is_fuzzy:
-                        if fuzz.partial_ratio(keyword_for_comparison, target_text) > 75:
-                            match_found = True
-                    else:
-                        if keyword_for_comparison in target_text:
-                            match_found = True
+        result_ids = []
+        wasted_bytes = 0
+        for group_number, (file_size, group) in enumerate(groups, 1):
+            kept_id = self.result_store.add_path(group[0], size=file_size)
+            self.kept_result_ids.add(kept_id)
+            self.duplicate_labels[kept_id] = f"#{group_number} keep"
+            result_ids.append(kept_id)
+            for file_path in group[1:]:
+                result_id = self.result_store.add_path(file_path, size=file_size)
+                self.duplicate_labels[result_id] = f"#{group_number} copy"
+                result_ids.append(result_id)
+            wasted_bytes += file_size * (len(group) - 1)
+        self.results_list.append_items(result_ids)
+        self.update_organize_ui_state()
 
-                if match_found:
-                    full_path = os.path.join(root, filename)
-                    found_files.append(full_path)
+        copy_count = self.organize_file_count()
+        self.update_status(f"Found {len(groups)} group(s) of duplicates: {copy_count} extra "
+                           f"cop{'y' if copy_count == 1 else 'ies'} using {format_bytes(wasted_bytes)}. "
+                           f"Organize moves or copies the extra copies.", color="green")
+
+    def apply_folder_changes(self, search_engine, added_paths, removed_paths):
+        """Updates the shown results with files the folder watcher saw appear or disappear."""
+        if search_engine not in self.search_engines or not self.live_search:
+            return  # No search results to update
+        if self.search_cancel_event:
+            # A narrowing search only re-checks the previous results, so it would miss these; apply them afterwards
+            self.pending_folder_changes.append((search_engine, added_paths, removed_paths))
+            return
 
-        return found_files
+        removed_results = self.result_store.find(removed_paths) if removed_paths else []
+        if removed_results:
+            self.remove_results(removed_results)
+
+        keyword, options = self.live_search
+        added_results = []
+        if options.mode != "Content":  # New files would have to be read to know if they match; search again for those
+            query = compile_query(keyword, options)
+            added_paths = [path for path in added_paths if query.matches_path(path)]
+            shown = set(self.result_store.paths(self.result_store.find(added_paths)))
+            added_results = [self.result_store.add_path(path) for path in added_paths if path not in shown]
+        if added_results:
+            self.add_results(added_results)
+
+        if removed_results or added_results:
+            self.update_organize_ui_state()
+            self.update_status(f"Folder changed: {len(added_results)} result(s) added, {len(removed_results)} removed. "
+                               f"Showing {len(self.results_list.items)} file(s).", color="white")
+
+    def apply_pending_folder_changes(self):
+        """Applies the folder changes that arrived while the search was running."""
+        pending_folder_changes, self.pending_folder_changes = self.pending_folder_changes, []
+        for search_engine, added_paths, removed_paths in pending_folder_changes:
+            self.apply_folder_changes(search_engine, added_paths, removed_paths)
+
+    def remove_results(self, result_ids):
+        """Drops results from the store and the results list in one update."""
+        self.result_store.remove(result_ids)
+        self.kept_result_ids.difference_update(result_ids)
+        self.results_list.remove_items(result_ids)
 
     # --- END CORE LOGIC FUNCTIONS --------------------------------------
 
+    # --- BACKGROUND WORKER FUNCTIONS -----------------------------------
+    def run_index_worker(self, search_engine):
+        """Builds or refreshes the filename index. Runs on a worker thread."""
+        try:
+            search_engine.prepare()
+            if not search_engine.is_closed:
+                self.worker_queue.put(("index_ready", search_engine, search_engine.file_index.file_count()))
+                search_engine.start_watching(
+                    lambda added, removed: self.worker_queue.put(("folder_changes", search_engine, added, removed)))
+        except Exception as e:
+            self.worker_queue.put(("index_error", search_engine, str(e)))
+
+    def run_search_worker(self, generation, roots, keyword, options, cancel_event, profile_path=None,
+                          candidate_paths=None, result_store=None):
+        """Runs perform_search and posts its batches and progress to the worker queue. Runs on a worker thread.
+
+        With a profile_path, the search runs under cProfile and the stats are written there.
+        """
+        def on_batch(result_ids):
+            self.worker_queue.put(("search_batch", generation, result_ids))
+
+        def on_progress(files_scanned, files_matched):
+            self.worker_queue.put(("search_progress", generation, files_scanned, files_matched))
+
+        try:
+            if profile_path:
+                found_files = profile_call(profile_path, self.perform_search, roots, keyword, options,
+                                           cancel_event=cancel_event, on_batch=on_batch, on_progress=on_progress,
+                                           candidate_paths=candidate_paths, result_store=result_store)
+            else:
+                found_files = self.perform_search(roots, keyword, options, cancel_event=cancel_event,
+                                                  on_batch=on_batch, on_progress=on_progress,
+                                                  candidate_paths=candidate_paths, result_store=result_store)
+            self.worker_queue.put(("search_done", generation, keyword, len(found_files), cancel_event.is_set()))
+            if profile_path:
+                self.worker_queue.put(("profile_saved", profile_path))
+        except Exception as e:
+            self.worker_queue.put(("search_error", generation, str(e)))
+
+    def run_duplicates_worker(self, generation, search_engine, cancel_event):
+        """Runs the duplicate finder and posts its progress and groups. Runs on a worker thread."""
+        def on_progress(stage, files_done, files_total):
+            self.worker_queue.put(("duplicates_progress", generation, stage, files_done, files_total))
+
+        try:
+            groups = search_engine.find_duplicates(cancel_event=cancel_event, on_progress=on_progress)
+            self.worker_queue.put(("duplicates_done", generation, groups, cancel_event.is_set()))
+        except Exception as e:
+            self.worker_queue.put(("search_error", generation, str(e)))
+
+    def run_rules_plan_worker(self, search_engine, rules, run_after):
+        """Plans a rules job over the folder's index and posts the plan. Runs on a worker thread."""
+        def on_progress(files_examined, files_planned):
+            self.worker_queue.put(("rules_progress", files_examined, files_planned))
+
+        try:
+            plan, rule_counts = RulesEngine(search_engine.file_index, rules).plan(on_progress=on_progress)
+            self.worker_queue.put(("rules_planned", search_engine, rules, plan, rule_counts, run_after))
+        except Exception as e:
+            logging.error(f"Error while applying rules: {e}")
+            self.worker_queue.put(("rules_error", str(e)))
+
+    def run_trash_worker(self, result_store, result_ids_by_path, cancel_event):
+        """Moves the results' files to the Recycle Bin and posts its progress. Runs on a worker thread."""
+        def on_progress(files_done, files_total):
+            self.worker_queue.put(("trash_progress", files_done, files_total))
+
+        try:
+            trashed_paths, errors = trash_files(list(result_ids_by_path), cancel_event=cancel_event,
+                                                on_progress=on_progress)
+            trashed_ids = [result_ids_by_path[file_path] for file_path in trashed_paths]
+            self.worker_queue.put(("trash_done", result_store, trashed_ids, errors, cancel_event.is_set()))
+        except Exception as e:
+            logging.error(f"Error while moving files to Recycle Bin: {e}")
+            self.worker_queue.put(("trash_done", result_store, [], [("", str(e))], False))
+
+    def run_organize_worker(self, action_type, destination_folder_path, job_function, *job_args):
+        """Runs an organize, resume or undo job function and posts its progress. Runs on a worker thread."""
+        def on_progress(files_done, files_total, bytes_done, bytes_total):
+            self.worker_queue.put(("organize_progress", files_done, files_total, bytes_done, bytes_total))
+
+        try:
+            processed_count, errors = job_function(*job_args, on_progress=on_progress)
+            self.worker_queue.put(("organize_done", action_type, destination_folder_path, processed_count, errors))
+        except Exception as e:
+            logging.error(f"Error during file organization: {e}")
+            self.worker_queue.put(("organize_done", action_type, destination_folder_path, 0, [("", str(e))]))
+
+    def run_journal_scan_worker(self, announce_interrupted):
+        """Checks the organize journals for a job to resume or undo. Runs on a worker thread."""
+        has_interrupted_job = False
+        has_undoable_move = False
+        try:
+            has_interrupted_job = OrganizeJournal.find_interrupted(with_entries=False) is not None
+            has_undoable_move = OrganizeJournal.find_undoable(with_entries=False) is not None
+        except (OSError, ValueError, IndexError) as e:
+            logging.error(f"Could not read organize journals: {e}")
+        self.worker_queue.put(("journal_state", has_interrupted_job, has_undoable_move, announce_interrupted))
+
+    def process_worker_queue(self):
+        """Applies messages posted by worker threads. Re-schedules itself on the Tk main loop."""
+        try:
+            while True:
+                self.handle_worker_message(self.worker_queue.get_nowait())
+        except queue.Empty:
+            pass
+        self.after(WORKER_POLL_INTERVAL_MS, self.process_worker_queue)
+
+    def handle_worker_message(self, message):
+        """Dispatches a single worker message to the UI."""
+        kind = message[0]
+
+        if kind == "index_ready":
+            _, search_engine, file_count = message
+            if search_engine in self.search_engines and not self.search_cancel_event:
+                self.update_status(f"Index ready for '{os.path.basename(search_engine.root_folder)}': "
+                                   f"{file_count} file(s). Enter keyword and press 'Search' or 'Enter'.", color="green")
+        elif kind == "index_error":
+            _, search_engine, error = message
+            if search_engine in self.search_engines:
+                self.update_status(f"Error while indexing '{search_engine.root_folder}': {error}", color="red")
+        elif kind == "profile_saved":
+            self.update_status(f"Search profile saved to '{message[1]}'.", color="green")
+        elif kind == "folder_changes":
+            self.apply_folder_changes(*message[1:])
+        elif kind == "organize_progress":
+            self.update_organize_progress(*message[1:])
+        elif kind == "organize_done":
+            self.finish_organize(*message[1:])
+        elif kind == "journal_state":
+            self.apply_journal_state(*message[1:])
+        elif kind == "rules_progress":
+            self.update_status(f"Applying rules... {message[1]:,} file(s) checked, {message[2]:,} to organize.")
+        elif kind == "rules_planned":
+            self.show_rules_plan(*message[1:])
+        elif kind == "rules_error":
+            self.set_rules_buttons_state("normal")
+            self.update_status(f"An error occurred while applying rules: {message[1]}", color="red")
+        elif kind == "trash_progress":
+            self.update_status(f"Moving files to the Recycle Bin... {message[1]:,} / {message[2]:,}")
+        elif kind == "trash_done":
+            self.finish_delete(*message[1:])
+        elif message[1] != self.search_generation:
+            return  # Message from a superseded search
+        elif kind == "search_batch":
+            self.add_results(message[2])
+        elif kind == "search_progress":
+            _, _, files_scanned, files_matched = message
+            if not self.search_cancel_event.is_set():
+                # Written straight to the status bar so live counters don't flood the log
+                self.status_bar.configure(text=f"Searching for '{self.current_search_keyword}'... "
+                                               f"{files_scanned:,} files scanned, {files_matched:,} matched.",
+                                          text_color=("black", "white"))
+        elif kind == "search_done":
+            _, _, keyword, match_count, was_cancelled = message
+            self.finish_search(keyword, match_count, was_cancelled)
+        elif kind == "duplicates_progress":
+            _, _, stage, files_done, files_total = message
+            if not self.search_cancel_event.is_set():
+                stage_text = {"size": "Comparing sizes", "partial": "Hashing file ends",
+                              "full": "Hashing whole files"}[stage]
+                self.status_bar.configure(text=f"Looking for duplicates... {stage_text}: {files_done:,} / "
+                                               f"{files_total:,} files.", text_color=("black", "white"))
+        elif kind == "duplicates_done":
+            self.show_duplicate_groups(*message[2:])
+        elif kind == "search_error":
+            self.set_search_running(False)
+            self.search_cancel_event = None
+            self.update_status(f"An error occurred during search: {message[2]}", color="red")
+            self.update_organize_ui_state()
+            self.apply_pending_folder_changes()
+
+    # --- END BACKGROUND WORKER FUNCTIONS -------------------------------
+
     # --- FILE ACTION FUNCTIONS -----------------------------------------
-    def select_file(self, button_to_select):
-        """Highlights the selected file button. Allows de-selecting by clicking again."""
-        if self.selected_file_button == button_to_select:
-            self.selected_file_button.configure(fg_color="transparent")
-            self.selected_file_button = None
+    def select_file(self, index):
+        """Reports the selection after a click on a result row (the list itself handles Shift/Ctrl)."""
+        selected_items = self.results_list.get_selected_items()
+        if not selected_items:
             self.update_status("File de-selected.")
             logging.info("File de-selected.")
-            return
-
-        if self.selected_file_button:
-            self.selected_file_button.configure(fg_color="transparent")
+        elif len(selected_items) == 1:
+            selected_filename = self.result_store.name(selected_items[0])
+            file_size, _ = self.result_store.file_info(selected_items[0])
+            size_text = f" ({format_bytes(file_size)})" if file_size >= 0 else ""
+            self.update_status(f"Selected: '{selected_filename}'{size_text}")
+            logging.info(f"File selected: '{selected_filename}'")
+        else:
+            self.update_status(f"{len(selected_items):,} files selected.")
 
-        self.selected_file_button = button_to_select
-        self.selected_file_button.configure(fg_color=("#3B8ED0", "#1F6AA5"))
-        self.update_status(f"Selected: '{self.selected_file_button.cget('text')}'")
-        logging.info(f"File selected: '{self.selected_file_button.cget('text')}'")
+    def select_all_results(self):
+        """Selects every result currently shown."""
+        if not self.results_list.items:
+            self.update_status("No results to select.", color="red")
+            return
+        self.results_list.select_all()
+        self.update_status(f"{len(self.results_list.items):,} files selected.")
 
     def open_selected_file(self):
         """Opens the currently selected file using the default system application."""
-        if not self.selected_file_button:
+        result_id = self.results_list.get_selected_item()
+        if result_id is None:
             self.update_status("No file selected to open. Please select a file first.", color="red")
             return
 
-        selected_filename = self.selected_file_button.cget("text")
-        file_path_to_open = self.found_files_map.get(selected_filename)
+        file_path_to_open = self.result_store.path(result_id)
+
+        selected_filename = os.path.basename(file_path_to_open)
 
         if file_path_to_open and os.path.exists(file_path_to_open):
             self.update_status(f"Opening file: '{selected_filename}'...", color="green")
@@ -438,54 +1420,68 @@ class OrderlyApp(ctk.CTk):
                 f"Error: File path not found or does not exist for '{selected_filename}' at '{file_path_to_open}'")
 
     def delete_selected_file(self):
-        """Shows a confirmation dialog and moves the selected file to the Recycle Bin."""
-        if not self.selected_file_button:
-            self.update_status("No file selected to delete. Please select a file first.", color="red")
+        """Asks for one confirmation, then moves every selected file to the Recycle Bin on a worker thread."""
+        if self.trash_cancel_event:
+            # A second click while a bulk delete runs stops it after the current batch
+            self.trash_cancel_event.set()
+            self.update_status("Stopping deletion after the current batch...", color="orange")
             return
-
-        selected_filename = self.selected_file_button.cget("text")
-        file_path_to_delete = self.found_files_map.get(selected_filename)
-
-        if not file_path_to_delete or not os.path.exists(file_path_to_delete):
-            self.update_status(f"Error: Could not find file path for '{selected_filename}'", color="red")
-            logging.error(
-                f"Error: File path not found or does not exist for '{selected_filename}' at '{file_path_to_delete}'")
+        result_ids = self.results_list.get_selected_items()
+        if not result_ids:
+            self.update_status("No file selected to delete. Please select a file first.", color="red")
             return
 
-        dialog_text = (f"You are about to move this file to the Recycle Bin:\n\n"
-                       f"'{file_path_to_delete}'\n\n"
-                       f"To confirm, please type DELETE below and click OK.")
+        file_paths_to_delete = self.result_store.paths(result_ids)
+        if len(file_paths_to_delete) == 1:
+            dialog_text = (f"You are about to move this file to the Recycle Bin:\n\n"
+                           f"'{file_paths_to_delete[0]}'\n\n"
+                           f"To confirm, please type DELETE below and click OK.")
+        else:
+            dialog_text = (f"You are about to move {len(file_paths_to_delete):,} files to the Recycle Bin, "
+                           f"starting with:\n\n'{file_paths_to_delete[0]}'\n\n"
+                           f"To confirm, please type DELETE below and click OK.")
 
         dialog = CTkInputDialog(text=dialog_text, title="Confirm Deletion")
         user_input = dialog.get_input()
 
         if user_input and user_input.upper() == "DELETE":
-            try:
-                normalized_path = os.path.normpath(file_path_to_delete)
-                send2trash(normalized_path)
-
-                if selected_filename in self.found_files_map:
-                    del self.found_files_map[selected_filename]
-
-                self.selected_file_button.destroy()
-                self.selected_file_button = None
-
-                self.update_status(f"Successfully moved '{selected_filename}' to the Recycle Bin.", color="green")
-                logging.info(f"Successfully moved '{normalized_path}' to Recycle Bin.")
-
-            except Exception as e:
-                self.update_status(f"Error deleting file: {e}", color="red")
-                logging.error(f"Error deleting file '{normalized_path}': {e}")
-            finally:
-                self.update_organize_ui_state()
+            self.trash_cancel_event = threading.Event()
+            self.delete_button.configure(text="⏹ Stop Deleting")
+            self.update_status(f"Moving {len(file_paths_to_delete):,} file(s) to the Recycle Bin...")
+            threading.Thread(target=self.run_trash_worker,
+                             args=(self.result_store, dict(zip(file_paths_to_delete, result_ids)),
+                                   self.trash_cancel_event),
+                             daemon=True).start()
         else:
             self.update_status("Deletion cancelled by user.", color="white")
             logging.info("Deletion cancelled by user.")
 
+    def finish_delete(self, result_store, trashed_ids, errors, was_cancelled):
+        """Removes the trashed files from the results in one update and reports any failures."""
+        self.trash_cancel_event = None
+        self.delete_button.configure(text="🗑️ Delete Selected")
+        trashed_name = result_store.name(trashed_ids[0]) if trashed_ids else None
+        if result_store is self.result_store:  # Otherwise a new search has replaced those results already
+            self.remove_results(trashed_ids)
+            self.update_organize_ui_state()
+
+        if errors:
+            summary = (f"Moved {len(trashed_ids):,} file(s) to the Recycle Bin; {len(errors):,} could not be "
+                       f"moved{' before deletion was stopped' if was_cancelled else ''}.")
+            self.update_status(f"{summary} See the list of failed files.", color="red")
+            ErrorReportWindow(self, "Delete Errors", summary, errors)
+        elif was_cancelled:
+            self.update_status(f"Deletion stopped after {len(trashed_ids):,} file(s).", color="orange")
+        elif len(trashed_ids) == 1:
+            self.update_status(f"Successfully moved '{trashed_name}' to the Recycle Bin.", color="green")
+        else:
+            self.update_status(f"Successfully moved {len(trashed_ids):,} files to the Recycle Bin.", color="green")
+
     def organize_files(self):
         """Moves or copies all found files to a new specified folder."""
         # 1. --- Validation ---
-        if not self.found_files_map:
+        result_ids = self.organize_result_ids()
+        if not result_ids:
             self.update_status("No files found to organize. Please perform a search first.", color="red")
             return
 
@@ -506,7 +1502,7 @@ class OrderlyApp(ctk.CTk):
 
         # 3. --- Confirmation Dialog ---
         dialog_text = (
-            f"You are about to {action_type.lower()} {len(self.found_files_map)} file(s) into a new folder named:\n\n"
+            f"You are about to {action_type.lower()} {len(result_ids)} file(s) into a new folder named:\n\n"
             f"'{new_folder_name}'\n\n"
             f"inside '{self.selected_folder}'\n\n"
             f"To confirm, please type {action_type.upper()} below and click OK.")
@@ -515,43 +1511,186 @@ class OrderlyApp(ctk.CTk):
         user_input = dialog.get_input()
 
         if user_input and user_input.upper() == action_type.upper():
-            # 4. --- Execute Action ---
+            # 4. --- Execute Action (on a background worker) ---
             try:
                 os.makedirs(destination_folder_path)
                 logging.info(f"Created new folder: {destination_folder_path}")
-
-                processed_count = 0
-                for filename, source_path in self.found_files_map.items():
-                    destination_path = os.path.join(destination_folder_path, filename)
-
-                    # Handle potential name conflicts (should be rare if new folder)
-                    if os.path.exists(destination_path):
-                        base, ext = os.path.splitext(filename)
-                        i = 1
-                        while os.path.exists(destination_path):
-                            destination_path = os.path.join(destination_folder_path, f"{base} ({i}){ext}")
-                            i += 1
-
-                    # Perform the copy or move
-                    if action_type == "Copy":
-                        shutil.copy2(source_path, destination_path)
-                    else:  # Move
-                        shutil.move(source_path, destination_path)
-                    processed_count += 1
-
-                self.update_status(
-                    f"Successfully {action_type.lower()}ed {processed_count} file(s) to '{new_folder_name}'.",
-                    color="green")
-                # Clear the search results after a successful organization
-                self.clear_results_and_selection()
-                self.search_entry.delete(0, "end")
-                self.on_search_entry_focus_out(None)
-
             except Exception as e:
                 self.update_status(f"An error occurred during organization: {e}", color="red")
                 logging.error(f"Error during file organization: {e}")
+                return
+
+            self.update_status(f"Organizing {len(result_ids)} file(s) into '{new_folder_name}'...")
+            self.start_organize_worker(action_type, destination_folder_path, run_organize_job, action_type,
+                                       destination_folder_path, self.result_store.paths(result_ids))
         else:
             self.update_status("Organization cancelled by user.", color="white")
+
+    def resume_interrupted_job(self):
+        """Offers to finish the most recent organize job that was interrupted."""
+        journal = OrganizeJournal.find_interrupted()
+        if not journal:
+            self.update_status("There is no interrupted organize job to resume.", color="red")
+            self.update_journal_buttons_state()
+            return
+
+        remaining_count = len(journal.pending_indices())
+        action_type = journal.action_type
+        dialog_text = (f"An organize job was interrupted before it finished:\n\n"
+                       f"{action_type} {len(journal.entries)} file(s) into '{journal.destination_folder}'\n"
+                       f"({remaining_count} file(s) not yet processed)\n\n"
+                       f"To finish it, please type RESUME below and click OK.")
+        dialog = CTkInputDialog(text=dialog_text, title="Resume Organize Job")
+        user_input = dialog.get_input()
+
+        if user_input and user_input.upper() == "RESUME":
+            self.update_status(f"Resuming: {action_type.lower()} {remaining_count} remaining file(s)...")
+            self.start_organize_worker(action_type, journal.destination_folder, resume_organize_job, journal)
+        else:
+            journal.close()
+            self.update_status("Resume cancelled by user.", color="white")
+
+    def undo_last_move(self):
+        """Moves every file of the last completed Move job back to its original folder."""
+        journal = OrganizeJournal.find_undoable()
+        if not journal:
+            self.update_status("There is no completed Move to undo.", color="red")
+            self.update_journal_buttons_state()
+            return
+
+        moved_count = journal.status.count("D")
+        dialog_text = (f"You are about to move {moved_count} file(s) out of:\n\n"
+                       f"'{journal.destination_folder}'\n\n"
+                       f"and back to the folders they came from.\n\n"
+                       f"To confirm, please type UNDO below and click OK.")
+        dialog = CTkInputDialog(text=dialog_text, title="Confirm Undo")
+        user_input = dialog.get_input()
+
+        if user_input and user_input.upper() == "UNDO":
+            self.update_status(f"Restoring {moved_count} file(s) to their original folders...")
+            self.start_organize_worker("Undo", journal.destination_folder, undo_organize_job, journal)
+        else:
+            journal.close()
+            self.update_status("Undo cancelled by user.", color="white")
+
+    def edit_rules_file(self):
+        """Opens the rule file in the default editor, creating it with example rules first if needed."""
+        try:
+            rules_path = ensure_rules_file(self.rules_path_entry.get().strip() or RULES_PATH)
+            os.startfile(rules_path)
+            self.update_status(f"Opened '{rules_path}'. Save it, then press 'Preview'.", color="white")
+        except OSError as e:
+            self.update_status(f"Could not open the rule file: {e}", color="red")
+
+    def preview_rules(self, run_after=False):
+        """Plans where the rules would put every file (a dry run) on a background worker."""
+        if not self.selected_folder or not self.search_engine:
+            self.update_status("Please select a folder to sort first.", color="red")
+            return
+        if self.organize_running:
+            self.update_status("An organize job is already running. Please wait.", color="orange")
+            return
+        rules_path = self.rules_path_entry.get().strip() or RULES_PATH
+        try:
+            rules = load_rules(ensure_rules_file(rules_path))
+        except (OSError, ValueError) as e:
+            self.update_status(f"Could not load rules from '{os.path.basename(rules_path)}': {e}", color="red")
+            return
+
+        self.set_rules_buttons_state("disabled")
+        self.update_status(f"Applying {len(rules)} rule(s) to '{os.path.basename(self.selected_folder)}'...")
+        threading.Thread(target=self.run_rules_plan_worker, args=(self.search_engine, rules, run_after),
+                         daemon=True).start()
+
+    def run_rules(self):
+        """Plans the rules job, then asks for confirmation and runs it."""
+        self.preview_rules(run_after=True)
+
+    def show_rules_plan(self, search_engine, rules, plan, rule_counts, run_after):
+        """Shows the dry-run summary of a rules plan, and starts the job when it was asked for."""
+        self.set_rules_buttons_state("normal")
+        if search_engine is not self.search_engine:
+            return  # The folder changed while planning
+        destination_root = search_engine.root_folder
+        self.rules_preview_text.configure(state="normal")
+        self.rules_preview_text.delete("1.0", "end")
+        self.rules_preview_text.insert("1.0", summarize_rules_plan(rules, plan, rule_counts, destination_root))
+        self.rules_preview_text.configure(state="disabled")
+
+        if not plan:
+            self.update_status("No files need to move: none match a rule, or they are already sorted.", color="green")
+            return
+        total_bytes = sum(size for _, _, size in plan)
+        if not run_after:
+            self.update_status(f"Preview: {len(plan):,} file(s) ({format_bytes(total_bytes)}) would be organized. "
+                               f"Press 'Run Rules' to do it.", color="green")
+            return
+
+        action_type = self.action_type_var.get()
+        dialog_text = (f"You are about to {action_type.lower()} {len(plan):,} file(s) ({format_bytes(total_bytes)}) "
+                       f"into the rule folders inside:\n\n'{destination_root}'\n\n"
+                       f"To confirm, please type {action_type.upper()} below and click OK.")
+        dialog = CTkInputDialog(text=dialog_text, title=f"Confirm Rules {action_type}")
+        user_input = dialog.get_input()
+        if user_input and user_input.upper() == action_type.upper():
+            self.update_status(f"Organizing {len(plan):,} file(s) by rules...")
+            self.start_organize_worker(action_type, destination_root, run_rules_job, action_type, destination_root,
+                                       plan)
+        else:
+            self.update_status("Rules cancelled by user.", color="white")
+
+    def set_rules_buttons_state(self, state):
+        for button in (self.preview_rules_button, self.run_rules_button):
+            button.configure(state=state)
+
+    def start_organize_worker(self, action_type, destination_folder_path, job_function, *job_args):
+        """Locks the organize controls and starts a job function on a background worker."""
+        self.organize_running = True
+        self.organize_button.configure(state="disabled")
+        self.set_rules_buttons_state("disabled")
+        self.update_journal_buttons_state()
+        self.organize_progress_bar.set(0)
+        self.organize_start_time = time.monotonic()
+
+        threading.Thread(target=self.run_organize_worker,
+                         args=(action_type, destination_folder_path, job_function) + job_args,
+                         daemon=True).start()
+
+    def update_organize_progress(self, files_done, files_total, bytes_done, bytes_total):
+        """Updates the organize progress bar and its files/bytes/ETA label."""
+        fraction = bytes_done / bytes_total if bytes_total else (files_done / files_total if files_total else 1.0)
+        self.organize_progress_bar.set(fraction)
+
+        elapsed = time.monotonic() - self.organize_start_time
+        eta_text = ""
+        if 0 < fraction < 1 and elapsed > 0:
+            eta_text = f" · ETA {format_duration(elapsed / fraction - elapsed)}"
+        self.organize_progress_label.configure(
+            text=f"{files_done:,} / {files_total:,} files · {format_bytes(bytes_done)} / {format_bytes(bytes_total)}"
+                 f"{eta_text}")
+
+    def finish_organize(self, action_type, destination_folder_path, processed_count, errors):
+        """Reports the result of an organize, resume or undo job once the worker has finished."""
+        self.organize_running = False
+        self.organize_button.configure(state="normal")
+        self.set_rules_buttons_state("normal")
+        self.update_journal_buttons_state()
+        new_folder_name = os.path.basename(destination_folder_path)
+
+        if action_type == "Undo":
+            summary = f"Restored {processed_count} file(s) from '{new_folder_name}' to their original folders"
+        else:
+            past_tense = "copied" if action_type == "Copy" else "moved"
+            summary = f"{past_tense.capitalize()} {processed_count} file(s) to '{new_folder_name}'"
+
+        if errors:
+            self.update_status(f"{summary}; {len(errors)} failed (first error: {errors[0][1]}).", color="red")
+        else:
+            self.update_status(f"Successfully {summary[0].lower()}{summary[1:]}.", color="green")
+        # Clear the search results after organization
+        self.clear_results_and_selection()
+        self.search_entry.delete(0, "end")
+        self.on_search_entry_focus_out(None)
     # --- END FILE ACTION FUNCTIONS -------------------------------------
 
 
@@ -560,6 +1699,21 @@ class OrderlyApp(ctk.CTk):
 
 # === APPLICATION LAUNCHER ================================================
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Content-search worker processes in a PyInstaller build
     app = OrderlyApp()
-    app.mainloop()
+    if "--profile-startup" in sys.argv:
+        # Draw the first frame, time the deferred work separately, print the phases and quit
+        app.update()
+        startup_profiler.mark("first frame drawn")
+        app.build_organize_tab()
+        startup_profiler.mark("'Organize Files' tab widgets (deferred)", is_deferred=True)
+        for deferred_module in ("fuzzywuzzy.fuzz", "send2trash"):
+            __import__(deferred_module)
+        startup_profiler.mark("fuzzywuzzy + send2trash imports (deferred)", is_deferred=True)
+        print(startup_profiler.report())
+        app.destroy()
+    else:
+        if "--diagnostics" in sys.argv:
+            app.open_diagnostics()
+        app.mainloop()
 # === END APPLICATION LAUNCHER ============================================
\ No newline at end of file
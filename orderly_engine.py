@@ -0,0 +1,3223 @@
+"""Orderly's search and organize engine.
+
+Everything in here is GUI-free so it can be driven by the Tk app (orderly_app.py), the
+command line (orderly.py) or scripts.
+"""
+
+# === IMPORTS =============================================================
+import os
+import sys
+import shutil
+import logging
+import re
+import fnmatch
+import sqlite3
+import hashlib
+import threading
+import queue
+import time
+import math
+import json
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import mmap
+import html
+import zipfile
+import multiprocessing
+import stat
+import string
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+# fuzzywuzzy (with Levenshtein) and send2trash are slow to import, so they are imported on first use
+
+# === END IMPORTS =========================================================
+
+
+# === CONFIGURATION =======================================================
+# Where Orderly keeps its persistent data (filename indexes, etc.)
+if os.name == "nt":
+    APP_DATA_DIR = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "Orderly")
+else:
+    APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".orderly")
+INDEX_DIR = os.path.join(APP_DATA_DIR, "indexes")
+JOURNAL_DIR = os.path.join(APP_DATA_DIR, "journals")
+PROFILE_DIR = os.path.join(APP_DATA_DIR, "profiles")
+DOCUMENT_CACHE_PATH = os.path.join(APP_DATA_DIR, "document_text.sqlite")
+HASH_CACHE_PATH = os.path.join(APP_DATA_DIR, "file_hashes.sqlite")
+RULES_PATH = os.path.join(APP_DATA_DIR, "rules.txt")
+
+# Search
+SEARCH_BATCH_INTERVAL = 0.1  # Seconds between result/progress batches reported by a search
+QUERY_CACHE_MAX_ENTRIES = 32  # Result sets kept for repeated or toggled-back queries (least recently used go first)
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Estimated memory all cached result sets may use together
+QUERY_CACHE_RESULT_BYTES = 64  # Estimated cost of one cached result besides its filename (tuple + list slot)
+
+# Directory traversal
+WALK_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Threads listing directories in parallel (I/O bound)
+WALK_MAX_DEPTH = None  # Deepest folder level to descend into below the root (None = unlimited)
+WALK_FOLLOW_LINKS = False  # Whether to descend into symlinked folders (loops are detected and skipped)
+WALK_SKIP_HIDDEN = True  # Skip hidden folders (dot-folders; Hidden/System attribute on Windows)
+WALK_EXCLUDE_PATTERNS = (  # gitignore-style patterns never descended into (a root's .orderlyignore can add or "!"-undo)
+    ".git/", ".hg/", ".svn/", "node_modules/", "__pycache__/", ".venv/", "venv/", ".tox/", ".mypy_cache/",
+    ".pytest_cache/", ".snapshot/", ".snapshots/", ".zfs/", ".Trash-*/", "$RECYCLE.BIN/",
+    "System Volume Information/")
+IGNORE_FILENAME = ".orderlyignore"  # gitignore-style file in a root folder listing more folders/files to skip
+
+# Fuzzy matching
+FUZZY_SCORE_THRESHOLD = 75  # A filename matches when its partial_ratio score is above this
+FUZZY_TOP_K = 1000  # Maximum number of ranked fuzzy results returned
+FUZZY_BATCH_SIZE = 2000  # Candidates scored between cancellation/progress checks
+FUZZY_MIN_GRAM_OVERLAP = 0.2  # Fraction of the query's trigrams a filename must share to be scored
+
+# Content search
+CONTENT_WORKERS = os.cpu_count() or 1  # Worker processes scanning file contents (CPU bound)
+CONTENT_CHUNK_FILES = 64  # Files handed to a worker process per task
+CONTENT_MAX_FILE_SIZE = 256 * 1024 * 1024  # Larger plain files are skipped
+DOCUMENT_MAX_FILE_SIZE = 64 * 1024 * 1024  # Larger PDF/DOCX files are skipped
+DOCUMENT_CHUNK_FILES = 4  # PDF/DOCX files handed to a worker process per task (parsing is slow)
+BINARY_SNIFF_BYTES = 8192  # A NUL byte in this many leading bytes marks a file as binary (like grep)
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")  # Searched through extracted (and cached) text
+
+# Duplicate finder
+DUPLICATE_HASH_WORKERS = os.cpu_count() or 1  # Hashing threads (hashlib releases the GIL, so they use every core)
+DUPLICATE_PARTIAL_BLOCK = 64 * 1024  # Bytes hashed from each end of a file before committing to a full hash
+DUPLICATE_MIN_SIZE = 1  # Smaller files (i.e. empty ones) are never reported as duplicates
+DUPLICATE_IN_FLIGHT_PER_WORKER = 4  # stat/hash calls queued per hashing thread at a time (bounds memory on huge trees)
+
+# Bulk trash
+TRASH_BATCH_SIZE = 100  # Files passed to one send2trash call (one shell operation on Windows)
+
+# Filesystem watching
+WATCH_USE_INOTIFY = True  # Use inotify on Linux; other platforms (or an exhausted watch limit) poll instead
+WATCH_DEBOUNCE = 0.3  # Seconds without new events before changed folders are re-listed...
+WATCH_MAX_DELAY = 2.0  # ...but never later than this after the first event of a burst
+WATCH_POLL_INTERVAL = 5.0  # Seconds between folder mtime checks when polling
+
+# Organize
+ORGANIZE_WORKERS = 4  # Files copied/moved concurrently (bounded so disks aren't thrashed)
+ORGANIZE_PROGRESS_INTERVAL = 0.1  # Seconds between progress updates from the organize worker
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes per copy_file_range/sendfile call
+JOURNAL_FSYNC_BATCH = 256  # Journal records written between fsyncs...
+JOURNAL_FSYNC_INTERVAL = 0.5  # ...or seconds, whichever comes first
+JOURNAL_KEEP_COUNT = 20  # Finished job journals kept around (for undo) before the oldest are deleted
+
+# === END CONFIGURATION ===================================================
+
+
+# === METRICS =============================================================
+class Metrics:
+    """Thread-safe counters, timers and gauges describing where Orderly spends its time.
+
+    Counters only go up (folders visited, files examined, bytes organized). Timers keep the
+    count, total and slowest duration of a phase (walk, match, render). Gauges hold the latest
+    value of a rate. Everything can be dumped as JSON or as Prometheus text.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.timers = {}  # Maps name -> [count, total seconds, max seconds]
+            self.gauges = {}
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def record_time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Times the body of a with-block under the given timer name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Returns all metrics as plain dicts."""
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {name: {"count": count, "total_seconds": total, "max_seconds": slowest}
+                           for name, (count, total, slowest) in self.timers.items()},
+                "gauges": dict(self.gauges),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE orderly_{name}_total counter", f"orderly_{name}_total {value}"]
+        for name, timer in sorted(snapshot["timers"].items()):
+            lines += [f"# TYPE orderly_{name}_seconds summary",
+                      f"orderly_{name}_seconds_count {timer['count']}",
+                      f"orderly_{name}_seconds_sum {timer['total_seconds']:.6f}",
+                      f"# TYPE orderly_{name}_seconds_max gauge",
+                      f"orderly_{name}_seconds_max {timer['max_seconds']:.6f}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines += [f"# TYPE orderly_{name} gauge", f"orderly_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()  # Process-wide instance used by the engine, the app and the CLI
+
+
+def profile_call(output_path, function, *args, **kwargs):
+    """Runs function under cProfile and writes the stats to output_path. Returns the function's result.
+
+    The file can be read with pstats or a viewer such as snakeviz. The top entries by cumulative
+    time are logged as well.
+    """
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        profiler.dump_stats(output_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+        logging.info(f"Profile written to '{output_path}':\n{summary.getvalue()}")
+
+
+# === END METRICS =========================================================
+
+
+# === DIRECTORY TRAVERSAL =================================================
+class IgnorePattern:
+    """One gitignore-style pattern.
+
+    Supports comments, "!" negation, a trailing "/" for folders only, "*", "?", "[...]" and "**".
+    A pattern with a "/" (other than a trailing one) is anchored to the root folder; otherwise
+    it matches a name at any level.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+            pattern = pattern[1:]
+        self.dirs_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        self.anchored = "/" in pattern
+        flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0  # Case-insensitive filesystems (Windows)
+        self.regex = re.compile(f"(?:{translate_ignore_pattern(pattern.lstrip('/'))})\\Z", flags)
+
+    def matches(self, rel_path, name, is_dir):
+        """Tests a path relative to the root ("/"-separated) and its last component."""
+        if self.dirs_only and not is_dir:
+            return False
+        return bool(self.regex.match(rel_path if self.anchored else name))
+
+
+def translate_ignore_pattern(pattern):
+    """Translates a gitignore glob into a regular expression ("*" and "?" stop at "/", "**" doesn't)."""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+def parse_ignore_lines(lines):
+    """Returns IgnorePatterns for the lines of an ignore file, skipping blanks and comments."""
+    patterns = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.endswith("\\ "):
+            line = line.rstrip()  # Trailing spaces are ignored unless escaped
+        if line and not line.startswith("#"):
+            patterns.append(IgnorePattern(line))
+    return patterns
+
+
+class PathFilter:
+    """Decides which folders and files under one root a walk skips.
+
+    Built-in exclude patterns come first and the root's .orderlyignore after them, so it can
+    add patterns or re-include a default with "!"; like gitignore, the last matching pattern
+    wins. Excluded folders are pruned before they are listed, so nothing below them is read.
+    """
+
+    def __init__(self, root, exclude_patterns=WALK_EXCLUDE_PATTERNS, skip_hidden=WALK_SKIP_HIDDEN):
+        self.root = os.path.normpath(root)
+        self.skip_hidden = skip_hidden
+        self.exclude_patterns = tuple(exclude_patterns)
+        self.ignore_text = ""
+        try:
+            with open(os.path.join(self.root, IGNORE_FILENAME), encoding="utf-8", errors="replace") as f:
+                self.ignore_text = f.read()
+        except OSError:
+            pass
+        self.patterns = parse_ignore_lines(self.exclude_patterns) + parse_ignore_lines(self.ignore_text.splitlines())
+        self.file_patterns = [pattern for pattern in self.patterns if not pattern.dirs_only]
+
+    def policy_key(self):
+        """Returns a string that changes whenever the filter would skip different paths."""
+        ignore_hash = hashlib.sha1(self.ignore_text.encode("utf-8")).hexdigest()[:16]
+        return (f"skip_hidden={self.skip_hidden};exclude={'|'.join(self.exclude_patterns)};"
+                f"ignore_file={ignore_hash}")
+
+    def rel_dir(self, dirpath):
+        """Returns a folder's path relative to the root, "/"-separated ("" for the root itself)."""
+        if dirpath == self.root:
+            return ""
+        rel_path = os.path.relpath(dirpath, self.root)
+        return rel_path.replace(os.sep, "/") if os.sep != "/" else rel_path
+
+    def skips_dir(self, rel_dir, entry):
+        """Returns True if the subfolder entry of rel_dir should not be descended into (or listed)."""
+        if self.skip_hidden and is_hidden_entry(entry):
+            return True
+        return self._is_excluded(f"{rel_dir}/{entry.name}" if rel_dir else entry.name, entry.name, True)
+
+    def skips_file(self, rel_dir, name):
+        """Returns True if the file called name in rel_dir is ignored."""
+        return bool(self.file_patterns) and self._is_excluded(f"{rel_dir}/{name}" if rel_dir else name, name, False)
+
+    def skips_path(self, abs_dir):
+        """Returns True if a folder below the root, or any folder between it and the root, is skipped."""
+        rel_dir = self.rel_dir(os.path.normpath(abs_dir))
+        if not rel_dir or rel_dir.startswith(".."):
+            return False
+        parts = rel_dir.split("/")
+        for depth, name in enumerate(parts):
+            if self.skip_hidden and is_hidden_path(os.path.join(self.root, *parts[:depth + 1])):
+                return True
+            if self._is_excluded("/".join(parts[:depth + 1]), name, True):
+                return True
+        return False
+
+    def _is_excluded(self, rel_path, name, is_dir):
+        patterns = self.patterns if is_dir else self.file_patterns
+        for pattern in reversed(patterns):
+            if pattern.matches(rel_path, name, is_dir):
+                return not pattern.negated
+        return False
+
+
+def is_hidden_entry(entry):
+    """Returns True for dot-names and, on Windows, entries with the Hidden or System attribute."""
+    if entry.name.startswith("."):
+        return True
+    if os.name == "nt":
+        try:
+            return has_hidden_attribute(entry.stat(follow_symlinks=False))  # Cached by scandir on Windows
+        except OSError:
+            return False
+    return False
+
+
+def is_hidden_path(path):
+    """Same as is_hidden_entry for a path, e.g. a folder the watcher reports (stat-ed on Windows)."""
+    if os.path.basename(path).startswith("."):
+        return True
+    if os.name == "nt":
+        try:
+            return has_hidden_attribute(os.lstat(path))
+        except OSError:
+            return False
+    return False
+
+
+def has_hidden_attribute(file_stat):
+    attributes = getattr(file_stat, "st_file_attributes", 0)
+    return bool(attributes & (stat.FILE_ATTRIBUTE_HIDDEN | stat.FILE_ATTRIBUTE_SYSTEM))
+
+
+class ParallelWalker:
+    """Directory walker that spreads os.scandir calls over a pool of threads.
+
+    Workers take directories from a shared queue, list them and queue their subdirectories,
+    so many listings are in flight at once. On NFS/SMB mounts, where every listing is a
+    network round trip, this hides most of the latency a single-threaded os.walk waits on.
+    Files and folders are classified exactly like os.walk. Folders a PathFilter skips are
+    pruned while their parent is listed, so they are never opened.
+    """
+
+    _DONE = object()  # Posted to the results queue when no directories are left
+
+    def __init__(self, workers=WALK_WORKERS, max_depth=WALK_MAX_DEPTH, follow_links=WALK_FOLLOW_LINKS,
+                 exclude_patterns=WALK_EXCLUDE_PATTERNS, skip_hidden=WALK_SKIP_HIDDEN):
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self.follow_links = follow_links
+        self.exclude_patterns = tuple(exclude_patterns)
+        self.skip_hidden = skip_hidden
+
+    def policy_key(self):
+        """Returns a string describing the options that change which folders are walked."""
+        return f"max_depth={self.max_depth};follow_links={self.follow_links}"
+
+    def path_filter(self, root):
+        """Returns the PathFilter for walking root (reads the root's .orderlyignore)."""
+        return PathFilter(root, exclude_patterns=self.exclude_patterns, skip_hidden=self.skip_hidden)
+
+    def walk(self, root, cancel_event=None, should_descend=None):
+        """Yields (dirpath, dirnames, filenames, dir_mtime) for every folder under root, in no particular order."""
+        return self.walk_many([(root, 0)], cancel_event=cancel_event, should_descend=should_descend,
+                              path_filter=self.path_filter(root))
+
+    def walk_many(self, start_dirs, cancel_event=None, should_descend=None, path_filter=None):
+        """Walks several (dirpath, depth) starting points with one worker pool.
+
+        should_descend(dirpath), if given, is asked before each subdirectory is queued.
+        path_filter, if given, prunes skipped folders and drops ignored files (the start
+        folders themselves are always listed). Stopping the iteration early (or setting
+        cancel_event) stops the workers.
+        """
+        if not start_dirs:
+            return
+
+        work_queue = queue.Queue()
+        results = queue.Queue()
+        lock = threading.Lock()
+        state = {"pending": len(start_dirs)}
+        visited = set()  # (st_dev, st_ino) of listed folders, used to break symlink loops
+        stop_event = threading.Event()
+
+        def worker():
+            while True:
+                item = work_queue.get()
+                if item is None:
+                    return
+                dirpath, depth = item
+                try:
+                    if stop_event.is_set() or (cancel_event and cancel_event.is_set()):
+                        continue
+                    listing = self._scan(dirpath, depth, visited, lock, path_filter)
+                    if listing is None:
+                        continue
+                    results.put(listing[:4])
+                    for child_path in listing[4]:
+                        if should_descend is None or should_descend(child_path):
+                            with lock:
+                                state["pending"] += 1
+                            work_queue.put((child_path, depth + 1))
+                finally:
+                    with lock:
+                        state["pending"] -= 1
+                        if state["pending"] == 0:
+                            results.put(self._DONE)
+
+        for start_dir in start_dirs:
+            work_queue.put(start_dir)
+        for _ in range(self.workers):
+            threading.Thread(target=worker, daemon=True).start()
+
+        try:
+            while True:
+                listing = results.get()
+                if listing is self._DONE:
+                    break
+                yield listing
+        finally:
+            stop_event.set()
+            for _ in range(self.workers):
+                work_queue.put(None)
+
+    def _scan(self, dirpath, depth, visited, lock, path_filter=None):
+        """Lists one folder. Returns (dirpath, dirnames, filenames, mtime, paths to descend into) or None."""
+        dirnames, filenames, descend = [], [], []
+        rel_dir = path_filter.rel_dir(dirpath) if path_filter else None
+        try:
+            dir_stat = os.stat(dirpath)
+            if self.follow_links:
+                key = (dir_stat.st_dev, dir_stat.st_ino)
+                with lock:
+                    if key in visited:
+                        return None  # Already reached through another path (symlink loop or alias)
+                    visited.add(key)
+
+            can_descend = self.max_depth is None or depth < self.max_depth
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    # Same classification as os.walk: symlinked folders are listed as folders
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        if not (path_filter and path_filter.skips_file(rel_dir, entry.name)):
+                            filenames.append(entry.name)
+                        continue
+                    if path_filter and path_filter.skips_dir(rel_dir, entry):
+                        metrics.increment("directories_pruned")
+                        continue
+                    dirnames.append(entry.name)
+                    if can_descend and (self.follow_links or not entry.is_symlink()):
+                        descend.append(entry.path)
+        except OSError as e:
+            logging.info(f"Skipping unreadable folder '{dirpath}': {e}")
+            metrics.increment("directories_unreadable")
+            return None
+        metrics.increment("directories_visited")
+        return dirpath, dirnames, filenames, dir_stat.st_mtime, descend
+
+    def stat_mtimes(self, paths):
+        """Returns the mtime of each path (None if it is gone or unreadable), statting in parallel."""
+        def mtime_or_none(path):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                return None
+
+        metrics.increment("directories_statted", len(paths))
+        with metrics.timer("stat_directories"), ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(mtime_or_none, paths, chunksize=256))
+
+
+# === END DIRECTORY TRAVERSAL =============================================
+
+
+# === FILE INDEX ==========================================================
+class FileIndex:
+    """Persistent on-disk index of the filenames under one root folder.
+
+    The index lives in a small SQLite database in INDEX_DIR and is mirrored in memory while
+    the folder is selected. refresh() only re-lists directories whose mtime changed since the
+    last scan, so repeat searches don't have to walk the whole tree again.
+
+    The index is refreshed on background threads, so every public method holds self.lock.
+    Directory listing and stat calls are spread over a ParallelWalker's thread pool.
+    """
+
+    SCHEMA_VERSION = "1"
+
+    def __init__(self, root_folder, walker=None):
+        self.root_folder = os.path.abspath(root_folder)  # One index per folder, whatever the cwd
+        self.walker = walker or ParallelWalker()
+        self.path_filter = self.walker.path_filter(self.root_folder)
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        root_hash = hashlib.sha1(os.path.normcase(self.root_folder).encode("utf-8")).hexdigest()[:16]
+        self.db_path = os.path.join(INDEX_DIR, f"{root_hash}.sqlite")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.dirs = {}  # Maps relative dir path -> [dir_id, mtime, list of filenames]
+        self.is_loaded = False
+        self.is_closed = False
+        self.generation = 0  # Bumped on every change so derived data (e.g. FuzzyMatcher) knows to rebuild
+        self.cache_token = object()  # Tells this index's cached query results from another instance's
+        self._create_schema()
+        built = self.conn.execute("SELECT value FROM meta WHERE key = 'built'").fetchone()
+        policy = self.conn.execute("SELECT value FROM meta WHERE key = 'walk_policy'").fetchone()
+        self.built_policy = policy[0] if built and built[0] == "1" and policy else None  # Set once a build completes
+
+    # --- Schema & Persistence ---
+    def _create_schema(self):
+        """Creates the index tables, discarding any index written by an older schema."""
+        cur = self.conn.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = cur.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row and row[0] != self.SCHEMA_VERSION:
+            logging.info(f"Index schema changed ({row[0]} -> {self.SCHEMA_VERSION}), rebuilding '{self.db_path}'.")
+            cur.execute("DROP TABLE IF EXISTS dirs")
+            cur.execute("DROP TABLE IF EXISTS files")
+            cur.execute("DELETE FROM meta")
+
+        cur.execute("CREATE TABLE IF NOT EXISTS dirs (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, "
+                    "mtime REAL NOT NULL)")
+        cur.execute("CREATE TABLE IF NOT EXISTS files (dir_id INTEGER NOT NULL, name TEXT NOT NULL)")
+        cur.execute("CREATE INDEX IF NOT EXISTS files_by_dir ON files (dir_id)")
+        cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (self.SCHEMA_VERSION,))
+        cur.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('root', ?)", (self.root_folder,))
+        self.conn.commit()
+
+    def is_built(self):
+        """Returns True if a complete index, walked with the current walker options, exists on disk.
+
+        Does not wait for the lock, so it answers (False) while a build is running on another thread.
+        """
+        return self.built_policy is not None and self.built_policy == self.walk_policy()
+
+    def walk_policy(self):
+        """Returns the walker and filter options the index was built with (an edited .orderlyignore changes it)."""
+        return f"{self.walker.policy_key()};{self.path_filter.policy_key()}"
+
+    def load(self):
+        """Loads the on-disk index into memory."""
+        with self.lock:
+            self.dirs = {}
+            dirs_by_id = {}
+            for dir_id, rel_path, mtime in self.conn.execute("SELECT id, path, mtime FROM dirs"):
+                entry = [dir_id, mtime, []]
+                self.dirs[rel_path] = entry
+                dirs_by_id[dir_id] = entry
+            for dir_id, name in self.conn.execute("SELECT dir_id, name FROM files"):
+                entry = dirs_by_id.get(dir_id)
+                if entry:
+                    entry[2].append(name)
+            self.is_loaded = True
+            self.generation += 1
+        logging.info(f"Loaded index for '{self.root_folder}': {len(self.dirs)} folders, {self.file_count()} files.")
+
+    def close(self):
+        """Closes the database connection, or asks a refresh in progress to stop and close it."""
+        self.is_closed = True
+        if self.lock.acquire(blocking=False):
+            try:
+                self.conn.close()
+            finally:
+                self.lock.release()
+
+    # --- Building & Refreshing ---
+    def build(self, cancel_event=None):
+        """Walks the whole tree once and writes a fresh index."""
+        for _ in self.iter_build(cancel_event):
+            pass
+
+    def iter_build(self, cancel_event=None):
+        """Builds the index like build(), yielding (absolute dir path, filenames) as each folder is listed.
+
+        Holds the lock until it finishes, so consume it on one thread. If it is stopped early or
+        cancel_event is set, the partial index is rolled back and stays unbuilt.
+        """
+        with self.lock, metrics.timer("index_build"):
+            cur = self.conn.cursor()
+            cur.execute("DELETE FROM files")
+            cur.execute("DELETE FROM dirs")
+            self.dirs = {}
+            self.is_loaded = False
+            self.built_policy = None
+            is_complete = False
+            try:
+                for rel_path, filenames in self._index_subtrees(cur, [""], cancel_event):
+                    yield self._abs_path(rel_path), filenames
+                is_complete = not (self.is_closed or (cancel_event and cancel_event.is_set()))
+            finally:
+                if self.is_closed:
+                    self.conn.close()  # Abandoned mid-build; it stays unbuilt and is rebuilt next time
+                elif not is_complete:
+                    self.conn.rollback()
+                    self.dirs = {}
+                    self.generation += 1
+            if not is_complete:
+                logging.info(f"Index build for '{self.root_folder}' stopped before it finished.")
+                return
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('walk_policy', ?)",
+                        (self.walk_policy(),))
+            self.conn.commit()
+            self.is_loaded = True
+            self.built_policy = self.walk_policy()
+        logging.info(f"Built index for '{self.root_folder}': {len(self.dirs)} folders, {self.file_count()} files.")
+
+    def refresh(self, cancel_event=None):
+        """Re-scans only the directories whose mtime changed. Returns the number of changed directories.
+
+        A directory's mtime changes whenever an entry is added, removed or renamed inside it,
+        so checking one stat per directory is enough to keep the filename lists current.
+        An index that was never built is built here instead. Setting cancel_event stops the
+        refresh (or the wait for another thread's build) and leaves the index as it was.
+        """
+        while not self.lock.acquire(timeout=SEARCH_BATCH_INTERVAL):
+            if cancel_event and cancel_event.is_set():
+                return 0
+        try:
+            return self._refresh(cancel_event)
+        finally:
+            self.lock.release()
+
+    def _refresh(self, cancel_event):
+        with metrics.timer("index_refresh"):
+            if self.is_closed:
+                return 0
+            self.path_filter = self.walker.path_filter(self.root_folder)  # Picks up an edited .orderlyignore
+            if not self.is_built():
+                self.build(cancel_event)
+                return len(self.dirs)
+            if not self.is_loaded:
+                self.load()
+
+            cur = self.conn.cursor()
+            rel_paths = list(self.dirs)
+            mtimes = self.walker.stat_mtimes([self._abs_path(rel_path) for rel_path in rel_paths])
+
+            removed_count = 0
+            changed_rel_paths = []
+            for rel_path, mtime in zip(rel_paths, mtimes):
+                if rel_path not in self.dirs:
+                    continue  # Already dropped together with a removed parent
+                if mtime is None:
+                    self._remove_subtree(cur, rel_path)
+                    removed_count += 1
+                elif mtime != self.dirs[rel_path][1]:
+                    changed_rel_paths.append(rel_path)
+
+            for _ in self._index_subtrees(cur, changed_rel_paths, cancel_event):
+                pass
+            if cancel_event and cancel_event.is_set() and not self.is_closed:
+                self.conn.rollback()
+                self.load()  # Puts back the folders dropped or re-listed above
+                return 0
+            changed_count = removed_count + len(changed_rel_paths)
+            self.conn.commit()
+            if self.is_closed:
+                self.conn.close()
+        if changed_count:
+            logging.info(f"Index refresh for '{self.root_folder}': {changed_count} folder(s) changed.")
+        return changed_count
+
+    def refresh_directories(self, abs_dirs):
+        """Re-lists just the given folders, e.g. the ones a FolderWatcher saw change.
+
+        Folders that are gone are dropped together with everything below them, and new
+        subfolders are indexed in full. Returns (added file paths, removed file paths,
+        added folder paths, removed folder paths).
+        """
+        with self.lock, metrics.timer("watch_relist"):
+            if self.is_closed or not self.is_loaded:
+                return [], [], [], []
+            start_rel_paths = set()
+            for abs_dir in abs_dirs:
+                abs_dir = os.path.normpath(abs_dir)
+                if abs_dir != self.root_folder and not abs_dir.startswith(self.root_folder.rstrip(os.sep) + os.sep):
+                    continue
+                rel_path = self._rel_path(abs_dir)
+                if rel_path in self.dirs or os.path.dirname(rel_path) in self.dirs:
+                    start_rel_paths.add(rel_path)
+            if not start_rel_paths:
+                return [], [], [], []
+
+            old_dirs = dict(self.dirs)
+            cur = self.conn.cursor()
+            for _ in self._index_subtrees(cur, sorted(start_rel_paths)):
+                pass
+            self.conn.commit()
+            if self.is_closed:
+                self.conn.close()
+
+            added_paths, removed_paths = [], []
+            added_rel_dirs = self.dirs.keys() - old_dirs.keys()
+            removed_rel_dirs = old_dirs.keys() - self.dirs.keys()
+            for rel_path in added_rel_dirs:
+                dirpath = self._abs_path(rel_path)
+                added_paths.extend(os.path.join(dirpath, name) for name in self.dirs[rel_path][2])
+            for rel_path in removed_rel_dirs:
+                dirpath = self._abs_path(rel_path)
+                removed_paths.extend(os.path.join(dirpath, name) for name in old_dirs[rel_path][2])
+            for rel_path in start_rel_paths:
+                old_entry, new_entry = old_dirs.get(rel_path), self.dirs.get(rel_path)
+                if old_entry and new_entry and old_entry[2] is not new_entry[2]:
+                    old_names, new_names = set(old_entry[2]), set(new_entry[2])
+                    dirpath = self._abs_path(rel_path)
+                    added_paths.extend(os.path.join(dirpath, name) for name in new_names - old_names)
+                    removed_paths.extend(os.path.join(dirpath, name) for name in old_names - new_names)
+
+        return (added_paths, removed_paths, [self._abs_path(rel_path) for rel_path in added_rel_dirs],
+                [self._abs_path(rel_path) for rel_path in removed_rel_dirs])
+
+    def _index_subtrees(self, cur, start_rel_paths, cancel_event=None):
+        """Re-lists the given directories, plus any of their subdirectories that are not indexed yet.
+
+        Yields (relative dir path, filenames) for each folder as it is stored.
+        """
+        if not start_rel_paths:
+            return
+        # A folder that is now skipped (e.g. a new node_modules seen by the watcher) is not listed,
+        # so it is dropped below like an unreadable one
+        start_dirs = [(self._abs_path(rel_path), rel_path.count(os.sep) + 1 if rel_path else 0)
+                      for rel_path in start_rel_paths if not self.path_filter.skips_path(self._abs_path(rel_path))]
+        listed = set()
+
+        def should_descend(dirpath):
+            return self._rel_path(dirpath) not in self.dirs
+
+        with metrics.timer("walk"):
+            for dirpath, _, filenames, mtime in self.walker.walk_many(start_dirs, cancel_event=cancel_event,
+                                                                      should_descend=should_descend,
+                                                                      path_filter=self.path_filter):
+                if self.is_closed:
+                    return
+                rel_path = self._rel_path(dirpath)
+                self._store_directory(cur, rel_path, mtime, filenames)
+                listed.add(rel_path)
+                yield rel_path, filenames
+        if cancel_event and cancel_event.is_set():
+            return  # Unlisted folders may just not have been reached
+
+        for rel_path in start_rel_paths:
+            if rel_path not in listed:
+                self._remove_subtree(cur, rel_path)  # Became unreadable
+
+    def _store_directory(self, cur, rel_path, mtime, filenames):
+        """Writes one directory's listing to the database and the in-memory mirror."""
+        entry = self.dirs.get(rel_path)
+        if entry:
+            dir_id = entry[0]
+            cur.execute("UPDATE dirs SET mtime = ? WHERE id = ?", (mtime, dir_id))
+            cur.execute("DELETE FROM files WHERE dir_id = ?", (dir_id,))
+        else:
+            cur.execute("INSERT INTO dirs (path, mtime) VALUES (?, ?)", (rel_path, mtime))
+            dir_id = cur.lastrowid
+        cur.executemany("INSERT INTO files (dir_id, name) VALUES (?, ?)", ((dir_id, name) for name in filenames))
+        self.dirs[rel_path] = [dir_id, mtime, filenames]
+        self.generation += 1
+
+    def _remove_subtree(self, cur, rel_path):
+        """Drops a directory and everything indexed below it."""
+        prefix = rel_path + os.sep
+        for path in [p for p in self.dirs if not rel_path or p == rel_path or p.startswith(prefix)]:
+            dir_id = self.dirs.pop(path)[0]
+            cur.execute("DELETE FROM files WHERE dir_id = ?", (dir_id,))
+            cur.execute("DELETE FROM dirs WHERE id = ?", (dir_id,))
+            self.generation += 1
+
+    # --- Queries ---
+    def iter_directories(self):
+        """Yields (absolute dir path, filenames) for every indexed directory, like os.walk without subdirs."""
+        with self.lock:
+            snapshot = list(self.dirs.items())
+        for rel_path, (_, _, filenames) in snapshot:
+            yield self._abs_path(rel_path), filenames
+
+    def changed_directories(self):
+        """Returns the indexed folders whose mtime changed (or that are gone) since they were listed."""
+        with self.lock:
+            snapshot = [(rel_path, entry[1]) for rel_path, entry in self.dirs.items()]
+        abs_paths = [self._abs_path(rel_path) for rel_path, _ in snapshot]
+        mtimes = self.walker.stat_mtimes(abs_paths)
+        return [abs_path for abs_path, (_, old_mtime), mtime in zip(abs_paths, snapshot, mtimes) if mtime != old_mtime]
+
+    def file_count(self):
+        """Returns the number of indexed files."""
+        with self.lock:  # The watcher thread may be re-listing folders
+            return sum(len(entry[2]) for entry in self.dirs.values())
+
+    def _abs_path(self, rel_path):
+        return os.path.join(self.root_folder, rel_path) if rel_path else self.root_folder
+
+    def _rel_path(self, abs_path):
+        if abs_path == self.root_folder:
+            return ""
+        prefix_length = len(self.root_folder) if self.root_folder.endswith(os.sep) else len(self.root_folder) + 1
+        return abs_path[prefix_length:]
+
+
+# === END FILE INDEX ======================================================
+
+
+# === FUZZY MATCHING ENGINE ===============================================
+class FuzzyMatcher:
+    """Trigram-prefiltered fuzzy filename matcher built over a FileIndex snapshot.
+
+    Every distinct lowercase filename is split into trigrams once. A query only scores the names
+    that share enough trigrams with it, in batches, and returns the best matches ranked by score.
+    Each distinct name is scored once no matter how many folders contain it.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self, file_index):
+        self.file_index = file_index
+        self.generation = file_index.generation
+        self.names = []  # Distinct lowercase filenames; the position is the name id
+        self.locations = []  # Maps name id -> list of (dir path, original filename)
+        self.postings = {}  # Maps trigram -> array of name ids containing it
+
+        name_ids = {}
+        for root, files in file_index.iter_directories():
+            for filename in files:
+                key = filename.lower()
+                name_id = name_ids.get(key)
+                if name_id is None:
+                    name_id = name_ids[key] = len(self.names)
+                    self.names.append(key)
+                    self.locations.append([])
+                    for gram in self.grams(key):
+                        postings = self.postings.get(gram)
+                        if postings is None:
+                            postings = self.postings[gram] = array("I")
+                        postings.append(name_id)
+                self.locations[name_id].append((root, filename))
+        logging.info(f"Built fuzzy trigram index: {len(self.names)} distinct names, {len(self.postings)} trigrams.")
+
+    @classmethod
+    def grams(cls, text):
+        """Returns the set of n-grams in a string (empty if it is shorter than GRAM_SIZE)."""
+        return {text[i:i + cls.GRAM_SIZE] for i in range(len(text) - cls.GRAM_SIZE + 1)}
+
+    def candidates(self, query):
+        """Returns the ids of names worth scoring for a lowercase query, most shared trigrams first."""
+        query_grams = self.grams(query)
+        if not query_grams:
+            return list(range(len(self.names)))  # Too short to prefilter; score everything
+
+        shared_counts = Counter()
+        for gram in query_grams:
+            postings = self.postings.get(gram)
+            if postings:
+                shared_counts.update(postings)
+
+        min_shared = max(1, math.ceil(len(query_grams) * FUZZY_MIN_GRAM_OVERLAP))
+        return [name_id for name_id, count in shared_counts.most_common() if count >= min_shared]
+
+    def match(self, keyword, limit=FUZZY_TOP_K, cancel_event=None, on_progress=None):
+        """Returns up to `limit` (score, full path) pairs scoring above FUZZY_SCORE_THRESHOLD, best first.
+
+        on_progress(names_scored, names_matched) is called after every batch, and scoring stops
+        early once cancel_event is set.
+        """
+        from fuzzywuzzy import fuzz
+
+        query = keyword.lower()
+        candidate_ids = self.candidates(query)
+        logging.info(f"Fuzzy prefilter for '{keyword}': {len(candidate_ids)} of {len(self.names)} names to score.")
+
+        scored = []  # (score, name id) for names above the threshold
+        for start in range(0, len(candidate_ids), FUZZY_BATCH_SIZE):
+            if cancel_event and cancel_event.is_set():
+                break
+            batch = candidate_ids[start:start + FUZZY_BATCH_SIZE]
+            for name_id in batch:
+                score = fuzz.partial_ratio(query, self.names[name_id])
+                if score > FUZZY_SCORE_THRESHOLD:
+                    scored.append((score, name_id))
+            metrics.increment("fuzzy_names_scored", len(batch))
+            if on_progress:
+                on_progress(start + len(batch), len(scored))
+
+        scored.sort(key=lambda item: (-item[0], self.names[item[1]]))
+        ranked = []
+        for score, name_id in scored:
+            for root, filename in self.locations[name_id]:
+                ranked.append((score, os.path.join(root, filename)))
+                if len(ranked) >= limit:
+                    return ranked
+        return ranked
+
+
+# === END FUZZY MATCHING ENGINE ===========================================
+
+
+# === SEARCH ENGINE =======================================================
+class SearchOptions:
+    """Plain search options, mirroring the switches on the 'Search & Act' tab.
+
+    mode is "Keyword", "Extension" or "Content" (text inside files). Like the app, fuzzy and
+    extension searches are always case-insensitive, and fuzzy matching only applies to filenames.
+    """
+
+    def __init__(self, mode="Keyword", case_sensitive=True, fuzzy=False):
+        self.mode = mode
+        self.fuzzy = fuzzy and mode != "Content"
+        self.case_sensitive = case_sensitive and not fuzzy and mode != "Extension"
+
+    def __repr__(self):
+        return f"SearchOptions(mode={self.mode!r}, case_sensitive={self.case_sensitive}, fuzzy={self.fuzzy})"
+
+    def __eq__(self, other):
+        return isinstance(other, SearchOptions) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self):
+        return self.mode, self.case_sensitive, self.fuzzy
+
+
+def filename_matcher(keyword, options):
+    """Returns a predicate telling whether a filename matches keyword under the given options."""
+    if options.fuzzy and options.mode != "Extension":
+        from fuzzywuzzy import fuzz
+
+        query = keyword.lower()
+        return lambda filename: fuzz.partial_ratio(query, filename.lower()) > FUZZY_SCORE_THRESHOLD
+
+    if options.mode == "Extension":
+        clean_ext_base = re.sub(r'[^a-zA-Z0-9]', '', keyword).strip()
+        if not clean_ext_base:
+            return lambda filename: False
+        clean_ext = '.' + clean_ext_base.lower()
+        return lambda filename: filename.lower().endswith(clean_ext)
+
+    if options.case_sensitive:
+        return lambda filename: keyword in filename
+    keyword_lower = keyword.lower()
+    return lambda filename: keyword_lower in filename.lower()
+
+
+def query_refines(previous_keyword, keyword, options):
+    """Returns True if every file matching keyword also matched previous_keyword under the same options.
+
+    That holds when the new keyword contains the old one (e.g. "rep" -> "report"), for keyword
+    and content searches. Fuzzy scores, extension suffixes and query-language queries don't
+    narrow that way.
+    """
+    if options.fuzzy or options.mode not in ("Keyword", "Content"):
+        return False
+    if options.mode == "Keyword" and (is_query_syntax(previous_keyword) or is_query_syntax(keyword)):
+        return False
+    if not options.case_sensitive:
+        previous_keyword, keyword = previous_keyword.lower(), keyword.lower()
+    return previous_keyword in keyword
+
+
+def group_paths_by_folder(paths):
+    """Returns [(folder, filenames)] for a list of file paths, like FileIndex.iter_directories."""
+    folders = {}
+    for path in paths:
+        folder, filename = os.path.split(path)
+        folders.setdefault(folder, []).append(filename)
+    return list(folders.items())
+
+
+class SearchEngine:
+    """Searches one root folder through its persistent FileIndex (and the FuzzyMatcher derived from it).
+
+    With a query_cache (see QueryCache), repeated searches are answered from remembered results.
+    """
+
+    def __init__(self, root_folder, walker=None, query_cache=None):
+        self.root_folder = os.path.abspath(root_folder)  # One index per folder, whatever the cwd
+        self.file_index = FileIndex(self.root_folder, walker)
+        self.query_cache = query_cache
+        self.fuzzy_matcher = None  # Rebuilt whenever the index generation changes
+        self.content_searcher = None  # Created on the first content search
+        self.watcher = None
+
+    def prepare(self, cancel_event=None):
+        """Builds the index on first use, otherwise refreshes only the folders that changed."""
+        return self.file_index.refresh(cancel_event)
+
+    def iter_unindexed_directories(self, cancel_event=None):
+        """Yields (folder, filenames) for a search that runs before the index is built.
+
+        Builds the index on the way or, while another thread is building it, walks the tree
+        separately, so the search streams results instead of waiting for the build.
+        """
+        file_index = self.file_index
+        if file_index.lock.acquire(blocking=False):
+            try:
+                yield from file_index.iter_build(cancel_event)
+            finally:
+                file_index.lock.release()
+        else:
+            for dirpath, _, filenames, _ in file_index.walker.walk(self.root_folder, cancel_event=cancel_event):
+                yield dirpath, filenames
+
+    def start_watching(self, on_changes):
+        """Keeps the index current from filesystem events. See FolderWatcher for on_changes."""
+        if not self.watcher:
+            self.watcher = FolderWatcher(self.file_index, on_changes)
+            self.watcher.start()
+
+    def close(self):
+        if self.watcher:
+            self.watcher.stop()
+        if self.content_searcher:
+            self.content_searcher.close()
+        if self.query_cache is not None:
+            self.query_cache.discard_root(self.root_folder)
+        self.file_index.close()
+
+    @property
+    def is_closed(self):
+        return self.file_index.is_closed
+
+    def search(self, keyword, options, cancel_event=None, on_batch=None, on_progress=None, candidate_paths=None,
+               result_store=None):
+        """Searches for files matching keyword under the given options.
+
+        Matches are passed to on_batch(paths) and counts to on_progress(files_scanned,
+        files_matched) every SEARCH_BATCH_INTERVAL seconds, and the search stops early once
+        cancel_event is set. Returns every match found.
+
+        With candidate_paths (e.g. the results of a query this one refines, see query_refines),
+        only those files are checked and the index is not refreshed. Fuzzy searches ignore it.
+
+        With result_store, matches are added to that ResultStore and reported (and returned) as
+        result IDs instead of paths, sharing the filename strings already held by the index.
+
+        With a query_cache, a full search whose results are cached for the current index state
+        is answered from the cache in one batch, and completed searches are cached.
+
+        Before the index is built, a non-fuzzy search matches each folder as it is listed (see
+        iter_unindexed_directories), so results stream and cancel_event stops the walk.
+        """
+        logging.info(f"Starting search in '{self.root_folder}' for '{keyword}' with {options}")
+
+        found_files = []
+        pending_batch = []
+        files_scanned = 0
+        last_flush_time = time.monotonic()
+        make_result = result_store.add if result_store is not None else os.path.join
+
+        def report_paths(paths):
+            # Content and fuzzy matches arrive as full paths
+            results = [make_result(*os.path.split(path)) for path in paths]
+            found_files.extend(results)
+            if on_batch and results:
+                on_batch(results)
+
+        # Query the persistent index instead of re-walking the tree; only changed folders are re-listed
+        metrics.increment("searches")
+        cache_key = None
+        is_fuzzy = options.fuzzy and options.mode != "Extension"
+        if candidate_paths is None and not is_fuzzy and not self.file_index.is_built():
+            metrics.increment("searches_unindexed")
+            directories = self.iter_unindexed_directories(cancel_event)
+        elif candidate_paths is None:
+            with metrics.timer("search_prepare"):
+                self.prepare(cancel_event)  # Re-stats every indexed folder, so the generation reflects any change
+            if cancel_event and cancel_event.is_set():
+                return found_files
+            if self.query_cache is not None and is_cacheable_query(keyword, options):
+                cache_key = (self.root_folder, keyword, options.mode, options.case_sensitive, options.fuzzy)
+                index_state = self.query_cache.index_state(self.file_index)
+                cached = self.query_cache.get(cache_key, index_state)
+                if cached is not None:
+                    found_files.extend(make_result(folder, filename) for folder, filename in cached)
+                    if on_batch and found_files:
+                        on_batch(list(found_files))
+                    if on_progress:
+                        on_progress(self.file_index.file_count(), len(found_files))
+                    metrics.increment("search_matches", len(found_files))
+                    return found_files
+            directories = self.file_index.iter_directories()
+        else:
+            metrics.increment("searches_narrowed")
+            directories = group_paths_by_folder(candidate_paths)
+        match_start = time.perf_counter()
+
+        if options.mode == "Content":
+            if not self.content_searcher:
+                self.content_searcher = ContentSearcher(self.file_index)
+            self.content_searcher.search(keyword, options.case_sensitive, cancel_event=cancel_event,
+                                         on_batch=report_paths, on_progress=on_progress, directories=directories)
+            metrics.record_time("search_match", time.perf_counter() - match_start)
+            metrics.increment("search_matches", len(found_files))
+            return found_files
+
+        if is_fuzzy:
+            # Ranked fuzzy matching over the trigram index; results arrive in one batch, best first
+            ranked = self.get_fuzzy_matcher().match(keyword, cancel_event=cancel_event, on_progress=on_progress)
+            report_paths([path for _, path in ranked])
+            if cache_key and not (cancel_event and cancel_event.is_set()):
+                self.query_cache.put(cache_key, index_state, [os.path.split(path) for _, path in ranked])
+            metrics.record_time("search_match", time.perf_counter() - match_start)
+            metrics.increment("search_matches", len(found_files))
+            return found_files
+
+        query = compile_query(keyword, options)
+        is_match = query.match_name
+        files_statted = 0
+        for root, files in directories:
+            if cancel_event and cancel_event.is_set():
+                break
+
+            if not query.needs_stat:
+                for filename in files:
+                    if is_match(filename):
+                        result = make_result(root, filename)
+                        found_files.append(result)
+                        pending_batch.append(result)
+            else:
+                # Name tests decide most files; only the undecided ones are stat-ed, from one scandir of the folder
+                undecided = []
+                for filename in files:
+                    decided = query.test(filename, None)
+                    if decided:
+                        result = make_result(root, filename)
+                        found_files.append(result)
+                        pending_batch.append(result)
+                    elif decided is None:
+                        undecided.append(filename)
+                if undecided:
+                    files_statted += len(undecided)
+                    for filename, file_stat in stat_folder_entries(root, undecided):
+                        if query.test(filename, file_stat):
+                            if result_store is not None:
+                                result = result_store.add(root, filename, file_stat.st_size, file_stat.st_mtime)
+                            else:
+                                result = os.path.join(root, filename)
+                            found_files.append(result)
+                            pending_batch.append(result)
+
+            files_scanned += len(files)
+            if time.monotonic() - last_flush_time >= SEARCH_BATCH_INTERVAL:
+                if on_batch and pending_batch:
+                    on_batch(pending_batch)
+                    pending_batch = []
+                if on_progress:
+                    on_progress(files_scanned, len(found_files))
+                last_flush_time = time.monotonic()
+
+        if on_batch and pending_batch:
+            on_batch(pending_batch)
+        if on_progress:
+            on_progress(files_scanned, len(found_files))
+        if cache_key and not (cancel_event and cancel_event.is_set()):
+            if result_store is not None:
+                self.query_cache.put(cache_key, index_state, [result_store.folder_and_name(result_id)
+                                                              for result_id in found_files])
+            else:
+                self.query_cache.put(cache_key, index_state, [os.path.split(path) for path in found_files])
+
+        metrics.record_time("search_match", time.perf_counter() - match_start)
+        metrics.increment("search_files_examined", files_scanned)
+        metrics.increment("search_files_statted", files_statted)
+        metrics.increment("search_matches", len(found_files))
+        return found_files
+
+    def find_duplicates(self, min_size=DUPLICATE_MIN_SIZE, cancel_event=None, on_progress=None):
+        """Refreshes the index and returns groups of identical files. See DuplicateFinder.find."""
+        self.prepare(cancel_event)
+        return DuplicateFinder(self.file_index).find(min_size=min_size, cancel_event=cancel_event,
+                                                     on_progress=on_progress)
+
+    def get_fuzzy_matcher(self):
+        """Returns the FuzzyMatcher for the index, rebuilding it only when the index has changed."""
+        matcher = self.fuzzy_matcher
+        if not matcher or matcher.generation != self.file_index.generation:
+            with metrics.timer("fuzzy_index_build"):
+                matcher = self.fuzzy_matcher = FuzzyMatcher(self.file_index)
+        return matcher
+
+
+class MultiRootSearch:
+    """Searches several root folders at once and merges their matches into one stream.
+
+    Every root keeps its own SearchEngine (and index) and is searched on its own thread, so a
+    slow network share only delays its own matches. With more than one root, each match is
+    stat-ed on its root's thread and files already reported (the same (device, inode), e.g.
+    from overlapping roots or symlinks) are dropped.
+    """
+
+    def __init__(self, search_engines):
+        self.search_engines = list(search_engines)
+
+    def search(self, keyword, options, cancel_event=None, on_batch=None, on_progress=None, candidate_paths=None,
+               result_store=None):
+        """Same contract as SearchEngine.search; results from all roots arrive interleaved."""
+        if len(self.search_engines) == 1 or candidate_paths is not None:
+            # Narrowed searches only re-check the (already de-duplicated) candidate files
+            return self.search_engines[0].search(keyword, options, cancel_event=cancel_event, on_batch=on_batch,
+                                                 on_progress=on_progress, candidate_paths=candidate_paths,
+                                                 result_store=result_store)
+
+        lock = threading.Lock()  # Guards everything below; the ResultStore takes one writer at a time
+        seen_files = set()
+        found_files = []
+        files_scanned = [0] * len(self.search_engines)
+        errors = []
+
+        def search_root(position):
+            search_engine = self.search_engines[position]
+
+            def on_root_batch(paths):
+                identified = [(path, file_identity(path)) for path in paths]  # Stat outside the lock
+                with lock:
+                    results = []
+                    for path, (identity, file_stat) in identified:
+                        if identity in seen_files:
+                            metrics.increment("search_duplicates_dropped")
+                            continue
+                        seen_files.add(identity)
+                        if result_store is None:
+                            results.append(path)
+                        elif file_stat:
+                            results.append(result_store.add_path(path, file_stat.st_size, file_stat.st_mtime))
+                        else:
+                            results.append(result_store.add_path(path))
+                    found_files.extend(results)
+                    if on_batch and results:
+                        on_batch(results)
+
+            def on_root_progress(root_files_scanned, root_files_matched):
+                with lock:
+                    files_scanned[position] = root_files_scanned
+                    if on_progress:
+                        on_progress(sum(files_scanned), len(found_files))
+
+            try:
+                search_engine.search(keyword, options, cancel_event=cancel_event, on_batch=on_root_batch,
+                                     on_progress=on_root_progress)
+            except Exception as e:
+                logging.error(f"Search in '{search_engine.root_folder}' failed: {e}")
+                with lock:
+                    errors.append((search_engine.root_folder, e))
+
+        with ThreadPoolExecutor(max_workers=len(self.search_engines)) as executor:
+            list(executor.map(search_root, range(len(self.search_engines))))
+
+        if errors and len(errors) == len(self.search_engines):
+            raise errors[0][1]
+        return found_files
+
+
+def file_identity(path):
+    """Returns ((device, inode), stat) for a file, or a path-based key and None if it can't be stat-ed."""
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return os.path.normcase(path), None
+    if not file_stat.st_ino:
+        return os.path.normcase(os.path.realpath(path)), file_stat  # Filesystems without inode numbers
+    return (file_stat.st_dev, file_stat.st_ino), file_stat
+
+
+def is_same_or_inside(path, folder):
+    """Returns True if path is folder itself or somewhere below it."""
+    path = os.path.normcase(os.path.normpath(path))
+    folder = os.path.normcase(os.path.normpath(folder))
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
+
+
+# === END SEARCH ENGINE ===================================================
+
+
+# === QUERY LANGUAGE ======================================================
+# Keyword searches accept a small query language, e.g.
+#     report AND ext:pdf,docx NOT draft size:>10MB modified:<30d name:/^inv\d+/
+# Terms are ANDed unless joined by OR; NOT negates the next term and parentheses group.
+#   word / "quoted phrase"   filename contains it (glob with * or ?: the whole filename matches)
+#   ext:pdf,docx             extension is one of these (always case-insensitive)
+#   name:/regex/, name:/regex/i  regular expression searched in the filename (i: ignore case)
+#   size:>10MB               compare with >, >=, <, <=, = and B, KB, MB, GB, TB (powers of 1024)
+#   modified:<30d            modified less than 30 days ago (s, m, h, d, w, y), or :>2024-01-31 after a date
+# The query language is used once a keyword has an operator, a field, a quote or a glob; anything
+# else, including parentheses on their own as in "report (1)", is matched literally as before.
+
+QUERY_SYNTAX_PATTERN = re.compile(r'(?:^|\s)(?:AND\s|OR\s|NOT\s|(?:ext|size|modified|name):|")|[*?]')
+QUERY_TOKEN_PATTERN = re.compile(r'"[^"]*"|name:/(?:\\.|[^/\\])*/i?|\S+')
+QUERY_COMPARISON_PATTERN = re.compile(r'^(>=|<=|>|<|=)?(.*)$')
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3,
+              "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+COMPARISONS = {">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "<": lambda a, b: a < b,
+               "<=": lambda a, b: a <= b, "=": lambda a, b: a == b}
+REVERSED_COMPARISONS = {">": "<", ">=": "<=", "<": ">", "<=": ">=", "=": "="}
+
+
+class FileQuery:
+    """A keyword compiled once into a predicate.
+
+    test(filename, file_stat) returns True or False, or None when the answer depends on a
+    stat that wasn't given (file_stat=None); the search then stats just those files. When
+    needs_stat is False, match_name(filename) is a plain (faster) boolean predicate.
+    """
+
+    def __init__(self, test, needs_stat, match_name=None):
+        self.test = test
+        self.needs_stat = needs_stat
+        self.match_name = match_name or (lambda filename: test(filename, None))
+
+    def matches_path(self, path):
+        """Tests a full path, stat-ing it only if the query needs to."""
+        filename = os.path.basename(path)
+        decided = self.test(filename, None)
+        if decided is not None:
+            return decided
+        try:
+            return bool(self.test(filename, os.stat(path)))
+        except OSError:
+            return False
+
+
+def is_query_syntax(keyword):
+    """Returns True if keyword uses the query language rather than being a plain keyword."""
+    return bool(QUERY_SYNTAX_PATTERN.search(keyword))
+
+
+def compile_query(keyword, options):
+    """Compiles a keyword into a FileQuery. Raises ValueError for a malformed query.
+
+    Only Keyword-mode, non-fuzzy searches use the query language; everything else (and any
+    keyword without query syntax) compiles to the plain filename_matcher.
+    """
+    if options.fuzzy or options.mode != "Keyword" or not is_query_syntax(keyword):
+        is_match = filename_matcher(keyword, options)
+        return FileQuery(lambda filename, file_stat: is_match(filename), False, is_match)
+
+    tokens = tokenize_query(keyword)
+    test, needs_stat, _, position = parse_query_or(tokens, 0, options)
+    if position != len(tokens):
+        raise ValueError(f"unexpected '{tokens[position]}'")
+    return FileQuery(test, needs_stat)
+
+
+def tokenize_query(keyword):
+    """Splits a query into terms, operators and parentheses (peeled off the start and end of terms)."""
+    tokens = []
+    for raw_token in QUERY_TOKEN_PATTERN.findall(keyword):
+        if raw_token.startswith('"') or raw_token.startswith("name:/"):
+            tokens.append(raw_token)
+            continue
+        core = raw_token.lstrip("(")
+        tokens.extend("(" * (len(raw_token) - len(core)))
+        stripped = core.rstrip(")")
+        if stripped:
+            tokens.append(stripped)
+        tokens.extend(")" * (len(core) - len(stripped)))
+    return tokens
+
+
+# --- Parsing (each rule returns (test, needs_stat, cost, next position)) ---
+def parse_query_or(tokens, position, options):
+    nodes = []
+    while True:
+        test, needs_stat, cost, position = parse_query_and(tokens, position, options)
+        nodes.append((test, needs_stat, cost))
+        if position < len(tokens) and tokens[position] == "OR":
+            position += 1
+            continue
+        break
+    return (*combine_query_nodes(nodes, any_of=True), position)
+
+
+def parse_query_and(tokens, position, options):
+    nodes = []
+    while position < len(tokens) and tokens[position] not in ("OR", ")"):
+        if tokens[position] == "AND":
+            position += 1
+            continue
+        test, needs_stat, cost, position = parse_query_unary(tokens, position, options)
+        nodes.append((test, needs_stat, cost))
+    if not nodes:
+        raise ValueError("missing search term")
+    return (*combine_query_nodes(nodes, any_of=False), position)
+
+
+def parse_query_unary(tokens, position, options):
+    token = tokens[position]
+    if token == "NOT":
+        if position + 1 >= len(tokens):
+            raise ValueError("NOT needs a term after it")
+        test, needs_stat, cost, position = parse_query_unary(tokens, position + 1, options)
+
+        def negated(filename, file_stat):
+            decided = test(filename, file_stat)
+            return None if decided is None else not decided
+
+        return negated, needs_stat, cost, position
+    if token == "(":
+        test, needs_stat, cost, position = parse_query_or(tokens, position + 1, options)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise ValueError("missing ')'")
+        return test, needs_stat, cost, position + 1
+    return (*compile_query_term(token, options), position + 1)
+
+
+def combine_query_nodes(nodes, any_of):
+    """Joins (test, needs_stat, cost) nodes with OR or AND, running the cheapest tests first."""
+    if len(nodes) == 1:
+        return nodes[0]
+    nodes.sort(key=lambda node: node[2])
+    tests = [node[0] for node in nodes]
+    needs_stat = any(node[1] for node in nodes)
+    cost = sum(node[2] for node in nodes)
+    short_circuit = any_of  # True decides an OR, False decides an AND
+
+    def combined(filename, file_stat):
+        result = not short_circuit
+        for test in tests:
+            decided = test(filename, file_stat)
+            if decided is short_circuit:
+                return short_circuit
+            if decided is None:
+                result = None
+        return result
+
+    return combined, needs_stat, cost
+
+
+# --- Terms (cost orders tests within AND/OR: name tests are cheap, stat tests cost a syscall) ---
+def compile_query_term(token, options):
+    """Compiles one term into (test, needs_stat, cost)."""
+    field, _, value = token.partition(":")
+    field = field.lower()
+    if token.startswith('"'):
+        return compile_text_term(token.strip('"'), options)
+    if field == "ext" and value:
+        extensions = tuple("." + ext.strip().lstrip(".").lower() for ext in value.split(",") if ext.strip())
+        if not extensions:
+            raise ValueError(f"no extension in '{token}'")
+        return lambda filename, file_stat: filename.lower().endswith(extensions), False, 2
+    if field == "name" and value:
+        if value.startswith("/"):
+            pattern, _, flags = value[1:].rpartition("/")
+            if not pattern:
+                raise ValueError(f"empty regular expression in '{token}'")
+            regex_flags = re.IGNORECASE if "i" in flags or not options.case_sensitive else 0
+            try:
+                search = re.compile(pattern, regex_flags).search
+            except re.error as e:
+                raise ValueError(f"bad regular expression '{pattern}': {e}")
+            return lambda filename, file_stat: search(filename) is not None, False, 4
+        return compile_text_term(value, options)
+    if field == "size" and value:
+        operator, threshold = parse_comparison(value, token)
+        size = parse_size(threshold, token)
+        return stat_comparison("st_size", COMPARISONS[operator], size)
+    if field == "modified" and value:
+        operator, threshold = parse_comparison(value, token)
+        return compile_modified_term(operator, threshold, token)
+    return compile_text_term(token, options)
+
+
+def compile_text_term(text, options):
+    """Substring test, or a whole-filename glob when text contains * or ?."""
+    if not text:
+        raise ValueError("empty search term")
+    if not options.case_sensitive:
+        text = text.lower()
+    if "*" in text or "?" in text:
+        match = re.compile(fnmatch.translate(text), 0 if options.case_sensitive else re.IGNORECASE).match
+        return lambda filename, file_stat: match(filename) is not None, False, 3
+    if options.case_sensitive:
+        return lambda filename, file_stat: text in filename, False, 1
+    return lambda filename, file_stat: text in filename.lower(), False, 1
+
+
+def compile_modified_term(operator, threshold, token):
+    """modified:<30d (newer than 30 days) / modified:>2024-01-31 (after that day)."""
+    age = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdwy])", threshold.lower())
+    if age:
+        if operator == "=":
+            raise ValueError(f"use < or > with an age in '{token}'")
+        # "Modified less than 30 days ago" means an mtime later than 30 days ago
+        cutoff = time.time() - float(age.group(1)) * AGE_UNITS[age.group(2)]
+        return stat_comparison("st_mtime", COMPARISONS[REVERSED_COMPARISONS[operator]], cutoff)
+
+    try:
+        day_start = time.mktime(time.strptime(threshold, "%Y-%m-%d"))
+    except ValueError:
+        raise ValueError(f"'{threshold}' is not an age (e.g. 30d) or a date (YYYY-MM-DD)")
+    day_end = day_start + 86400
+    if operator == "=":
+        return (lambda filename, file_stat: None if file_stat is None
+                else day_start <= file_stat.st_mtime < day_end), True, 10
+    # After a day means from its end on, so > and <= (like >= and <) are exact complements
+    if operator in (">", "<="):
+        return stat_comparison("st_mtime", COMPARISONS[">=" if operator == ">" else "<"], day_end)
+    return stat_comparison("st_mtime", COMPARISONS[operator], day_start)
+
+
+def stat_comparison(field, compare, threshold):
+    """Returns a (test, needs_stat, cost) term comparing a stat field (st_size, st_mtime) with threshold."""
+    def test(filename, file_stat):
+        return None if file_stat is None else compare(getattr(file_stat, field), threshold)
+
+    return test, True, 10
+
+
+def parse_comparison(value, token):
+    operator, threshold = QUERY_COMPARISON_PATTERN.match(value).groups()
+    if not threshold:
+        raise ValueError(f"missing value in '{token}'")
+    return operator or "=", threshold
+
+
+def parse_size(text, token):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([a-zA-Z]*)", text)
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"'{text}' is not a size (e.g. 10MB) in '{token}'")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+
+
+def stat_folder_entries(folder, filenames):
+    """Yields (filename, stat) for the given files in one folder from a single os.scandir.
+
+    On Windows the directory listing already carries size and mtime, so these stats are free;
+    elsewhere each one is a single stat call. Files that vanished are skipped.
+    """
+    wanted = set(filenames)
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name in wanted:
+                    try:
+                        yield entry.name, entry.stat()
+                    except OSError:
+                        pass
+    except OSError as e:
+        logging.debug(f"Could not list '{folder}' for file details: {e}")
+
+
+# === END QUERY LANGUAGE ==================================================
+
+
+# === RESULT STORE ========================================================
+class ResultStore:
+    """Compact, append-only store of search results, addressed by stable integer result IDs.
+
+    Each result is a (folder id, filename, size, mtime) record spread over parallel arrays, and
+    every folder path is stored once. Filenames are the strings the index already holds, so a
+    million results cost a few tens of MB instead of a full path string (and widget) each.
+    The name -> ID maps that make find() constant-time are only built by the first find().
+    Size and mtime are -1 until known; file_info() stats a result on first use.
+
+    One worker thread may add results while the UI thread reads the IDs it has been given.
+    Removed results keep their ID (their slot is emptied), so IDs never shift.
+    """
+
+    def __init__(self):
+        self.folders = []  # Folder id -> folder path
+        self.folder_ids = {}  # Folder path -> folder id
+        self.results_by_name = None  # Folder id -> {filename: live result id}, built by the first find()
+        self.folder_of = array("l")  # Result id -> folder id
+        self.names = []  # Result id -> filename (None once removed)
+        self.sizes = array("q")  # Result id -> size in bytes, or -1
+        self.mtimes = array("d")  # Result id -> mtime, or -1
+        self.live_count = 0
+
+    def add(self, folder, name, size=-1, mtime=-1.0):
+        """Adds one result and returns its ID."""
+        folder_id = self.folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self.folder_ids[folder] = len(self.folders)
+            self.folders.append(folder)
+        result_id = len(self.names)
+        self.folder_of.append(folder_id)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.names.append(name)
+        if self.results_by_name is not None:
+            self.results_by_name.setdefault(folder_id, {})[name] = result_id
+        self.live_count += 1
+        return result_id
+
+    def folder_and_name(self, result_id):
+        """Returns (folder, filename) of a result."""
+        return self.folders[self.folder_of[result_id]], self.names[result_id]
+
+    def add_path(self, path, size=-1, mtime=-1.0):
+        folder, name = os.path.split(path)
+        return self.add(folder, name, size, mtime)
+
+    def remove(self, result_ids):
+        """Forgets the given results. Their IDs are never reused."""
+        for result_id in result_ids:
+            name = self.names[result_id]
+            if name is not None:
+                if self.results_by_name is not None:
+                    folder_results = self.results_by_name[self.folder_of[result_id]]
+                    if folder_results.get(name) == result_id:
+                        del folder_results[name]
+                self.names[result_id] = None
+                self.live_count -= 1
+
+    def find(self, paths):
+        """Returns the IDs of the live results with the given paths, in store order."""
+        if self.results_by_name is None:
+            self.results_by_name = {}
+            for result_id, name in enumerate(self.names):
+                if name is not None:
+                    self.results_by_name.setdefault(self.folder_of[result_id], {})[name] = result_id
+        found = set()
+        for path in paths:
+            folder, name = os.path.split(path)
+            result_id = self.results_by_name.get(self.folder_ids.get(folder), {}).get(name)
+            if result_id is not None:
+                found.add(result_id)
+        return sorted(found)
+
+    def ids(self):
+        """Returns the IDs of every live result, in the order they were added."""
+        return [result_id for result_id, name in enumerate(self.names) if name is not None]
+
+    def name(self, result_id):
+        return self.names[result_id]
+
+    def path(self, result_id):
+        return os.path.join(self.folders[self.folder_of[result_id]], self.names[result_id])
+
+    def paths(self, result_ids):
+        return [self.path(result_id) for result_id in result_ids]
+
+    def file_info(self, result_id):
+        """Returns (size, mtime) of a result, stat-ing it the first time. (-1, -1) if it can't be read."""
+        if self.sizes[result_id] < 0:
+            try:
+                file_stat = os.stat(self.path(result_id))
+            except OSError:
+                return -1, -1.0
+            self.sizes[result_id] = file_stat.st_size
+            self.mtimes[result_id] = file_stat.st_mtime
+        return self.sizes[result_id], self.mtimes[result_id]
+
+    def __len__(self):
+        return self.live_count
+
+    def __contains__(self, result_id):
+        return 0 <= result_id < len(self.names) and self.names[result_id] is not None
+
+
+# === END RESULT STORE ====================================================
+
+
+# === QUERY CACHE =========================================================
+def is_cacheable_query(keyword, options):
+    """Returns True if a search's results only depend on the folder listings it covers.
+
+    Content searches read the files, and size/modified queries their metadata (and the clock),
+    which can change without any folder mtime changing, so those are never cached.
+    """
+    if options.mode == "Content":
+        return False
+    if options.fuzzy or options.mode == "Extension":
+        return True
+    return not compile_query(keyword, options).needs_stat
+
+
+class QueryCache:
+    """Bounded LRU cache of search results, keyed by (root, keyword, mode, case sensitivity, fuzzy).
+
+    Every full search refreshes its FileIndex first, which re-stats the mtime of every folder it
+    covers and bumps the index generation when any of them changed. An entry remembers the index
+    (by a token, so a closed index isn't kept alive) and generation it was computed from, and is
+    only returned while both are unchanged. Results are kept as (folder, filename) pairs sharing
+    the index's strings. Entries are evicted least recently used first once there are more than
+    max_entries or their estimated size exceeds max_bytes. Hits, misses, invalidations and
+    evictions are counted in metrics.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (index state, results, estimated bytes), least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()  # Searches of several roots run on separate threads
+
+    @staticmethod
+    def index_state(file_index):
+        """Returns what an entry must match to still be valid: the index instance and its generation."""
+        return file_index.cache_token, file_index.generation
+
+    def get(self, key, index_state):
+        """Returns the cached results for key, or None if there are none for this index state."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] != index_state:
+                self._remove(key)
+                metrics.increment("query_cache_invalidations")
+                entry = None
+            if entry is None:
+                metrics.increment("query_cache_misses")
+                return None
+            self.entries.move_to_end(key)
+            metrics.increment("query_cache_hits")
+            return entry[1]
+
+    def put(self, key, index_state, results):
+        """Caches results ((folder, filename) pairs) unless they alone would exceed max_bytes."""
+        estimated_bytes = sum(QUERY_CACHE_RESULT_BYTES + sys.getsizeof(filename) for _, filename in results)
+        if estimated_bytes > self.max_bytes or self.max_entries < 1:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (index_state, results, estimated_bytes)
+            self.total_bytes += estimated_bytes
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                metrics.increment("query_cache_evictions")
+            self._update_gauges()
+
+    def discard_root(self, root):
+        """Drops every entry for a root folder, e.g. when its engine is closed."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == root]:
+                self._remove(key)
+            self._update_gauges()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self._update_gauges()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key)[2]
+
+    def _update_gauges(self):
+        metrics.set_gauge("query_cache_entries", len(self.entries))
+        metrics.set_gauge("query_cache_bytes", self.total_bytes)
+
+
+# === END QUERY CACHE =====================================================
+
+
+# === CONTENT SEARCH ======================================================
+def scan_text_files(paths, keyword, case_sensitive, max_size=CONTENT_MAX_FILE_SIZE):
+    """Returns ("text", matching paths, (files scanned, binary skipped, too large skipped, bytes scanned)).
+
+    Runs in a content-search worker process. Each file is memory-mapped and searched for the
+    UTF-8 bytes of keyword, stopping at the first hit. Case-insensitive matching folds ASCII
+    letters only.
+    """
+    needle = keyword.encode("utf-8")
+    pattern = None if case_sensitive else re.compile(re.escape(needle), re.IGNORECASE)
+    matched_paths = []
+    scanned_count = binary_count = large_count = bytes_scanned = 0
+
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size > max_size:
+                    large_count += 1
+                    continue
+                if size < len(needle) or not needle:
+                    continue
+                if b"\0" in f.read(BINARY_SNIFF_BYTES):
+                    binary_count += 1
+                    continue
+                scanned_count += 1
+                bytes_scanned += size
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if pattern is None:
+                        is_hit = mapped.find(needle) != -1
+                    else:
+                        is_hit = pattern.search(mapped) is not None
+        except (OSError, ValueError):
+            continue  # Unreadable, or changed while being scanned
+        if is_hit:
+            matched_paths.append(path)
+
+    return "text", matched_paths, (scanned_count, binary_count, large_count, bytes_scanned)
+
+
+def extract_document_texts(documents):
+    """Returns ("documents", [(path, size, mtime, text or None)]). Runs in a content-search worker process.
+
+    DOCX text is read straight from the archive's XML. PDF text needs the optional pypdf package;
+    without it the text is None (and not cached). Unreadable documents get empty text so they
+    aren't parsed again until they change.
+    """
+    extracted = []
+    for path, size, mtime in documents:
+        text = ""
+        try:
+            if path.lower().endswith(".docx"):
+                with zipfile.ZipFile(path) as archive:
+                    xml = archive.read("word/document.xml").decode("utf-8", "replace")
+                xml = re.sub(r"</w:p>|<w:br/>|<w:tab/>", "\n", xml)
+                text = html.unescape(re.sub(r"<[^>]+>", "", xml))
+            else:
+                try:
+                    from pypdf import PdfReader
+                except ImportError:
+                    text = None
+                else:
+                    text = "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+        except Exception as e:  # Corrupt or encrypted documents raise all sorts of errors
+            logging.info(f"Could not extract text from '{path}': {e}")
+        extracted.append((path, size, mtime, text))
+    return "documents", extracted
+
+
+class DocumentTextCache:
+    """SQLite cache of text extracted from PDF/DOCX files, keyed by (path, size, mtime)."""
+
+    def __init__(self, db_path=None):
+        db_path = db_path or DOCUMENT_CACHE_PATH
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                              "mtime REAL NOT NULL, text TEXT NOT NULL)")
+            self.conn.commit()
+
+    def get(self, path, size, mtime):
+        """Returns the cached text, or None if the document is not cached or has changed since."""
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime, text FROM documents WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == size and row[1] == mtime:
+            return row[2]
+        return None
+
+    def put_many(self, entries):
+        """Stores (path, size, mtime, text) entries, replacing older text for the same paths."""
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO documents (path, size, mtime, text) VALUES (?, ?, ?, ?)",
+                                  entries)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ContentSearcher:
+    """Searches the contents of the files in a FileIndex with a pool of worker processes.
+
+    Plain files are handed to the workers in chunks of CONTENT_CHUNK_FILES, memory-mapped and
+    scanned until the first hit, with binary and oversized files skipped. PDF/DOCX text is
+    extracted by the workers once and then served from a DocumentTextCache. Only a few chunks are
+    in flight at a time, so hits stream out while the tree is still being read and a
+    cancellation takes effect quickly.
+    """
+
+    _pool = None  # One process pool for the whole session; starting processes is slow on Windows
+    _pool_lock = threading.Lock()
+
+    def __init__(self, file_index):
+        self.file_index = file_index
+        self.document_cache = DocumentTextCache()
+
+    @classmethod
+    def get_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None:
+                # "spawn" everywhere: forking a process that runs Tk and worker threads is unsafe
+                cls._pool = ProcessPoolExecutor(max_workers=CONTENT_WORKERS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            return cls._pool
+
+    @classmethod
+    def discard_pool(cls, pool):
+        """Drops a pool whose worker died (OOM, a crash in a document parser) so the next search starts a new one."""
+        with cls._pool_lock:
+            if cls._pool is pool:
+                cls._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.document_cache.close()
+
+    def search(self, keyword, case_sensitive, cancel_event=None, on_batch=None, on_progress=None, directories=None):
+        """Returns the files whose contents contain keyword, streaming them to on_batch like SearchEngine.search.
+
+        directories is an iterable of (folder, filenames) to search, the whole index by default.
+        Unreadable files are skipped inside the workers; a worker that fails outright fails the
+        search (raising), so a partial result is never reported as complete.
+        """
+        pool = self.get_pool()
+        max_in_flight = CONTENT_WORKERS * 2
+        in_flight = set()
+        state = {"files_scanned": 0, "last_flush": time.monotonic()}
+        found_files = []
+        pending_batch = []
+        keyword_lower = keyword.lower()
+
+        def document_matches(text):
+            return keyword in text if case_sensitive else keyword_lower in text.lower()
+
+        def add_hits(paths):
+            found_files.extend(paths)
+            pending_batch.extend(paths)
+
+        def collect(futures):
+            for future in futures:
+                if future.cancelled():
+                    continue
+                result = future.result()  # Raises if the worker failed; see the handler below
+                if result[0] == "text":
+                    _, matched_paths, (scanned, binary, large, bytes_scanned) = result
+                    add_hits(matched_paths)
+                    metrics.increment("content_files_scanned", scanned)
+                    metrics.increment("content_files_skipped_binary", binary)
+                    metrics.increment("content_files_skipped_large", large)
+                    metrics.increment("content_bytes_scanned", bytes_scanned)
+                else:
+                    extracted = [entry for entry in result[1] if entry[3] is not None]
+                    self.document_cache.put_many(extracted)
+                    add_hits([path for path, _, _, text in extracted if document_matches(text)])
+
+        def flush(force=False):
+            if not force and time.monotonic() - state["last_flush"] < SEARCH_BATCH_INTERVAL:
+                return
+            if on_batch and pending_batch:
+                on_batch(list(pending_batch))
+                pending_batch.clear()
+            if on_progress:
+                on_progress(state["files_scanned"], len(found_files))
+            state["last_flush"] = time.monotonic()
+
+        def submit(function, *args):
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, timeout=SEARCH_BATCH_INTERVAL, return_when=FIRST_COMPLETED)
+                in_flight.difference_update(done)
+                collect(done)
+                flush()
+                if cancel_event and cancel_event.is_set():
+                    return
+            in_flight.add(pool.submit(function, *args))
+
+        text_chunk = []
+        document_chunk = []
+        if directories is None:
+            directories = self.file_index.iter_directories()
+        try:
+            with metrics.timer("content_search"):
+                for root, files in directories:
+                    if cancel_event and cancel_event.is_set():
+                        break
+                    for filename in files:
+                        path = os.path.join(root, filename)
+                        if not filename.lower().endswith(DOCUMENT_EXTENSIONS):
+                            text_chunk.append(path)
+                            continue
+                        try:
+                            stat_result = os.stat(path)
+                        except OSError:
+                            continue
+                        if stat_result.st_size > DOCUMENT_MAX_FILE_SIZE:
+                            metrics.increment("content_files_skipped_large")
+                            continue
+                        text = self.document_cache.get(path, stat_result.st_size, stat_result.st_mtime)
+                        if text is not None:
+                            metrics.increment("document_cache_hits")
+                            if document_matches(text):
+                                add_hits([path])
+                        else:
+                            metrics.increment("document_cache_misses")
+                            document_chunk.append((path, stat_result.st_size, stat_result.st_mtime))
+
+                    state["files_scanned"] += len(files)
+                    if len(text_chunk) >= CONTENT_CHUNK_FILES:
+                        submit(scan_text_files, text_chunk, keyword, case_sensitive)
+                        text_chunk = []
+                    if len(document_chunk) >= DOCUMENT_CHUNK_FILES:
+                        submit(extract_document_texts, document_chunk)
+                        document_chunk = []
+                    flush()
+
+                if not (cancel_event and cancel_event.is_set()):
+                    if text_chunk:
+                        submit(scan_text_files, text_chunk, keyword, case_sensitive)
+                    if document_chunk:
+                        submit(extract_document_texts, document_chunk)
+
+                while in_flight:
+                    if cancel_event and cancel_event.is_set():
+                        for future in in_flight:
+                            future.cancel()  # Chunks already running finish in the background and are dropped
+                        break
+                    done, _ = wait(in_flight, timeout=SEARCH_BATCH_INTERVAL, return_when=FIRST_COMPLETED)
+                    in_flight.difference_update(done)
+                    collect(done)
+                    flush()
+        except BrokenProcessPool as e:
+            self.discard_pool(pool)
+            metrics.increment("content_pool_failures")
+            logging.error(f"Content search worker process died: {e}")
+            raise RuntimeError("A content search worker process stopped unexpectedly, so the search is "
+                               "incomplete. Please search again.") from e
+
+        flush(force=True)
+        return found_files
+
+
+# === END CONTENT SEARCH ==================================================
+
+
+# === DUPLICATE FINDER ====================================================
+class HashCache:
+    """SQLite cache of file hashes keyed by (device, inode), valid while size and mtime are unchanged."""
+
+    STAGES = ("partial", "full")
+
+    def __init__(self, db_path=None):
+        db_path = db_path or HASH_CACHE_PATH
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS hashes (dev INTEGER NOT NULL, inode INTEGER NOT NULL, "
+                              "size INTEGER NOT NULL, mtime REAL NOT NULL, partial BLOB, full BLOB, "
+                              "PRIMARY KEY (dev, inode))")
+            self.conn.commit()
+
+    def get(self, file_stat, stage):
+        """Returns the cached digest of a file for "partial" or "full", or None."""
+        with self.lock:
+            row = self.conn.execute(f"SELECT size, mtime, {stage} FROM hashes WHERE dev = ? AND inode = ?",
+                                    (file_stat.st_dev, file_stat.st_ino)).fetchone()
+        if row and row[0] == file_stat.st_size and row[1] == file_stat.st_mtime:
+            return row[2]
+        return None
+
+    def put(self, file_stat, stage, digest):
+        """Stores a digest, dropping the other stage's digest if the file changed since it was stored."""
+        key = (file_stat.st_dev, file_stat.st_ino)
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime FROM hashes WHERE dev = ? AND inode = ?", key).fetchone()
+            if row == (file_stat.st_size, file_stat.st_mtime):
+                self.conn.execute(f"UPDATE hashes SET {stage} = ? WHERE dev = ? AND inode = ?", (digest,) + key)
+            else:
+                self.conn.execute(f"INSERT OR REPLACE INTO hashes (dev, inode, size, mtime, {stage}) "
+                                  f"VALUES (?, ?, ?, ?, ?)", key + (file_stat.st_size, file_stat.st_mtime, digest))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def hash_file_ends(path, size, block_size=DUPLICATE_PARTIAL_BLOCK):
+    """Hashes the first and last block_size bytes of a file (the whole file if it is up to two blocks long)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+    return digest.digest()
+
+
+def hash_file(path):
+    """Hashes a whole file."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=20)).digest()
+
+
+def map_bounded(executor, function, items, max_in_flight):
+    """Yields (item, function(item)) as the calls finish, with at most max_in_flight of them submitted at once.
+
+    Unlike executor.map, items are only submitted as earlier calls finish, so memory stays flat for
+    millions of items. Closing the generator (e.g. on cancellation) cancels the calls still queued.
+    """
+    items = iter(items)
+    in_flight = {}
+    try:
+        while True:
+            for item in items:
+                in_flight[executor.submit(function, item)] = item
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+class DuplicateFinder:
+    """Finds files with identical contents under a FileIndex in three narrowing stages.
+
+    Files are first bucketed by size, since only files of the same size can be identical. Files
+    in shared buckets get a cheap hash of their first and last blocks, and only files that still
+    collide get a full hash. Hashing runs on a thread pool (hashlib releases the GIL, so it uses
+    every core), and digests are cached across runs in a HashCache. Hard links to the same file
+    are counted once, since removing one frees no space.
+    """
+
+    def __init__(self, file_index, workers=DUPLICATE_HASH_WORKERS):
+        self.file_index = file_index
+        self.workers = workers
+
+    def find(self, min_size=DUPLICATE_MIN_SIZE, cancel_event=None, on_progress=None):
+        """Returns groups of identical files as (file size, paths) with the copy to keep first.
+
+        The copy to keep is the oldest one. Groups are ordered by wasted space, largest first.
+        on_progress(stage, files_done, files_total) is called every SEARCH_BATCH_INTERVAL seconds
+        per stage ("size", "partial", "full"), and the search stops early once cancel_event is set.
+        """
+        hash_cache = HashCache()
+        try:
+            with metrics.timer("duplicate_find"), ThreadPoolExecutor(max_workers=self.workers) as executor:
+                size_groups = self._group_by_size(executor, min_size, cancel_event, on_progress)
+                groups = self._regroup(executor, hash_cache, size_groups, "partial", cancel_event, on_progress)
+                # A partial hash already covers files up to two blocks long
+                covered = [group for group in groups if group[0][1].st_size <= 2 * DUPLICATE_PARTIAL_BLOCK]
+                uncovered = [group for group in groups if group[0][1].st_size > 2 * DUPLICATE_PARTIAL_BLOCK]
+                groups = covered + self._regroup(executor, hash_cache, uncovered, "full", cancel_event, on_progress)
+        finally:
+            hash_cache.close()
+
+        if cancel_event and cancel_event.is_set():
+            return []
+        groups.sort(key=lambda group: group[0][1].st_size * (len(group) - 1), reverse=True)
+        metrics.increment("duplicate_groups", len(groups))
+        return [(group[0][1].st_size,
+                 [path for path, _ in sorted(group, key=lambda entry: (entry[1].st_mtime, len(entry[0]), entry[0]))])
+                for group in groups]
+
+    def _group_by_size(self, executor, min_size, cancel_event, on_progress):
+        """Stats every indexed file and returns the lists of (path, stat) that share a size."""
+        def lstat_or_none(path):
+            try:
+                return os.lstat(path)
+            except OSError:
+                return None
+
+        file_count = self.file_index.file_count()
+        paths = (os.path.join(root, filename) for root, files in self.file_index.iter_directories()
+                 for filename in files)
+        by_size = {}
+        seen_files = set()  # (st_dev, st_ino) already bucketed, so hard links are counted once
+        last_report = time.monotonic()
+        results = map_bounded(executor, lstat_or_none, paths, self.workers * DUPLICATE_IN_FLIGHT_PER_WORKER)
+        for done_count, (path, file_stat) in enumerate(results, 1):
+            if cancel_event and cancel_event.is_set():
+                results.close()
+                return []
+            if on_progress and time.monotonic() - last_report >= SEARCH_BATCH_INTERVAL:
+                on_progress("size", done_count, file_count)
+                last_report = time.monotonic()
+            if file_stat is None or not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < min_size:
+                continue
+            key = (file_stat.st_dev, file_stat.st_ino)
+            if key in seen_files:
+                continue
+            seen_files.add(key)
+            by_size.setdefault(file_stat.st_size, []).append((path, file_stat))
+        return [group for group in by_size.values() if len(group) > 1]
+
+    def _regroup(self, executor, hash_cache, groups, stage, cancel_event, on_progress):
+        """Splits each group by the "partial" or "full" hash of its files, keeping groups of two or more."""
+        def digest_of(entry):
+            path, file_stat = entry
+            digest = hash_cache.get(file_stat, stage)
+            if digest is not None:
+                metrics.increment("hash_cache_hits")
+                return digest
+            try:
+                if stage == "partial":
+                    digest = hash_file_ends(path, file_stat.st_size)
+                else:
+                    digest = hash_file(path)
+            except OSError as e:
+                logging.info(f"Could not hash '{path}': {e}")
+                return None
+            metrics.increment(f"duplicate_files_hashed_{stage}")
+            metrics.increment("duplicate_bytes_hashed",
+                              min(file_stat.st_size, 2 * DUPLICATE_PARTIAL_BLOCK) if stage == "partial"
+                              else file_stat.st_size)
+            hash_cache.put(file_stat, stage, digest)
+            return digest
+
+        entries = [entry for group in groups for entry in group]
+        by_digest = {}
+        last_report = time.monotonic()
+        results = map_bounded(executor, digest_of, entries, self.workers * DUPLICATE_IN_FLIGHT_PER_WORKER)
+        for done_count, ((path, file_stat), digest) in enumerate(results, 1):
+            if cancel_event and cancel_event.is_set():
+                results.close()
+                return []
+            if digest is not None:
+                by_digest.setdefault((file_stat.st_size, digest), []).append((path, file_stat))
+            if on_progress and time.monotonic() - last_report >= SEARCH_BATCH_INTERVAL:
+                on_progress(stage, done_count, len(entries))
+                last_report = time.monotonic()
+        if on_progress and entries:
+            on_progress(stage, len(entries), len(entries))
+        hash_cache.commit()
+        return [group for group in by_digest.values() if len(group) > 1]
+
+
+# === END DUPLICATE FINDER ================================================
+
+
+# === FILESYSTEM WATCHER ==================================================
+class Inotify:
+    """Minimal ctypes wrapper around Linux inotify that reports which folders had entries change."""
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length (struct inotify_event)
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        self.paths = {}  # Maps watch descriptor -> folder path
+        self.watches = {}  # Maps folder path -> watch descriptor
+
+    def add_watch(self, path):
+        watch = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if watch < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number), path)
+        self.paths[watch] = path
+        self.watches[path] = watch
+
+    def remove_watch(self, path):
+        watch = self.watches.pop(path, None)
+        if watch is not None:
+            self.paths.pop(watch, None)
+            self.libc.inotify_rm_watch(self.fd, watch)
+
+    def read_changed_folders(self, timeout):
+        """Waits up to timeout seconds for events. Returns (set of changed folder paths, whether events were lost)."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set(), False
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return set(), False
+
+        changed_folders = set()
+        overflowed = False
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size + name_length
+            if mask & self.IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            path = self.paths.get(watch)
+            if path is None:
+                continue
+            if mask & self.IN_IGNORED:
+                # The kernel dropped the watch (folder deleted or unmounted)
+                del self.paths[watch]
+                if self.watches.get(path) == watch:
+                    del self.watches[path]
+                continue
+            changed_folders.add(path)
+        return changed_folders, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Keeps a FileIndex current while its folder is open and reports what changed.
+
+    On Linux, inotify tells which folders had entries created, deleted or renamed. Elsewhere (or
+    when the inotify watch limit is reached) folder mtimes are polled every WATCH_POLL_INTERVAL
+    seconds instead. Changed folders are collected in a set and re-listed once events have been
+    quiet for WATCH_DEBOUNCE seconds (or WATCH_MAX_DELAY has passed), so a burst of writes costs
+    one re-listing per folder. on_changes(added_paths, removed_paths) is called on the watcher thread.
+    """
+
+    def __init__(self, file_index, on_changes, use_inotify=WATCH_USE_INOTIFY):
+        self.file_index = file_index
+        self.on_changes = on_changes
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.inotify = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        try:
+            pending_folders = set()
+            if self.use_inotify:
+                self._start_inotify()
+            if self.inotify:
+                # Catch anything that changed between indexing and the watches being added
+                pending_folders.update(self.file_index.changed_directories())
+            first_event_time = last_event_time = time.monotonic()
+
+            while not self.stop_event.is_set() and not self.file_index.is_closed:
+                if self.inotify:
+                    changed_folders, overflowed = self.inotify.read_changed_folders(WATCH_DEBOUNCE)
+                    if overflowed:
+                        logging.info(f"inotify queue overflowed for '{self.file_index.root_folder}'; checking mtimes.")
+                        changed_folders.update(self.file_index.changed_directories())
+                else:
+                    if self.stop_event.wait(WATCH_POLL_INTERVAL):
+                        break
+                    changed_folders = self.file_index.changed_directories()
+
+                now = time.monotonic()
+                if changed_folders:
+                    if not pending_folders:
+                        first_event_time = now
+                    pending_folders.update(changed_folders)
+                    last_event_time = now
+                if pending_folders and (not self.inotify or now - last_event_time >= WATCH_DEBOUNCE
+                                        or now - first_event_time >= WATCH_MAX_DELAY):
+                    self._apply_changes(pending_folders)
+                    pending_folders = set()
+        except Exception as e:
+            logging.error(f"Folder watcher for '{self.file_index.root_folder}' stopped: {e}")
+        finally:
+            if self.inotify:
+                self.inotify.close()
+
+    def _start_inotify(self):
+        """Watches every indexed folder, or falls back to polling if inotify can't be used."""
+        try:
+            self.inotify = Inotify()
+            for dirpath, _ in self.file_index.iter_directories():
+                self._add_watch(dirpath)
+            logging.info(f"Watching '{self.file_index.root_folder}' with inotify ({len(self.inotify.watches)} folders).")
+        except OSError as e:
+            logging.info(f"Can't watch '{self.file_index.root_folder}' with inotify ({e}); polling instead.")
+            if self.inotify:
+                self.inotify.close()
+                self.inotify = None
+
+    def _add_watch(self, dirpath):
+        try:
+            self.inotify.add_watch(dirpath)
+        except OSError as e:
+            if e.errno in (errno.ENOSPC, errno.EMFILE):
+                raise  # Watch limit reached (fs.inotify.max_user_watches)
+            logging.info(f"Not watching '{dirpath}': {e}")
+
+    def _apply_changes(self, changed_folders):
+        """Re-lists the changed folders and reports the files that appeared or disappeared."""
+        added_paths, removed_paths = [], []
+        while changed_folders and not self.file_index.is_closed:
+            added, removed, added_dirs, removed_dirs = self.file_index.refresh_directories(changed_folders)
+            added_paths.extend(added)
+            removed_paths.extend(removed)
+            changed_folders = []
+            if self.inotify:
+                for dirpath in removed_dirs:
+                    self.inotify.remove_watch(dirpath)
+                try:
+                    for dirpath in added_dirs:
+                        self._add_watch(dirpath)
+                except OSError as e:
+                    logging.info(f"inotify watch limit reached ({e}); polling '{self.file_index.root_folder}' instead.")
+                    self.inotify.close()
+                    self.inotify = None
+                # New folders may have gained entries before their watch existed, so list them once more
+                changed_folders = added_dirs
+
+        if added_paths or removed_paths:
+            # A file renamed and renamed back within one burst shows up on both sides; report the net change
+            added_set, removed_set = set(added_paths), set(removed_paths)
+            added_paths = [path for path in added_paths if path not in removed_set]
+            removed_paths = [path for path in removed_paths if path not in added_set]
+            logging.info(f"Folder watcher: {len(added_paths)} file(s) added, {len(removed_paths)} removed.")
+            if added_paths or removed_paths:
+                self.on_changes(added_paths, removed_paths)
+
+
+# === END FILESYSTEM WATCHER ==============================================
+
+
+# === ORGANIZE ENGINE =====================================================
+class OrganizeEngine:
+    """Copies or moves a batch of files into one destination folder on a bounded worker pool.
+
+    Moves within one device are a plain os.rename. Everything else is copied with the kernel's
+    copy_file_range (or sendfile) where available, falling back to shutil. Conflicting names
+    are resolved against an in-memory set of destination names rather than repeated stat calls.
+
+    With restoring=True (used by undo) destinations may be spread over many folders: missing
+    parent folders are re-created and existing files are never overwritten.
+    """
+
+    def __init__(self, action_type, destination_folder=None, workers=ORGANIZE_WORKERS, restoring=False):
+        self.action_type = action_type  # "Copy" or "Move"
+        self.destination_folder = destination_folder
+        self.workers = max(1, workers)
+        self.restoring = restoring
+        self.device_by_folder = {}  # Destination folder -> st_dev, so each folder is stat'ed once
+        self.device_lock = threading.Lock()
+
+    def plan(self, source_paths):
+        """Returns a list of (source path, destination path, size in bytes) with conflicts renamed.
+
+        Duplicate names get ' (1)', ' (2)', ... before the extension, e.g. 'report (1).pdf'.
+        """
+        taken_names = {os.path.normcase(name) for name in os.listdir(self.destination_folder)}
+
+        destinations = []
+        for source_path in source_paths:
+            filename = os.path.basename(source_path)
+            candidate = filename
+            if os.path.normcase(candidate) in taken_names:
+                base, ext = os.path.splitext(filename)
+                i = 1
+                while os.path.normcase(candidate) in taken_names:
+                    candidate = f"{base} ({i}){ext}"
+                    i += 1
+            taken_names.add(os.path.normcase(candidate))
+            destinations.append(os.path.join(self.destination_folder, candidate))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            sizes = list(executor.map(self._size_or_zero, source_paths, chunksize=64))
+        return list(zip(source_paths, destinations, sizes))
+
+    def run(self, plan, cancel_event=None, on_progress=None, on_file_done=None):
+        """Executes a plan. Returns (processed count, list of (source path, error message)).
+
+        on_progress(files_done, files_total, bytes_done, bytes_total) is called at most every
+        ORGANIZE_PROGRESS_INTERVAL seconds, and once more at the end. on_file_done(position in
+        plan, error message or None) is called from the worker threads after every file.
+        """
+        files_total = len(plan)
+        bytes_total = sum(size for _, _, size in plan)
+        lock = threading.Lock()
+        progress = {"files": 0, "bytes": 0, "processed": 0, "last_report": 0.0}
+        errors = []
+
+        def process(position):
+            source_path, destination_path, size = plan[position]
+            if cancel_event and cancel_event.is_set():
+                return
+            try:
+                self.transfer_file(source_path, destination_path)
+                succeeded = True
+                if on_file_done:
+                    on_file_done(position, None)
+            except OSError as e:
+                succeeded = False
+                logging.error(f"Error organizing '{source_path}': {e}")
+                with lock:
+                    errors.append((source_path, str(e)))
+                if on_file_done:
+                    on_file_done(position, str(e))
+
+            with lock:
+                progress["files"] += 1
+                progress["bytes"] += size
+                progress["processed"] += succeeded
+                now = time.monotonic()
+                if on_progress and now - progress["last_report"] >= ORGANIZE_PROGRESS_INTERVAL:
+                    progress["last_report"] = now
+                    on_progress(progress["files"], files_total, progress["bytes"], bytes_total)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(process, range(len(plan))))
+        elapsed = time.perf_counter() - start
+
+        metrics.record_time("organize", elapsed)
+        metrics.increment("organize_files", progress["processed"])
+        metrics.increment("organize_errors", len(errors))
+        metrics.increment("organize_bytes", progress["bytes"])
+        if elapsed > 0:
+            metrics.set_gauge("organize_bytes_per_second", round(progress["bytes"] / elapsed))
+
+        if on_progress:
+            on_progress(progress["files"], files_total, progress["bytes"], bytes_total)
+        return progress["processed"], errors
+
+    def transfer_file(self, source_path, destination_path):
+        """Copies or moves one file, using a rename when the move stays on the same device."""
+        if self.restoring:
+            if os.path.lexists(destination_path):
+                raise FileExistsError(f"'{destination_path}' already exists; not overwriting it")
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+
+        if self.action_type == "Move" and os.stat(source_path).st_dev == self._device_of(destination_path):
+            os.rename(source_path, destination_path)
+            return
+
+        fast_copy_file(source_path, destination_path)
+        shutil.copystat(source_path, destination_path)
+        if self.action_type == "Move":
+            os.remove(source_path)
+
+    def _device_of(self, destination_path):
+        folder = os.path.dirname(destination_path)
+        with self.device_lock:
+            device = self.device_by_folder.get(folder)
+        if device is None:
+            device = os.stat(folder).st_dev
+            with self.device_lock:
+                self.device_by_folder[folder] = device
+        return device
+
+    @staticmethod
+    def _size_or_zero(path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+
+def fast_copy_file(source_path, destination_path):
+    """Copies file contents in the kernel with copy_file_range or sendfile, falling back to shutil."""
+    copy_function = getattr(os, "copy_file_range", None)
+    if copy_function is None and sys.platform.startswith("linux"):
+        copy_function = os.sendfile  # File-to-file sendfile is Linux-only
+    if copy_function is None:
+        shutil.copyfile(source_path, destination_path)
+        return
+
+    with open(source_path, "rb") as source, open(destination_path, "xb") as destination:
+        source_fd, destination_fd = source.fileno(), destination.fileno()
+        try:
+            if copy_function is os.sendfile:
+                offset = 0
+                while True:
+                    sent = os.sendfile(destination_fd, source_fd, offset, COPY_CHUNK_SIZE)
+                    if sent == 0:
+                        break
+                    offset += sent
+            else:
+                while os.copy_file_range(source_fd, destination_fd, COPY_CHUNK_SIZE) > 0:
+                    pass
+        except OSError:
+            # e.g. a filesystem that rejects copy_file_range; restart with a plain buffered copy
+            destination.seek(0)
+            destination.truncate()
+            source.seek(0)
+            shutil.copyfileobj(source, destination, COPY_CHUNK_SIZE)
+
+
+def format_bytes(byte_count):
+    """Formats a byte count as a short human-readable string, e.g. '1.5 GB'."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if byte_count < 1024:
+            return f"{byte_count:.0f} {unit}" if unit == "B" else f"{byte_count:.1f} {unit}"
+        byte_count /= 1024
+    return f"{byte_count:.1f} TB"
+
+
+def format_duration(seconds):
+    """Formats a duration as e.g. '45s', '3m 05s' or '1h 02m'."""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+# === END ORGANIZE ENGINE =================================================
+
+
+# === RULES ENGINE ========================================================
+# A rule file sorts a whole folder in one pass. Each line is `query -> destination template`;
+# the query uses the search query language (case-insensitive) and the first matching rule
+# wins. Templates are folders relative to the organized root and may use {ext}, {year},
+# {month}, {day} (from the file's modification time) and {folder} (its current folder's name).
+DEFAULT_RULES_TEXT = """# Orderly rules: one `query -> destination folder` per line, first match wins.
+# Queries use the search syntax (ext:, size:, modified:, name:/regex/, AND, OR, NOT).
+# Destinations are relative to the organized folder and may use {ext} {year} {month} {day} {folder}.
+ext:jpg,jpeg,png,gif,heic,webp      -> Pictures/{year}
+ext:mp4,mov,avi,mkv                 -> Videos/{year}
+ext:mp3,wav,flac,m4a                -> Music
+ext:pdf,doc,docx,txt,rtf,odt        -> Documents/{ext}
+ext:xls,xlsx,csv,ods                -> Spreadsheets
+ext:zip,rar,7z,tar,gz               -> Archives
+ext:exe,msi                         -> Installers
+"""
+RULE_TEMPLATE_FIELDS = ("ext", "year", "month", "day", "folder")
+RULE_STAT_FIELDS = ("year", "month", "day")
+
+
+class OrganizeRule:
+    """One line of a rule file: a compiled query and the destination folder template for its matches."""
+
+    def __init__(self, query_text, template, line_number=0):
+        self.query_text = query_text
+        self.template = template
+        self.line_number = line_number
+        self.query = compile_query(query_text, SearchOptions(mode="Keyword", case_sensitive=False))
+        self.template_parts = [part for part in template.replace("\\", "/").split("/") if part not in ("", ".")]
+        if not self.template_parts or os.path.isabs(template) or ".." in self.template_parts:
+            raise ValueError(f"'{template}' must be a folder path inside the organized folder")
+        fields = set()
+        for part in self.template_parts:
+            fields.update(parse_template_fields(part, template))
+        self.needs_stat = bool(fields & set(RULE_STAT_FIELDS))
+
+    def __repr__(self):
+        return f"OrganizeRule({self.query_text!r} -> {self.template!r})"
+
+    def destination_folder(self, root, source_folder, filename, file_stat):
+        """Fills in the template for one file and returns the absolute destination folder."""
+        values = {"ext": os.path.splitext(filename)[1].lstrip(".").lower() or "no extension",
+                  "folder": os.path.basename(source_folder) or "root"}
+        if self.needs_stat:
+            modified = time.localtime(file_stat.st_mtime)
+            values.update(year=f"{modified.tm_year:04d}", month=f"{modified.tm_mon:02d}",
+                          day=f"{modified.tm_mday:02d}")
+        return os.path.join(root, *(part.format(**values) for part in self.template_parts))
+
+
+def parse_template_fields(part, template):
+    """Returns the {field} names in one folder of a destination template, raising ValueError if it can't be filled.
+
+    Only plain {field} placeholders from RULE_TEMPLATE_FIELDS are allowed; use {{ and }} for literal braces.
+    """
+    allowed = ", ".join("{" + field + "}" for field in RULE_TEMPLATE_FIELDS)
+    try:
+        parsed = list(string.Formatter().parse(part))
+    except ValueError:
+        raise ValueError(f"unbalanced braces in '{template}' (use {allowed}; {{{{ and }}}} for literal braces)")
+    fields = []
+    for _, field, format_spec, conversion in parsed:
+        if field is None:
+            continue
+        if field not in RULE_TEMPLATE_FIELDS:
+            raise ValueError(f"unknown field {{{field}}} in '{template}' (use {allowed})")
+        if format_spec or conversion:
+            raise ValueError(f"{{{field}}} in '{template}' can't have a conversion or format spec")
+        fields.append(field)
+    return fields
+
+
+def load_rules(path=None):
+    """Reads a rule file (RULES_PATH by default) into a list of OrganizeRules.
+
+    Blank lines and lines starting with # are ignored. Raises ValueError naming the bad line.
+    """
+    path = path or RULES_PATH
+    rules = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            query_text, separator, template = line.rpartition("->")
+            if not separator or not query_text.strip() or not template.strip():
+                raise ValueError(f"line {line_number}: expected `query -> destination folder`")
+            try:
+                rules.append(OrganizeRule(query_text.strip(), template.strip(), line_number))
+            except ValueError as e:
+                raise ValueError(f"line {line_number}: {e}")
+    if not rules:
+        raise ValueError(f"'{path}' has no rules")
+    return rules
+
+
+def ensure_rules_file(path=None):
+    """Creates the rule file with DEFAULT_RULES_TEXT if it doesn't exist yet. Returns its path."""
+    path = path or RULES_PATH
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(DEFAULT_RULES_TEXT)
+    return path
+
+
+class RulesEngine:
+    """Plans where every file under a root goes, for any number of rules, in one pass over its index.
+
+    Each file is dispatched to the first rule whose query matches. Name tests decide most files;
+    the rest (and files whose template needs a date) are stat-ed once, from a single scandir of
+    their folder. Files already in their rule's destination folder are left alone, so running
+    the same rules again only moves what is new.
+    """
+
+    NEEDS_STAT = -1
+
+    def __init__(self, file_index, rules, destination_root=None):
+        self.file_index = file_index
+        self.rules = rules
+        self.destination_root = os.path.normpath(destination_root or file_index.root_folder)
+        self.any_query_needs_stat = any(rule.query.needs_stat for rule in rules)
+
+    def plan(self, cancel_event=None, on_progress=None):
+        """Returns (plan, per-rule file counts). The plan is a list of (source, destination, size), as
+        OrganizeEngine.run expects, with name conflicts renamed like OrganizeEngine.plan does.
+
+        on_progress(files_examined, files_planned) is called every SEARCH_BATCH_INTERVAL seconds.
+        """
+        plan = []
+        rule_counts = [0] * len(self.rules)
+        taken_names = {}  # Destination folder -> normcased names already there or planned
+        files_examined = 0
+        last_report = time.monotonic()
+
+        def add(source_folder, filename, rule_index, file_stat):
+            rule = self.rules[rule_index]
+            folder = rule.destination_folder(self.destination_root, source_folder, filename, file_stat)
+            if os.path.normcase(folder) == os.path.normcase(source_folder):
+                return  # Already where this rule puts it
+            names = taken_names.get(folder)
+            if names is None:
+                try:
+                    names = {os.path.normcase(name) for name in os.listdir(folder)}
+                except OSError:
+                    names = set()
+                taken_names[folder] = names
+            candidate = filename
+            base, ext = os.path.splitext(filename)
+            i = 1
+            while os.path.normcase(candidate) in names:
+                candidate = f"{base} ({i}){ext}"
+                i += 1
+            names.add(os.path.normcase(candidate))
+            size = file_stat.st_size if file_stat else None
+            plan.append((os.path.join(source_folder, filename), os.path.join(folder, candidate), size))
+            rule_counts[rule_index] += 1
+
+        with metrics.timer("rules_plan"):
+            self.file_index.refresh(cancel_event)
+            for folder, filenames in self.file_index.iter_directories():
+                if cancel_event and cancel_event.is_set():
+                    break
+                undecided = []
+                for filename in filenames:
+                    rule_index = self._dispatch(filename, None)
+                    if rule_index == self.NEEDS_STAT:
+                        undecided.append(filename)
+                    elif rule_index is not None:
+                        add(folder, filename, rule_index, None)
+                if undecided:
+                    for filename, file_stat in stat_folder_entries(folder, undecided):
+                        rule_index = self._dispatch(filename, file_stat)
+                        if rule_index is not None:
+                            add(folder, filename, rule_index, file_stat)
+
+                files_examined += len(filenames)
+                if on_progress and time.monotonic() - last_report >= SEARCH_BATCH_INTERVAL:
+                    on_progress(files_examined, len(plan))
+                    last_report = time.monotonic()
+
+            # Sizes (for progress reporting) of files that were placed on their names alone
+            unsized = [position for position, (_, _, size) in enumerate(plan) if size is None]
+            if unsized:
+                with ThreadPoolExecutor(max_workers=ORGANIZE_WORKERS) as executor:
+                    sizes = executor.map(OrganizeEngine._size_or_zero, (plan[position][0] for position in unsized),
+                                         chunksize=64)
+                    for position, size in zip(unsized, sizes):
+                        plan[position] = plan[position][:2] + (size,)
+
+        if on_progress:
+            on_progress(files_examined, len(plan))
+        metrics.increment("rules_files_examined", files_examined)
+        metrics.increment("rules_files_planned", len(plan))
+        logging.info(f"Rules planned {len(plan)} of {files_examined} file(s) under '{self.file_index.root_folder}'.")
+        return plan, rule_counts
+
+    def _dispatch(self, filename, file_stat):
+        """Returns the index of the first matching rule, None if no rule matches, or NEEDS_STAT."""
+        for rule_index, rule in enumerate(self.rules):
+            decided = rule.query.test(filename, file_stat)
+            if decided is None:
+                return self.NEEDS_STAT
+            if decided:
+                if rule.needs_stat and file_stat is None:
+                    return self.NEEDS_STAT
+                return rule_index
+        return None
+
+
+def summarize_rules_plan(rules, plan, rule_counts, destination_root, sample_count=3):
+    """Returns a readable dry-run summary: files per rule, then per destination folder with a few examples."""
+    lines = [f"{len(plan):,} file(s) to organize into '{destination_root}':", ""]
+    for rule, count in zip(rules, rule_counts):
+        lines.append(f"[line {rule.line_number}] {rule.query_text} -> {rule.template}: {count:,} file(s)")
+    lines.append("")
+
+    sources_by_folder = {}
+    for source_path, destination_path, _ in plan:
+        sources_by_folder.setdefault(os.path.dirname(destination_path), []).append(source_path)
+    for folder, sources in sorted(sources_by_folder.items()):
+        lines.append(f"{os.path.relpath(folder, destination_root)}  ({len(sources):,} file(s))")
+        for source_path in sources[:sample_count]:
+            lines.append(f"    {os.path.relpath(source_path, destination_root)}")
+        if len(sources) > sample_count:
+            lines.append(f"    ... and {len(sources) - sample_count:,} more")
+    return "\n".join(lines)
+
+
+# === END RULES ENGINE ====================================================
+
+
+# === ORGANIZE JOURNAL ====================================================
+class OrganizeJournal:
+    """Append-only write-ahead journal for one organize job, used to resume and undo it.
+
+    One compact JSON array per line:
+        ["J", job_id, action, destination]   header
+        ["P", source, destination, size]     planned file (its position is the file's index)
+        ["PE"]                               end of plan; nothing is touched before this is on disk
+        ["D", index] / ["E", index, error]   file done / failed
+        ["C"]                                job complete
+        ["U", index] / ["UC"]                file restored by undo / undo complete
+    Records are fsync'ed in batches (JOURNAL_FSYNC_BATCH / JOURNAL_FSYNC_INTERVAL), so after a
+    crash the last few "D" records may be missing; resume_organize_job() checks those files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.job_id = os.path.splitext(os.path.basename(path))[0]
+        self.action_type = None
+        self.destination_folder = None
+        self.entries = []  # (source path, destination path, size)
+        self.status = []  # Per entry: None (pending), "D" (done), "E" (failed) or "U" (undone)
+        self.is_planned = False
+        self.is_complete = False
+        self.is_undone = False
+        self.has_torn_end = False  # The last line was cut off by a crash mid-write
+
+        self.lock = threading.Lock()
+        self.file = None
+        self.unsynced_count = 0
+        self.last_sync_time = time.monotonic()
+
+    # --- Creating & Loading ---
+    @classmethod
+    def create(cls, action_type, destination_folder):
+        """Starts a new journal on disk and writes its header."""
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        cls.prune()
+        job_id = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 10 ** 9:09d}"  # Sorts chronologically
+        journal = cls(os.path.join(JOURNAL_DIR, f"{job_id}.journal"))
+        destination_folder = os.path.abspath(destination_folder)  # Resume/undo may run from another cwd
+        journal.action_type = action_type
+        journal.destination_folder = destination_folder
+        journal.file = open(journal.path, "a", encoding="utf-8")
+        journal._append(["J", journal.job_id, action_type, destination_folder], sync=True)
+        return journal
+
+    @classmethod
+    def load(cls, path, with_entries=True):
+        """Reads a journal from disk without modifying it. See open_for_append() to continue it.
+
+        Without with_entries, only the header and the plan/complete/undone flags are read.
+        """
+        journal = cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+
+        for line in lines:
+            if not with_entries and line.startswith(('["P",', '["D",', '["E",', '["U",')):
+                continue  # Per-file records, the bulk of a journal
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Blank or torn last line from a crash mid-write
+            kind = record[0]
+            if kind == "J":
+                journal.action_type, journal.destination_folder = record[2], record[3]
+            elif kind == "P":
+                journal.entries.append((record[1], record[2], record[3]))
+                journal.status.append(None)
+            elif kind == "PE":
+                journal.is_planned = True
+            elif kind in ("D", "E", "U"):
+                journal.status[record[1]] = kind
+            elif kind == "C":
+                journal.is_complete = True
+            elif kind == "UC":
+                journal.is_undone = True
+        journal.has_torn_end = bool(lines[-1])
+        return journal
+
+    def open_for_append(self):
+        """Re-opens a loaded journal so resume or undo can record their progress."""
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.has_torn_end:
+            self.file.write("\n")  # Terminate a torn last line so new records start cleanly
+            self.has_torn_end = False
+
+    @classmethod
+    def list_paths(cls):
+        """Returns all journal paths, newest first."""
+        if not os.path.isdir(JOURNAL_DIR):
+            return []
+        names = sorted((name for name in os.listdir(JOURNAL_DIR) if name.endswith(".journal")), reverse=True)
+        return [os.path.join(JOURNAL_DIR, name) for name in names]
+
+    @classmethod
+    def find_interrupted(cls, with_entries=True):
+        """Returns the newest job that was planned but never completed, or None. Only reads the journals."""
+        for path in cls.list_paths():
+            journal = cls.load(path, with_entries=False)
+            if journal.is_planned and not journal.is_complete:
+                return cls.load(path) if with_entries else journal
+        return None
+
+    @classmethod
+    def find_undoable(cls, with_entries=True):
+        """Returns the newest completed Move job if it has not been undone yet, or None. Only reads the journals."""
+        for path in cls.list_paths():
+            journal = cls.load(path, with_entries=False)
+            if journal.is_complete and journal.action_type == "Move":
+                if journal.is_undone:
+                    return None
+                return cls.load(path) if with_entries else journal
+        return None
+
+    @classmethod
+    def prune(cls):
+        """Deletes the oldest finished journals beyond JOURNAL_KEEP_COUNT."""
+        for path in cls.list_paths()[JOURNAL_KEEP_COUNT:]:
+            journal = cls.load(path, with_entries=False)
+            if journal.is_complete or not journal.is_planned:
+                os.remove(path)
+
+    # --- Writing ---
+    def write_plan(self, plan):
+        """Records every planned file and syncs before any file is touched."""
+        for source_path, destination_path, size in plan:
+            source_path, destination_path = os.path.abspath(source_path), os.path.abspath(destination_path)
+            self._append(["P", source_path, destination_path, size])
+            self.entries.append((source_path, destination_path, size))
+            self.status.append(None)
+        self._append(["PE"], sync=True)
+        self.is_planned = True
+
+    def record_result(self, index, error=None):
+        """Records that a planned file was processed (or failed)."""
+        self.status[index] = "E" if error else "D"
+        self._append(["E", index, error] if error else ["D", index])
+
+    def record_undone(self, index):
+        """Records that a moved file was put back by undo."""
+        self.status[index] = "U"
+        self._append(["U", index])
+
+    def mark_complete(self):
+        self.is_complete = True
+        self._append(["C"], sync=True)
+
+    def mark_undone(self):
+        self.is_undone = True
+        self._append(["UC"], sync=True)
+
+    def pending_indices(self):
+        """Returns the indexes of planned files that have no result recorded yet."""
+        return [i for i, status in enumerate(self.status) if status is None]
+
+    def close(self):
+        if self.file and not self.file.closed:
+            with self.lock:
+                self._sync()
+                self.file.close()
+
+    def _append(self, record, sync=False):
+        with self.lock:
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.unsynced_count += 1
+            if (sync or self.unsynced_count >= JOURNAL_FSYNC_BATCH
+                    or time.monotonic() - self.last_sync_time >= JOURNAL_FSYNC_INTERVAL):
+                self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced_count = 0
+        self.last_sync_time = time.monotonic()
+
+
+def run_organize_job(action_type, destination_folder, source_paths, cancel_event=None, on_progress=None):
+    """Plans, journals and runs an organize job. Returns (processed count, errors)."""
+    journal = OrganizeJournal.create(action_type, destination_folder)
+    try:
+        engine = OrganizeEngine(action_type, destination_folder)
+        plan = engine.plan(source_paths)
+        journal.write_plan(plan)
+        result = engine.run(plan, cancel_event=cancel_event, on_progress=on_progress,
+                            on_file_done=journal.record_result)
+        if not (cancel_event and cancel_event.is_set()):
+            journal.mark_complete()
+        return result
+    finally:
+        journal.close()
+
+
+def run_rules_job(action_type, destination_root, plan, cancel_event=None, on_progress=None):
+    """Journals and runs a RulesEngine plan, creating its destination folders. Returns (processed count, errors).
+
+    Resume and undo work on it like on any organize job.
+    """
+    journal = OrganizeJournal.create(action_type, destination_root)
+    try:
+        journal.write_plan(plan)
+        create_destination_folders(plan)
+        result = OrganizeEngine(action_type, destination_root).run(plan, cancel_event=cancel_event,
+                                                                   on_progress=on_progress,
+                                                                   on_file_done=journal.record_result)
+        if not (cancel_event and cancel_event.is_set()):
+            journal.mark_complete()
+        return result
+    finally:
+        journal.close()
+
+
+def create_destination_folders(plan):
+    for folder in {os.path.dirname(destination_path) for _, destination_path, _ in plan}:
+        os.makedirs(folder, exist_ok=True)
+
+
+def remove_empty_folders(folders, stop_folder):
+    """Removes the given folders, and then their parents up to stop_folder, while they are empty."""
+    inside_prefix = os.path.join(os.path.normcase(os.path.normpath(stop_folder)), "")
+    for folder in sorted(set(folders), key=len, reverse=True):
+        while os.path.normcase(folder).startswith(inside_prefix):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break  # Not empty (or already gone)
+            folder = os.path.dirname(folder)
+
+
+def resume_organize_job(journal, cancel_event=None, on_progress=None):
+    """Finishes an interrupted job from its journal. Returns (processed count, errors).
+
+    Files whose result never reached the journal are checked first: a Move whose source is gone
+    and whose destination exists had finished; any other leftover destination is a partial copy
+    and is removed before the file is processed again.
+    """
+    try:
+        journal.open_for_append()
+        remaining = []
+        for index in journal.pending_indices():
+            source_path, destination_path, _ = journal.entries[index]
+            if journal.action_type == "Move" and not os.path.lexists(source_path) \
+                    and os.path.lexists(destination_path):
+                journal.record_result(index)
+                continue
+            if os.path.lexists(destination_path):
+                os.remove(destination_path)
+            remaining.append(index)
+
+        logging.info(f"Resuming organize job {journal.job_id}: {len(remaining)} of {len(journal.entries)} "
+                     f"file(s) left.")
+        os.makedirs(journal.destination_folder, exist_ok=True)
+        engine = OrganizeEngine(journal.action_type, journal.destination_folder)
+        plan = [journal.entries[index] for index in remaining]
+        create_destination_folders(plan)  # Rules jobs spread files over many folders
+        result = engine.run(plan, cancel_event=cancel_event, on_progress=on_progress,
+                            on_file_done=lambda position, error: journal.record_result(remaining[position], error))
+        if not (cancel_event and cancel_event.is_set()):
+            journal.mark_complete()
+        return result
+    finally:
+        journal.close()
+
+
+def undo_organize_job(journal, cancel_event=None, on_progress=None):
+    """Moves every file of a completed Move job back where it came from. Returns (restored count, errors)."""
+    try:
+        journal.open_for_append()
+        moved = [index for index, status in enumerate(journal.status) if status == "D"]
+        plan = [(journal.entries[index][1], journal.entries[index][0], journal.entries[index][2]) for index in moved]
+        logging.info(f"Undoing organize job {journal.job_id}: restoring {len(plan)} file(s).")
+
+        def on_file_done(position, error):
+            if not error:
+                journal.record_undone(moved[position])
+
+        engine = OrganizeEngine("Move", workers=ORGANIZE_WORKERS, restoring=True)
+        result = engine.run(plan, cancel_event=cancel_event, on_progress=on_progress, on_file_done=on_file_done)
+        if not result[1] and not (cancel_event and cancel_event.is_set()):
+            # Left open on errors so undo can be retried once they are fixed; restored files are skipped
+            journal.mark_undone()
+            remove_empty_folders([os.path.dirname(organized_path) for organized_path, _, _ in plan],
+                                 journal.destination_folder)
+            try:
+                os.rmdir(journal.destination_folder)  # Only succeeds if the job's folder is now empty
+            except OSError:
+                pass
+        return result
+    finally:
+        journal.close()
+
+
+# === END ORGANIZE JOURNAL ================================================
+
+
+# === FILE ACTIONS ========================================================
+def trash_file(file_path):
+    """Moves a file to the Recycle Bin / Trash instead of deleting it permanently."""
+    from send2trash import send2trash
+
+    normalized_path = os.path.normpath(file_path)
+    send2trash(normalized_path)
+    logging.info(f"Successfully moved '{normalized_path}' to Recycle Bin.")
+
+
+def trash_files(file_paths, cancel_event=None, on_progress=None):
+    """Moves many files to the Recycle Bin / Trash. Returns (trashed paths, list of (path, error message)).
+
+    Files are sent TRASH_BATCH_SIZE at a time. If a batch fails, its files are retried one by
+    one so the error can be pinned on the right file. on_progress(files_done, files_total) is
+    called after every batch, and the remaining batches are skipped once cancel_event is set.
+    """
+    from send2trash import send2trash
+
+    trashed_paths = []
+    errors = []
+    file_paths = list(file_paths)
+    with metrics.timer("trash"):
+        for start in range(0, len(file_paths), TRASH_BATCH_SIZE):
+            if cancel_event and cancel_event.is_set():
+                break
+            batch = file_paths[start:start + TRASH_BATCH_SIZE]
+            try:
+                send2trash([os.path.normpath(file_path) for file_path in batch])
+                trashed_paths.extend(batch)
+            except Exception:
+                for file_path in batch:
+                    if not os.path.lexists(file_path):
+                        trashed_paths.append(file_path)  # Trashed before the batch failed
+                        continue
+                    try:
+                        send2trash(os.path.normpath(file_path))
+                        trashed_paths.append(file_path)
+                    except Exception as e:
+                        logging.error(f"Error moving '{file_path}' to Recycle Bin: {e}")
+                        errors.append((file_path, str(e)))
+            if on_progress:
+                on_progress(start + len(batch), len(file_paths))
+
+    metrics.increment("files_trashed", len(trashed_paths))
+    logging.info(f"Moved {len(trashed_paths)} file(s) to Recycle Bin; {len(errors)} failed.")
+    return trashed_paths, errors
+
+
+# === END FILE ACTIONS ====================================================
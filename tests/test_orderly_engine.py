@@ -0,0 +1,612 @@
+# === IMPORTS =============================================================
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orderly_engine
+from orderly_engine import (FileIndex, SearchEngine, MultiRootSearch, SearchOptions, ResultStore, QueryCache,
+                            DuplicateFinder, RulesEngine, OrganizeEngine, OrganizeJournal, IgnorePattern,
+                            PathFilter, ParallelWalker, compile_query, is_cacheable_query, query_refines, load_rules,
+                            run_organize_job, resume_organize_job, undo_organize_job)
+
+# === END IMPORTS =========================================================
+
+
+# === FIXTURES ============================================================
+@pytest.fixture(autouse=True)
+def app_data_dirs(tmp_path, monkeypatch):
+    """Keeps journals and indexes out of the real app data folder."""
+    monkeypatch.setattr(orderly_engine, "JOURNAL_DIR", str(tmp_path / "journals"))
+    monkeypatch.setattr(orderly_engine, "INDEX_DIR", str(tmp_path / "indexes"))
+    monkeypatch.setattr(orderly_engine, "HASH_CACHE_PATH", str(tmp_path / "hashes" / "file_hashes.sqlite"))
+
+
+def make_files(root, contents_by_path):
+    """Creates files (relative path -> text) under root and returns their absolute paths."""
+    paths = []
+    for rel_path, text in contents_by_path.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        paths.append(str(path))
+    return paths
+
+
+def snapshot_tree(root):
+    """Returns {relative file path: text} for every file under root."""
+    return {str(path.relative_to(root)): path.read_text() for path in root.rglob("*") if path.is_file()}
+
+
+def counter(name):
+    """Returns the current value of a metrics counter."""
+    return orderly_engine.metrics.snapshot()["counters"].get(name, 0)
+
+
+# === END FIXTURES ========================================================
+
+
+# === DUPLICATE FINDER ====================================================
+def test_duplicate_finder_narrows_by_size_then_hashes_and_reuses_cached_hashes(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    block = orderly_engine.DUPLICATE_PARTIAL_BLOCK
+    big = os.urandom(3 * block)
+    middle_changed = big[:block] + bytes(block) + big[2 * block:]
+    contents = {"big_a.bin": big, "big_b.bin": big, "big_c.bin": middle_changed,  # Same ends, found by a full hash
+                "big_d.bin": b"x" + big[1:], "small_x.txt": b"hello", "small_y.txt": b"hello",
+                "small_z.txt": b"world", "unique.txt": b"only one of this size", "empty1": b"", "empty2": b""}
+    for offset, (name, data) in enumerate(contents.items()):
+        (root / name).write_bytes(data)
+        os.utime(root / name, (1_000_000 + offset, 1_000_000 + offset))  # big_a is the oldest copy
+    os.link(root / "big_a.bin", root / "big_a_link.bin")  # A hard link frees no space, so it is not a duplicate
+    file_index = FileIndex(str(root))
+    file_index.refresh()
+    hashed_before = {stage: counter(f"duplicate_files_hashed_{stage}") for stage in ("partial", "full")}
+
+    def names(groups):  # Either name of the hard-linked file may be the one reported
+        return [(size, [os.path.basename(path).replace("_link", "") for path in paths]) for size, paths in groups]
+
+    groups = DuplicateFinder(file_index, workers=2).find()
+
+    # Most wasted space first, oldest copy first
+    assert names(groups) == [(3 * block, ["big_a.bin", "big_b.bin"]), (5, ["small_x.txt", "small_y.txt"])]
+    # Only same-size files are hashed; only files whose ends still collide are hashed in full
+    assert counter("duplicate_files_hashed_partial") - hashed_before["partial"] == 7
+    assert counter("duplicate_files_hashed_full") - hashed_before["full"] == 3
+
+    hits_before = counter("hash_cache_hits")
+    assert names(DuplicateFinder(file_index, workers=2).find()) == names(groups)
+    assert counter("hash_cache_hits") - hits_before == 10
+    assert counter("duplicate_files_hashed_partial") - hashed_before["partial"] == 7
+    file_index.close()
+
+
+# === END DUPLICATE FINDER ================================================
+
+
+# === RULES ENGINE ========================================================
+def test_rules_engine_plans_first_matching_rule_per_file(tmp_path):
+    root = tmp_path / "root"
+    make_files(root, {"inbox/holiday.jpg": "", "inbox/report.pdf": "", "inbox/big_report.pdf": "x" * 2048,
+                      "inbox/notes.md": "", "Documents/pdf/report.pdf": "already there",
+                      "Documents/pdf/sorted.pdf": ""})
+    march_2021 = time.mktime((2021, 3, 15, 12, 0, 0, 0, 0, -1))
+    os.utime(root / "inbox" / "holiday.jpg", (march_2021, march_2021))
+    rules_path = tmp_path / "rules.txt"
+    rules_path.write_text("# comment\n\n"
+                          "ext:pdf size:>1KB -> Large/{folder}\n"
+                          "ext:pdf           -> Documents/{ext}\n"
+                          "ext:jpg           -> Pictures/{year}/{month}\n")
+    rules = load_rules(str(rules_path))
+    file_index = FileIndex(str(root))
+
+    plan, rule_counts = RulesEngine(file_index, rules).plan()
+
+    def rel(path):
+        return os.path.relpath(path, root).replace(os.sep, "/")
+
+    planned = {rel(source): rel(destination) for source, destination, _ in plan}
+    assert planned == {
+        "inbox/big_report.pdf": "Large/inbox/big_report.pdf",  # First matching rule wins
+        "inbox/report.pdf": "Documents/pdf/report (1).pdf",  # Renamed around the file already there
+        "inbox/holiday.jpg": "Pictures/2021/03/holiday.jpg",
+    }  # notes.md matches no rule; Documents/pdf/*.pdf are already where their rule puts them
+    assert rule_counts == [1, 1, 1]
+    assert all(size is not None for _, _, size in plan)
+    file_index.close()
+
+
+@pytest.mark.parametrize("rule_line, message", [
+    ("ext:pdf -> Docs/{yeer}", "line 2: unknown field {yeer}"),
+    ("ext:pdf -> Docs/{year", "line 2: unbalanced braces"),
+    ("ext:pdf -> Docs/{year!r}", "line 2: {year} in 'Docs/{year!r}' can't have a conversion or format spec"),
+    ("ext:pdf -> Docs/{0}", "line 2: unknown field {0}"),
+    ("ext:pdf -> ../Outside", "line 2: '../Outside' must be a folder path inside the organized folder"),
+    ("ext:pdf Documents", "line 2: expected `query -> destination folder`"),
+    ("size:> -> Docs", "line 2: missing value in 'size:>'"),
+])
+def test_rule_file_errors_name_the_line(tmp_path, rule_line, message):
+    rules_path = tmp_path / "rules.txt"
+    rules_path.write_text(f"ext:jpg -> Pictures/{{{{raw}}}}\n{rule_line}\n")
+    with pytest.raises(ValueError) as excinfo:
+        load_rules(str(rules_path))
+    assert message in str(excinfo.value)
+
+
+# === END RULES ENGINE ====================================================
+
+
+# === ORGANIZE JOURNAL ====================================================
+def test_resume_finishes_interrupted_move(tmp_path):
+    source_paths = make_files(tmp_path / "docs", {"a.txt": "A", "b.txt": "B", "c.txt": "C"})
+    destination = tmp_path / "Sorted"
+    destination.mkdir()
+    plan = OrganizeEngine("Move", str(destination)).plan(source_paths)
+    journal = OrganizeJournal.create("Move", str(destination))
+    journal.write_plan(plan)
+    # Crash after: a.txt moved and journaled, b.txt moved but not journaled, c.txt half copied
+    os.rename(plan[0][0], plan[0][1])
+    journal.record_result(0)
+    os.rename(plan[1][0], plan[1][1])
+    with open(plan[2][1], "w") as f:
+        f.write("partial")
+    journal.close()
+
+    interrupted = OrganizeJournal.find_interrupted()
+    assert interrupted is not None and interrupted.job_id == journal.job_id
+    processed_count, errors = resume_organize_job(interrupted)
+
+    assert errors == []
+    assert snapshot_tree(destination) == {"a.txt": "A", "b.txt": "B", "c.txt": "C"}
+    assert snapshot_tree(tmp_path / "docs") == {}
+    assert OrganizeJournal.find_interrupted() is None
+    assert OrganizeJournal.find_undoable().job_id == journal.job_id
+
+
+def test_undo_restores_original_tree(tmp_path):
+    tree = {"reports/q1.txt": "1", "reports/2024/q2.txt": "2", "notes/q3.txt": "3", "notes/keep.md": "x"}
+    make_files(tmp_path / "root", tree)
+    source_paths = [str(tmp_path / "root" / rel_path) for rel_path in tree if rel_path.endswith(".txt")]
+    destination = tmp_path / "root" / "Quarterly"
+    destination.mkdir()
+
+    processed_count, errors = run_organize_job("Move", str(destination), source_paths)
+    assert (processed_count, errors) == (3, [])
+    assert sorted(os.listdir(destination)) == ["q1.txt", "q2.txt", "q3.txt"]
+
+    processed_count, errors = undo_organize_job(OrganizeJournal.find_undoable())
+
+    assert (processed_count, errors) == (3, [])
+    assert snapshot_tree(tmp_path / "root") == {os.path.normpath(rel_path): text for rel_path, text in tree.items()}
+    assert not destination.exists()
+    assert OrganizeJournal.find_undoable() is None
+
+
+def test_journal_paths_are_absolute(tmp_path, monkeypatch):
+    make_files(tmp_path, {"docs/report.txt": "R"})
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("docs", "Reports"))
+    run_organize_job("Move", os.path.join("docs", "Reports"), [os.path.join("docs", "report.txt")])
+
+    journal = OrganizeJournal.find_undoable()
+    journal.close()
+    assert os.path.isabs(journal.destination_folder)
+    assert all(os.path.isabs(source) and os.path.isabs(destination) for source, destination, _ in journal.entries)
+
+
+
+def test_finding_journals_does_not_modify_them(tmp_path):
+    source_paths = make_files(tmp_path / "docs", {"a.txt": "A", "b.txt": "B"})
+    destination = tmp_path / "Sorted"
+    destination.mkdir()
+    journal = OrganizeJournal.create("Move", str(destination))
+    journal.write_plan(OrganizeEngine("Move", str(destination)).plan(source_paths))
+    journal.close()
+    with open(journal.path, "a") as f:
+        f.write('["D",')  # Torn by a crash mid-write
+    with open(journal.path, "rb") as f:
+        before = f.read()
+
+    assert OrganizeJournal.find_interrupted(with_entries=False).job_id == journal.job_id
+    interrupted = OrganizeJournal.find_interrupted()
+    assert OrganizeJournal.find_undoable() is None
+    with open(journal.path, "rb") as f:
+        assert f.read() == before
+    assert (interrupted.file, len(interrupted.entries), interrupted.pending_indices()) == (None, 2, [0, 1])
+
+    assert resume_organize_job(interrupted) == (2, [])
+    assert OrganizeJournal.find_undoable().job_id == journal.job_id  # Resume started on a fresh line
+
+# === END ORGANIZE JOURNAL ================================================
+
+
+# === QUERY LANGUAGE ======================================================
+def matches(keyword, filename, case_sensitive=False):
+    options = SearchOptions(mode="Keyword", case_sensitive=case_sensitive)
+    return compile_query(keyword, options).match_name(filename)
+
+
+@pytest.mark.parametrize("keyword, filename, expected", [
+    ("alpha OR beta gamma", "alpha.txt", True),  # AND binds tighter than OR
+    ("alpha OR beta gamma", "beta.txt", False),
+    ("alpha OR beta gamma", "beta_gamma.txt", True),
+    ("(alpha OR beta) gamma", "alpha.txt", False),
+    ("(alpha OR beta) gamma", "alpha_gamma.txt", True),
+    ("NOT alpha beta", "beta.txt", True),  # NOT applies to the next term only
+    ("NOT alpha beta", "alpha_beta.txt", False),
+    ("NOT (alpha OR beta)", "gamma.txt", True),
+    ("report ext:pdf,docx", "report.DOCX", True),
+    ("report ext:pdf,docx", "report.txt", False),
+    ('"annual report" OR x*.csv', "the annual report.pdf", True),
+    ('"annual report" OR x*.csv', "x1.csv.bak", False),  # A glob matches the whole filename
+    ("name:/^inv\\d+/", "inv42.pdf", True),
+    ("name:/^inv\\d+/", "old_inv42.pdf", False),
+    ("report (1)", "report (1).pdf", True),  # Parentheses alone are matched literally
+    ("report (1)", "report 12.pdf", False),
+])
+def test_query_precedence(keyword, filename, expected):
+    assert matches(keyword, filename) is expected
+
+
+def test_query_stat_terms(tmp_path):
+    small, large = make_files(tmp_path, {"small.pdf": "x", "large.pdf": "x" * 4096})
+    query = compile_query("ext:pdf size:>1KB", SearchOptions(mode="Keyword"))
+    assert query.needs_stat
+    assert query.test("notes.txt", None) is False  # Decided by name, no stat needed
+    assert query.test("large.pdf", None) is None
+    assert [query.matches_path(path) for path in (small, large)] == [False, True]
+
+
+
+def test_modified_date_operators_are_complements(tmp_path):
+    day_start = time.mktime(time.strptime("2024-01-31", "%Y-%m-%d"))
+    next_day = time.mktime(time.strptime("2024-02-01", "%Y-%m-%d"))
+    paths = make_files(tmp_path, {"last_second.txt": "", "midnight.txt": "", "first_second.txt": ""})
+    for path, mtime in zip(paths, (day_start - 1, next_day, day_start)):
+        os.utime(path, (mtime, mtime))
+
+    def matching(keyword):
+        query = compile_query(keyword, SearchOptions(mode="Keyword"))
+        return {os.path.basename(path) for path in paths if query.matches_path(path)}
+
+    assert matching("modified:>2024-01-31") == {"midnight.txt"}  # Stamped 00:00:00 the next day
+    assert matching("modified:<=2024-01-31") == {"last_second.txt", "first_second.txt"}
+    assert matching("modified:>=2024-01-31") == {"midnight.txt", "first_second.txt"}
+    assert matching("modified:<2024-01-31") == {"last_second.txt"}
+    assert matching("modified:=2024-01-31") == {"first_second.txt"}
+
+@pytest.mark.parametrize("keyword, message", [
+    ("(alpha OR beta", "missing ')'"),
+    ("alpha OR beta)", "unexpected ')'"),
+    ("OR alpha", "missing search term"),
+    ("alpha AND NOT ", "NOT needs a term after it"),
+    ("size:>", "missing value in 'size:>'"),
+    ("size:>10XB", "'10XB' is not a size"),
+    ("modified:<3q", "'3q' is not an age"),
+    ("ext:,", "no extension in 'ext:,'"),
+    ("name:/(/", "bad regular expression"),
+])
+def test_query_errors(keyword, message):
+    with pytest.raises(ValueError) as excinfo:
+        compile_query(keyword, SearchOptions(mode="Keyword"))
+    assert message in str(excinfo.value)
+
+
+# === END QUERY LANGUAGE ==================================================
+
+
+# === IGNORE PATTERNS =====================================================
+@pytest.mark.parametrize("pattern, rel_path, is_dir, expected", [
+    ("/build/", "build", True, True),  # A leading / anchors to the root
+    ("/build/", "docs/build", True, False),
+    ("build/", "docs/build", True, True),  # Without a / inside, any level
+    ("build/", "build", False, False),  # A trailing / only matches folders
+    ("doc/*.md", "doc/x.md", False, True),  # A / inside anchors too
+    ("doc/*.md", "sub/doc/x.md", False, False),
+    ("doc/*.md", "doc/x/y.md", False, False),  # * stops at /
+    ("**/cache", "a/b/cache", True, True),
+    ("a/**/b", "a/b", True, True),
+    ("a/**/b", "a/x/y/b", True, True),
+    ("[!ab].log", "c.log", False, True),
+    ("\\#notes", "#notes", False, True),
+])
+def test_ignore_pattern_anchoring(pattern, rel_path, is_dir, expected):
+    assert IgnorePattern(pattern).matches(rel_path, rel_path.rsplit("/", 1)[-1], is_dir) is expected
+
+
+def test_orderlyignore_negation_and_pruning(tmp_path):
+    make_files(tmp_path, {
+        ".orderlyignore": "# generated\n/build/\n*.log\n!keep.log\n!node_modules/\n",
+        "src/app.py": "", "src/debug.log": "", "logs/keep.log": "",
+        "build/out.o": "", "docs/build/guide.md": "",
+        "web/node_modules/pkg/index.js": "", ".git/config": "", "src/__pycache__/app.pyc": "",
+    })
+    listed_folders = []
+    found = set()
+    for folder, _, files, _ in ParallelWalker(workers=2).walk(str(tmp_path)):
+        listed_folders.append(os.path.relpath(folder, tmp_path))
+        found.update(os.path.relpath(os.path.join(folder, name), tmp_path).replace(os.sep, "/") for name in files)
+
+    assert found == {".orderlyignore", "src/app.py", "logs/keep.log", "docs/build/guide.md",
+                     "web/node_modules/pkg/index.js"}  # A default exclude re-included with "!"
+    # Excluded folders are pruned, never listed
+    assert not {"build", ".git", os.path.join("src", "__pycache__")} & set(listed_folders)
+
+
+
+def test_windows_hidden_attribute_skips_folders(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    make_files(root, {"Hidden Stuff/sub/a.txt": "", "visible/b.txt": ""})
+    path_filter = PathFilter(str(root))
+    real_lstat = os.lstat
+
+    def lstat_with_attributes(path, *args, **kwargs):
+        real_lstat(path, *args, **kwargs)
+        hidden = os.path.basename(path) == "Hidden Stuff"
+        return types.SimpleNamespace(st_file_attributes=stat.FILE_ATTRIBUTE_HIDDEN if hidden else 0)
+
+    monkeypatch.setattr(os, "name", "nt")
+    monkeypatch.setattr(os, "lstat", lstat_with_attributes)
+    try:
+        skipped = [path_filter.skips_path(str(root / rel_dir)) for rel_dir in ("Hidden Stuff/sub", "visible", ".git")]
+    finally:
+        monkeypatch.undo()
+    assert skipped == [True, False, True]
+
+# === END IGNORE PATTERNS =================================================
+
+
+# === FILE INDEX ==========================================================
+def indexed_files(file_index):
+    """Returns the relative paths (with /) of every file in the index."""
+    return {os.path.relpath(os.path.join(folder, name), file_index.root_folder).replace(os.sep, "/")
+            for folder, names in file_index.iter_directories() for name in names}
+
+
+def bump_mtime(path):
+    """Moves a folder's mtime forward, so the change is seen on filesystems with coarse timestamps."""
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_refresh_picks_up_added_renamed_and_removed_folders(tmp_path):
+    root = tmp_path / "root"
+    make_files(root, {"keep/a.txt": "", "old/b.txt": "", "gone/sub/c.txt": ""})
+    file_index = FileIndex(str(root), walker=ParallelWalker(workers=2))
+    file_index.refresh()
+    assert indexed_files(file_index) == {"keep/a.txt", "old/b.txt", "gone/sub/c.txt"}
+
+    make_files(root, {"new/deep/d.txt": ""})
+    os.rename(root / "old", root / "renamed")
+    shutil.rmtree(root / "gone")
+    bump_mtime(root)
+    visited_before = orderly_engine.metrics.snapshot()["counters"].get("directories_visited", 0)
+
+    assert file_index.refresh() > 0
+    assert indexed_files(file_index) == {"keep/a.txt", "renamed/b.txt", "new/deep/d.txt"}
+    # Only the root and the new folders are listed again; "keep" is checked with one stat
+    assert orderly_engine.metrics.snapshot()["counters"]["directories_visited"] - visited_before == 4
+    assert file_index.refresh() == 0
+    file_index.close()
+
+    reopened = FileIndex(str(root))
+    reopened.refresh()
+    assert indexed_files(reopened) == {"keep/a.txt", "renamed/b.txt", "new/deep/d.txt"}
+    reopened.close()
+
+
+def test_edited_orderlyignore_forces_a_rebuild(tmp_path):
+    root = tmp_path / "root"
+    make_files(root, {"src/app.py": "", "src/debug.log": "", "build/out.o": ""})
+    file_index = FileIndex(str(root))
+    file_index.refresh()
+    assert indexed_files(file_index) == {"src/app.py", "src/debug.log", "build/out.o"}
+
+    make_files(root, {".orderlyignore": "*.log\n/build/\n"})  # Leaves the mtime of src and build unchanged
+    file_index.refresh()
+    assert indexed_files(file_index) == {".orderlyignore", "src/app.py"}
+    file_index.close()
+
+
+def test_walker_policy_change_forces_a_rebuild(tmp_path):
+    root = tmp_path / "root"
+    make_files(root, {"top.txt": "", "sub/nested.txt": ""})
+    file_index = FileIndex(str(root))
+    file_index.refresh()
+    file_index.close()
+
+    shallow_index = FileIndex(str(root), walker=ParallelWalker(max_depth=0))
+    assert not shallow_index.is_built()
+    shallow_index.refresh()
+    assert shallow_index.is_built() and indexed_files(shallow_index) == {"top.txt"}
+    shallow_index.close()
+
+
+# === END FILE INDEX ======================================================
+
+
+# === SEARCH ENGINE =======================================================
+def test_first_search_streams_while_building_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(orderly_engine, "SEARCH_BATCH_INTERVAL", 0)
+    make_files(tmp_path / "root", {f"dir{i}/report{i}.txt": "" for i in range(20)})
+    search_engine = SearchEngine(str(tmp_path / "root"), walker=ParallelWalker(workers=2))
+    batches = []
+    found = search_engine.search("report", SearchOptions(mode="Keyword"), on_batch=batches.append)
+
+    assert len(found) == 20 and len(batches) > 1 and sorted(sum(batches, [])) == sorted(found)
+    assert search_engine.file_index.is_built() and search_engine.file_index.file_count() == 20
+    search_engine.close()
+
+
+def test_cancelled_first_search_leaves_the_index_unbuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(orderly_engine, "SEARCH_BATCH_INTERVAL", 0)
+    make_files(tmp_path / "root", {f"dir{i}/report{i}.txt": "" for i in range(20)})
+    search_engine = SearchEngine(str(tmp_path / "root"), walker=ParallelWalker(workers=2))
+    cancel_event = threading.Event()
+    found = search_engine.search("report", SearchOptions(mode="Keyword"), cancel_event=cancel_event,
+                                 on_progress=lambda scanned, matched: cancel_event.set())
+
+    assert len(found) < 20
+    assert not search_engine.file_index.is_built()
+    assert len(search_engine.search("report", SearchOptions(mode="Keyword"))) == 20
+    search_engine.close()
+
+
+def test_search_during_another_threads_build_walks_and_can_cancel(tmp_path):
+    make_files(tmp_path / "root", {"a/report.txt": "", "b/report.pdf": "", "b/notes.txt": ""})
+    search_engine = SearchEngine(str(tmp_path / "root"), walker=ParallelWalker(workers=2))
+    holding, release = threading.Event(), threading.Event()
+
+    def hold_index_lock():  # Stands in for the app's background build
+        with search_engine.file_index.lock:
+            holding.set()
+            release.wait()
+
+    threading.Thread(target=hold_index_lock, daemon=True).start()
+    holding.wait()
+    try:
+        found = search_engine.search("report", SearchOptions(mode="Keyword"))
+        assert sorted(os.path.basename(path) for path in found) == ["report.pdf", "report.txt"]
+        cancel_event = threading.Event()
+        cancel_event.set()
+        assert search_engine.prepare(cancel_event) == 0  # Stops waiting for the build instead of hanging
+    finally:
+        release.set()
+    search_engine.close()
+
+
+
+def test_multi_root_search_reports_files_of_overlapping_roots_once(tmp_path):
+    parent, other = tmp_path / "parent", tmp_path / "other"
+    make_files(parent, {"report_a.txt": "", "sub/report_b.txt": "", "sub/notes.txt": ""})
+    make_files(other, {"report_c.txt": ""})
+    os.link(parent / "report_a.txt", other / "report_a_link.txt")  # Same inode under another name
+    search_engines = [SearchEngine(str(folder)) for folder in (parent, parent / "sub", other)]
+    result_store = ResultStore()
+
+    found = MultiRootSearch(search_engines).search("report", SearchOptions(mode="Keyword"), result_store=result_store)
+
+    names = sorted(os.path.basename(result_store.path(result_id)).replace("_link", "") for result_id in found)
+    assert names == ["report_a.txt", "report_b.txt", "report_c.txt"]
+    assert len(result_store) == 3 and all(result_store.file_info(result_id)[0] == 0 for result_id in found)
+    for search_engine in search_engines:
+        search_engine.close()
+
+# === END SEARCH ENGINE ===================================================
+
+
+# === QUERY CACHE =========================================================
+def test_query_cache_answers_repeated_searches(tmp_path):
+    make_files(tmp_path / "root", {"a/report.txt": "", "b/report.pdf": "", "b/notes.txt": ""})
+    search_engine = SearchEngine(str(tmp_path / "root"), query_cache=QueryCache())
+    search_engine.prepare()
+    options = SearchOptions(mode="Keyword")
+    first = search_engine.search("report", options)
+    hits_before = counter("query_cache_hits")
+    batches = []
+
+    assert sorted(search_engine.search("report", options, on_batch=batches.append)) == sorted(first)
+    assert counter("query_cache_hits") == hits_before + 1 and len(batches) == 1
+    search_engine.search("report", SearchOptions(mode="Keyword", case_sensitive=False))  # Another key
+    assert counter("query_cache_hits") == hits_before + 1
+    search_engine.close()
+    assert len(search_engine.query_cache) == 0  # Closing an engine drops its entries
+
+
+def test_query_cache_is_invalidated_when_a_file_is_added(tmp_path):
+    root = tmp_path / "root"
+    make_files(root, {"a/report.txt": ""})
+    search_engine = SearchEngine(str(root), query_cache=QueryCache())
+    search_engine.prepare()
+    options = SearchOptions(mode="Keyword")
+    assert len(search_engine.search("report", options)) == 1
+
+    make_files(root, {"a/report2.txt": ""})
+    bump_mtime(root / "a")
+    invalidations_before = counter("query_cache_invalidations")
+    found = search_engine.search("report", options)
+
+    assert sorted(os.path.basename(path) for path in found) == ["report.txt", "report2.txt"]
+    assert counter("query_cache_invalidations") == invalidations_before + 1
+    search_engine.close()
+
+
+def test_query_cache_skips_stat_queries_and_evicts_least_recently_used(tmp_path):
+    options = SearchOptions(mode="Keyword")
+    assert is_cacheable_query("report ext:pdf", options)
+    assert not is_cacheable_query("report size:>1KB", options)
+    assert not is_cacheable_query("report", SearchOptions(mode="Content"))
+
+    query_cache = QueryCache(max_entries=2)
+    for keyword in ("a", "b"):
+        query_cache.put(keyword, "state", [("folder", keyword)])
+    query_cache.get("a", "state")
+    query_cache.put("c", "state", [("folder", "c")])
+    assert query_cache.get("b", "state") is None  # Least recently used
+    assert query_cache.get("a", "state") == [("folder", "a")]
+    assert query_cache.get("a", "other state") is None
+
+
+@pytest.mark.parametrize("previous_keyword, keyword, options, expected", [
+    ("rep", "report", SearchOptions(mode="Keyword"), True),
+    ("rep", "Report", SearchOptions(mode="Keyword"), False),
+    ("rep", "Report", SearchOptions(mode="Keyword", case_sensitive=False), True),
+    ("rep", "report", SearchOptions(mode="Content"), True),
+    ("rep", "report", SearchOptions(mode="Keyword", fuzzy=True), False),
+    (".p", ".pdf", SearchOptions(mode="Extension"), False),
+    ("rep", "rep ext:pdf", SearchOptions(mode="Keyword"), False),
+])
+def test_query_refines(previous_keyword, keyword, options, expected):
+    assert query_refines(previous_keyword, keyword, options) is expected
+
+
+def test_narrowed_search_matches_a_full_search(tmp_path):
+    make_files(tmp_path / "root", {"a/rep.txt": "", "a/report.txt": "", "b/reports.pdf": "", "b/repo.md": ""})
+    search_engine = SearchEngine(str(tmp_path / "root"))
+    options = SearchOptions(mode="Keyword")
+    broad = search_engine.search("rep", options)
+    narrowed = search_engine.search("report", options, candidate_paths=broad)
+    assert sorted(narrowed) == sorted(search_engine.search("report", options))
+    assert sorted(os.path.basename(path) for path in narrowed) == ["report.txt", "reports.pdf"]
+    search_engine.close()
+
+
+# === END QUERY CACHE =====================================================
+
+
+# === RESULT STORE ========================================================
+def test_result_store_stays_compact():
+    names = [f"scan_{i:07d}.pdf" for i in range(200_000)]  # The index already holds these strings
+    folders = [os.path.join("data", f"folder{i}") for i in range(4_000)]
+    tracemalloc.start()
+    try:
+        store = ResultStore()
+        for i, name in enumerate(names):
+            store.add(folders[i // 50], name)
+        used_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert used_bytes * 1_000_000 / len(names) < 50 * 2**20  # A few tens of MB per million results
+
+
+def test_result_store_find_follows_adds_and_removes():
+    store = ResultStore()
+    first, second = store.add("docs", "a.txt"), store.add("docs", "b.txt")
+    assert store.find([os.path.join("docs", "b.txt"), os.path.join("docs", "a.txt"), "missing"]) == [first, second]
+    store.remove([first])
+    third = store.add("other", "a.txt")
+    readded = store.add("docs", "a.txt")
+    assert store.find([os.path.join("docs", "a.txt"), os.path.join("other", "a.txt")]) == [third, readded]
+    assert first not in store and len(store) == 3
+
+
+# === END RESULT STORE ====================================================